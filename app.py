@@ -0,0 +1,52 @@
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, Body, HTTPException
+
+from us_visa.constants import APP_HOST, APP_PORT
+from us_visa.serving import PredictionService, configure_logging
+
+
+configure_logging()
+service = PredictionService()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    service.load_model()
+    await service.start()
+    yield
+    await service.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "model": str(service.model), "model_version": service.model_version}
+
+
+@app.get("/stats")
+async def stats():
+    return service.stats()
+
+
+@app.post("/predict")
+async def predict(case: dict = Body(...)):
+    try:
+        return {"case_status": await service.predict(case)}
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/predict/batch")
+async def predict_batch(cases: list = Body(...)):
+    try:
+        return {"case_status": await service.predict_batch(cases)}
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=APP_HOST, port=APP_PORT)
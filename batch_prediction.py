@@ -0,0 +1,28 @@
+import argparse
+
+from us_visa.serving import BatchPredictionPipeline, configure_logging
+
+parser = argparse.ArgumentParser()
+source = parser.add_mutually_exclusive_group(required=True)
+source.add_argument("--input-file", help="csv, parquet or feather file of the cases to score")
+source.add_argument("--input-collection", help="mongo collection of the cases to score")
+sink = parser.add_mutually_exclusive_group(required=True)
+sink.add_argument("--output-file", help="csv, parquet or feather file the predictions are written to")
+sink.add_argument("--output-collection", help="mongo collection the predictions are upserted into")
+parser.add_argument("--workers", type=int, default=None, help="number of scoring processes")
+parser.add_argument("--benchmark", type=int, nargs="*", metavar="WORKERS",
+                    help="score --input-file once per number of workers and print rows/sec, e.g. --benchmark 1 2 4 8")
+args = parser.parse_args()
+
+configure_logging()
+pipeline = BatchPredictionPipeline()
+if args.benchmark is not None:
+    if args.input_file is None or args.output_file is None:
+        parser.error("--benchmark requires --input-file and --output-file")
+    for stats in pipeline.benchmark(args.input_file, args.output_file, tuple(args.benchmark or (1, 2, 4, 8))):
+        print(f"{stats['n_workers']} workers: {stats['rows_per_sec']:.0f} rows/sec")
+else:
+    stats = pipeline.initiate_batch_prediction(input_file_path=args.input_file, input_collection_name=args.input_collection,
+                                               output_file_path=args.output_file, output_collection_name=args.output_collection,
+                                               n_workers=args.workers)
+    print(f"Scored {stats['n_rows']} rows in {stats['wall_time']:.1f}s ({stats['rows_per_sec']:.0f} rows/sec)")
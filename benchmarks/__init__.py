@@ -0,0 +1,2 @@
+# benchmarks of the pipeline stages and helpers, run from the repository root, e.g.
+# python -m benchmarks.benchmark_suite or python -m benchmarks.export_benchmark --rows 100000
@@ -0,0 +1,117 @@
+import os
+import gc
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from us_visa.utils.instrumentation import _peak_rss_mb, _reset_peak_rss
+from us_visa.utils.main_utils import save_numpy_array_data, load_numpy_array_data
+
+
+def reset_peak_rss() -> float:
+    # right after the reset the peak RSS is the current one, the RSS at the start of the step
+    if not _reset_peak_rss():
+        raise Exception("The peak RSS cannot be reset, the benchmark needs /proc/self/clear_refs")
+    return _peak_rss_mb()
+
+
+def memory_mb() -> dict:
+    # the proportional set size splits the pages shared with the other readers between them, so the sum over the
+    # readers is the memory they use together
+    fields = {}
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"pss": fields["Pss"], "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def file_paths(tmp_dir: str, layout: str) -> tuple:
+    if layout == "dense":
+        return (os.path.join(tmp_dir, "train.npy"),)
+    return os.path.join(tmp_dir, "train.npy"), os.path.join(tmp_dir, "train_target.npy")
+
+
+def write(layout: str, tmp_dir: str, args, queue) -> None:
+    # features as the preprocessor returns them, float64, then saved in the layout
+    rng = np.random.default_rng(0)
+    features = rng.standard_normal((args.rows, args.columns))
+    target = rng.integers(0, 2, args.rows)
+    gc.collect()
+    start_rss_mb = reset_peak_rss()
+    start = time.perf_counter()
+    if layout == "dense":
+        # layout of the data transformation before the split arrays: the target appended as the last column
+        save_numpy_array_data(file_paths(tmp_dir, layout)[0], np.c_[features, target])
+    else:
+        features_file_path, target_file_path = file_paths(tmp_dir, layout)
+        save_numpy_array_data(features_file_path, features, dtype="float32")
+        save_numpy_array_data(target_file_path, target)
+    queue.put((time.perf_counter() - start, _peak_rss_mb() - start_rss_mb))
+
+
+def read(layout: str, tmp_dir: str, barrier, queue) -> None:
+    # reads every value, as fitting a model does, then holds the arrays until all readers did so
+    start_rss_mb = reset_peak_rss()
+    start = time.perf_counter()
+    if layout == "dense":
+        array = load_numpy_array_data(file_paths(tmp_dir, layout)[0], mmap_mode=None)
+        features, target = array[:, :-1], array[:, -1]
+    else:
+        features_file_path, target_file_path = file_paths(tmp_dir, layout)
+        features, target = load_numpy_array_data(features_file_path), load_numpy_array_data(target_file_path)
+    checksum = float(features.sum()) + float(target.sum())
+    seconds = time.perf_counter() - start
+    barrier.wait()
+    memory = memory_mb()
+    barrier.wait()
+    queue.put((seconds, _peak_rss_mb() - start_rss_mb, memory["pss"], memory["private"], checksum))
+
+
+def run(context, target, args) -> list:
+    # every process is fresh, so its peak RSS is the one of its step
+    queue = context.Queue()
+    processes = [context.Process(target=target, args=(*process_args, queue)) for process_args in args]
+    for process in processes:
+        process.start()
+    # the results are a few numbers, the queue does not block the exit of the processes
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            raise Exception(f"{target.__name__} failed with exit code {process.exitcode}")
+    return [queue.get() for _ in processes]
+
+
+def main(args) -> None:
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.rows} rows x {args.columns} float64 features and an int target, RSS is the peak above the start "
+          f"of the step, PSS the memory of all readers together")
+    print(f"{'layout':<8} {'size MB':>8} {'write s':>8} {'write RSS MB':>13} {'readers':>8} {'read s':>7} "
+          f"{'read RSS MB':>12} {'total PSS MB':>13} {'private MB':>11}")
+    for layout in args.layouts:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            [(write_seconds, write_rss_mb)] = run(context, write, [(layout, tmp_dir, args)])
+            size_mb = sum(os.path.getsize(file_path) for file_path in file_paths(tmp_dir, layout)) / 1024 ** 2
+            for n_readers in args.readers:
+                barrier = context.Barrier(n_readers)
+                results = run(context, read, [(layout, tmp_dir, barrier)] * n_readers)
+                seconds, rss_mb, pss_mb, private_mb, _ = (np.array(values) for values in zip(*results))
+                print(f"{layout:<8} {size_mb:>8.0f} {write_seconds:>8.2f} {write_rss_mb:>13.0f} {n_readers:>8} "
+                      f"{seconds.max():>7.2f} {rss_mb.max():>12.0f} {pss_mb.sum():>13.0f} {private_mb.sum():>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="write time, read time and memory of the transformed training "
+                                                 "array as one dense float64 array with the target appended by "
+                                                 "np.c_, and as split float32 features and target memory-mapped "
+                                                 "by the readers")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--columns", type=int, default=24, help="feature columns, 24 is the EasyVisa preprocessor")
+    parser.add_argument("--layouts", nargs="+", choices=["dense", "split"], default=["dense", "split"])
+    parser.add_argument("--readers", nargs="+", type=int, default=[1, 4],
+                        help="concurrent reader processes, e.g. the workers of a hyperparameter search")
+    main(parser.parse_args())
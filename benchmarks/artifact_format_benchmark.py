@@ -0,0 +1,89 @@
+import os
+import gc
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+from us_visa.constants import SCHEMA_FILE_PATH
+from us_visa.data_access.synthetic_data import iter_usvisa_chunks
+from us_visa.utils.instrumentation import _peak_rss_mb, _reset_peak_rss
+from us_visa.utils.main_utils import DataFrameWriter, read_dataframe, read_yaml, get_column_dtypes
+
+
+def reset_peak_rss() -> float:
+    # the libraries the formats load are not part of the measure, the peak RSS is reset after them and is then
+    # the RSS at the start of the step
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    gc.collect()
+    if not _reset_peak_rss():
+        raise Exception("The peak RSS cannot be reset, the benchmark needs /proc/self/clear_refs")
+    return _peak_rss_mb()
+
+
+def write(file_path: str, args, queue) -> None:
+    # the chunks are generated before the timed writes, so the time is the one of the writer alone
+    chunks = list(iter_usvisa_chunks(args.rows, args.chunk_size))
+    start_rss_mb = reset_peak_rss()
+    start = time.perf_counter()
+    with DataFrameWriter(file_path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    queue.put((time.perf_counter() - start, start_rss_mb, _peak_rss_mb()))
+
+
+def read(file_path: str, columns: list, column_dtypes: dict, queue) -> None:
+    # the typed read of the data validation and transformation stages
+    start_rss_mb = reset_peak_rss()
+    start = time.perf_counter()
+    df = read_dataframe(file_path, columns=columns, column_dtypes=column_dtypes)
+    seconds = time.perf_counter() - start
+    queue.put((seconds, start_rss_mb, _peak_rss_mb(), df.memory_usage(deep=True).sum() / 1024 ** 2))
+
+
+def run(context, target, args) -> tuple:
+    # in a fresh process, so nothing is left over from the other steps
+    queue = context.Queue()
+    process = context.Process(target=target, args=(*args, queue))
+    process.start()
+    # the result is a few numbers, the queue does not block the exit of the process
+    process.join()
+    if process.exitcode != 0:
+        raise Exception(f"{target.__name__} {args[0]} failed with exit code {process.exitcode}")
+    return queue.get()
+
+
+def main(args) -> None:
+    context = multiprocessing.get_context("spawn")
+    schema_config = read_yaml(SCHEMA_FILE_PATH)
+    column_dtypes = get_column_dtypes(schema_config)
+    # columns the data transformation reads, see DataTransformation.get_required_columns
+    required_columns = [col for col in column_dtypes
+                        if col not in schema_config.drop_columns or col == "yr_of_estab"]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{args.rows} rows written in chunks of {args.chunk_size}, RSS is the peak above the start of the step")
+        print(f"{'format':<8} {'size MB':>8} {'write s':>8} {'write RSS MB':>13} {'read s':>7} {'read RSS MB':>12} "
+              f"{'df MB':>7} {'read cols s':>12} {'cols RSS MB':>12}")
+        for file_format in args.formats:
+            file_path = os.path.join(tmp_dir, f"data.{file_format}")
+            write_seconds, write_start_mb, write_peak_mb = run(context, write, (file_path, args))
+            read_seconds, read_start_mb, read_peak_mb, df_mb = run(context, read, (file_path, None, column_dtypes))
+            cols_seconds, cols_start_mb, cols_peak_mb, _ = run(context, read,
+                                                               (file_path, required_columns, column_dtypes))
+            print(f"{file_format:<8} {os.path.getsize(file_path) / 1024 ** 2:>8.1f} {write_seconds:>8.2f} "
+                  f"{write_peak_mb - write_start_mb:>13.0f} {read_seconds:>7.2f} {read_peak_mb - read_start_mb:>12.0f} "
+                  f"{df_mb:>7.0f} {cols_seconds:>12.2f} {cols_peak_mb - cols_start_mb:>12.0f}")
+            os.remove(file_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="size, write time, read time and peak RSS of the ingestion "
+                                                 "artifacts as csv, parquet and feather, on synthetic data")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--formats", nargs="+", choices=["csv", "parquet", "feather"],
+                        default=["csv", "parquet", "feather"])
+    main(parser.parse_args())
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+from sklearn.linear_model import LogisticRegression
+
+from us_visa.constants import ARTIFACT_DIR, COLLECTION_NAME, DATABASE_NAME, TARGET_COLUMN, SCHEMA_FILE_PATH
+from us_visa.components.data_ingestion import DataIngestion
+from us_visa.components.data_validation import DataValidation
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.components.resampling import Resampler, RESAMPLING_STRATEGIES
+from us_visa.configuration.mongo_db_connection import MongoDBClient
+from us_visa.data_access.synthetic_data import load_into_collection
+from us_visa.entity.config_entity import DataIngestionConfig, DataValidationConfig, DataTransfomationConfig
+from us_visa.entity.estimator import USvisaModel, prepare_input_features
+from us_visa.utils.main_utils import (read_yaml, read_dataframe, load_numpy_array_data, save_numpy_array_data,
+                                      load_object, save_object)
+
+STAGES = ("ingestion", "validation", "transformation", "resampling", "save_load", "prediction")
+
+
+def rebase(config: object, artifact_dir: str) -> object:
+    # points the artifact paths of a config into artifact_dir, so the benchmark leaves the artifact directory alone
+    for name, value in vars(config).items():
+        if isinstance(value, str) and value.startswith(ARTIFACT_DIR + os.sep):
+            setattr(config, name, os.path.join(artifact_dir, os.path.relpath(value, ARTIFACT_DIR)))
+    return config
+
+
+def measure(run, n_rows: int, args) -> tuple:
+    # fastest of args.repeat timed runs, then one more run under tracemalloc for the peak of the python allocations,
+    # kept apart since tracing slows the stage down
+    seconds = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = run()
+        seconds.append(time.perf_counter() - start)
+    peak_mb = None
+    if not args.skip_memory:
+        tracemalloc.start()
+        run()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    return result, {"seconds": min(seconds), "rows": n_rows, "rows_per_sec": n_rows / min(seconds), "peak_mb": peak_mb}
+
+
+def run_suite(args, n_rows: int, artifact_dir: str) -> dict:
+    results = {}
+    ingestion_config = rebase(DataIngestionConfig(), artifact_dir)
+    # the stages read the files of the previous stage, as they do when they are not run in one process
+    ingestion_config.in_memory_consumers = 0
+    validation_config = rebase(DataValidationConfig(), artifact_dir)
+    transformation_config = rebase(DataTransfomationConfig(), artifact_dir)
+    # resampling is a stage of its own here
+    transformation_config.resampling_strategy = "none"
+
+    ingestion_artifact, results["ingestion"] = measure(
+        DataIngestion(ingestion_config).initiate_data_ingestion, n_rows, args)
+    validation_artifact, results["validation"] = measure(
+        DataValidation(ingestion_artifact, validation_config).initiate_data_validation, n_rows, args)
+    transformation_artifact, results["transformation"] = measure(
+        DataTransformation(ingestion_artifact, validation_artifact, transformation_config).initiate_data_transformation,
+        n_rows, args)
+
+    X = load_numpy_array_data(transformation_artifact.transformed_train_file_path, mmap_mode=None)
+    y = load_numpy_array_data(transformation_artifact.transformed_train_target_file_path, mmap_mode=None)
+    if "resampling" in args.stages:
+        resampler = Resampler(args.resampling_strategy, n_jobs=args.n_jobs)
+        _, results["resampling"] = measure(lambda: resampler.fit_resample(X, y), len(y), args)
+        results["resampling"]["strategy"] = args.resampling_strategy
+
+    preprocessor = load_object(transformation_artifact.transformed_object_file_path)
+    if "save_load" in args.stages:
+        array_file_path = os.path.join(artifact_dir, "save_load", "train.npy")
+        object_file_path = os.path.join(artifact_dir, "save_load", "preprocessing.pkl")
+
+        def save_load():
+            save_numpy_array_data(array_file_path, X)
+            save_object(object_file_path, preprocessor)
+            return load_numpy_array_data(array_file_path, mmap_mode=None), load_object(object_file_path, mmap_mode=None)
+
+        _, results["save_load"] = measure(save_load, len(y), args)
+
+    if "prediction" in args.stages:
+        # a quick model, the stage measures the scoring path of the preprocessing and not the model
+        model = USvisaModel(
+            preprocessing_object=preprocessor,
+            trained_model_object=LogisticRegression(max_iter=200).fit(X, y),
+            compiled_preprocessing_object=load_object(transformation_artifact.compiled_object_file_path)
+            if transformation_artifact.compiled_object_file_path else None)
+        features = prepare_input_features(read_dataframe(ingestion_artifact.test_file_path).drop(columns=TARGET_COLUMN),
+                                          read_yaml(SCHEMA_FILE_PATH).drop_columns)
+        _, results["prediction"] = measure(lambda: model.predict(features), len(features), args)
+
+    return {name: results[name] for name in STAGES if name in results}
+
+
+def compare(results: dict, baseline: dict, args) -> int:
+    if baseline["rows"] != results["rows"]:
+        raise Exception(f"The baseline was measured on {baseline['rows']} rows, not {results['rows']}")
+    failures = 0
+    print(f"\n{'stage':<16} {'seconds':>9} {'baseline':>9} {'change':>8} {'peak MB':>9} {'baseline':>9} {'change':>8}")
+    for name, stage in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None or base.get("strategy") != stage.get("strategy"):
+            print(f"{name:<16} not in the baseline")
+            continue
+        time_change = stage["seconds"] / base["seconds"] - 1
+        memory_change = (stage["peak_mb"] / base["peak_mb"] - 1
+                         if stage["peak_mb"] is not None and base["peak_mb"] else None)
+        # changes of a few milliseconds are timer and scheduler noise, not regressions
+        slower = time_change > args.threshold and stage["seconds"] - base["seconds"] > args.min_delta
+        ok = not slower and (memory_change is None or memory_change <= args.memory_threshold)
+        failures += not ok
+        print(f"{name:<16} {stage['seconds']:>9.3f} {base['seconds']:>9.3f} {time_change:>+8.1%} "
+              + (f"{stage['peak_mb']:>9.1f} {base['peak_mb']:>9.1f} {memory_change:>+8.1%}"
+                 if memory_change is not None else f"{'':>28}")
+              + ("" if ok else "  REGRESSION"))
+    return failures
+
+
+def main(args) -> int:
+    if args.mongo:
+        # the collection behind MONGODB_URL, e.g. a local mongod loaded with generate_synthetic_data.py
+        n_rows = MongoDBClient().database[COLLECTION_NAME].estimated_document_count()
+    else:
+        import mongomock
+
+        MongoDBClient.client = mongomock.MongoClient()
+        n_rows = load_into_collection(MongoDBClient.client[DATABASE_NAME][COLLECTION_NAME], args.rows,
+                                      random_state=args.random_state)
+
+    with tempfile.TemporaryDirectory() as artifact_dir:
+        stages = run_suite(args, n_rows, artifact_dir)
+    results = {"rows": n_rows, "created": datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(), "machine": platform.machine(), "cpu_count": os.cpu_count(),
+               "stages": stages}
+
+    print(f"{n_rows} rows")
+    print(f"{'stage':<16} {'seconds':>9} {'rows/s':>11} {'peak MB':>9}")
+    for name, stage in stages.items():
+        peak_mb = f"{stage['peak_mb']:>9.1f}" if stage["peak_mb"] is not None else f"{'-':>9}"
+        print(f"{name:<16} {stage['seconds']:>9.3f} {stage['rows_per_sec']:>11.0f} {peak_mb}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline is None:
+        return 0
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"\nStored the baseline {args.baseline}")
+        return 0
+    with open(args.baseline) as file:
+        failures = compare(results, json.load(file), args)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="times the pipeline stages separately on synthetic data, records "
+                                                 "the results as json and exits with 1 when a stage regressed "
+                                                 "against the baseline")
+    parser.add_argument("--rows", type=int, default=25000,
+                        help="synthetic rows loaded into mongomock, e.g. 25000 or 1000000. For 10000000 rows load "
+                             "a local mongod with generate_synthetic_data.py and pass --mongo")
+    parser.add_argument("--mongo", action="store_true",
+                        help="benchmark on the collection behind MONGODB_URL instead of generated mongomock data")
+    parser.add_argument("--stages", nargs="+", choices=STAGES[3:], default=list(STAGES[3:]),
+                        help="optional stages run after ingestion, validation and transformation")
+    parser.add_argument("--resampling-strategy", choices=RESAMPLING_STRATEGIES, default="smoteenn")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per stage, the fastest is kept")
+    parser.add_argument("--skip-memory", action="store_true", help="skip the tracemalloc run of every stage")
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--output", help="json file the results are written to")
+    parser.add_argument("--baseline", help="json results of an earlier run, written when it does not exist")
+    parser.add_argument("--update-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fails when a stage is slower than the baseline by more than this fraction")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="seconds a stage must be slower by, on top of the threshold, to fail")
+    parser.add_argument("--memory-threshold", type=float, default=0.2,
+                        help="fails when the peak memory of a stage exceeds the baseline by more than this fraction")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+import time
+import argparse
+
+import numpy as np
+from pandas import DataFrame
+
+from us_visa.constants import TARGET_COLUMN
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.data_access.synthetic_data import generate_usvisa_data
+from us_visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from us_visa.entity.compiled_preprocessor import compile_preprocessor, check_parity
+from us_visa.entity.config_entity import DataTransfomationConfig
+from us_visa.entity.estimator import prepare_input_features, prepare_input_records
+from us_visa.utils.main_utils import cast_to_schema_dtypes, get_column_dtypes
+
+
+def time_per_call(run, min_seconds: float) -> float:
+    # median seconds of a call, over as many calls as fit in min_seconds after a warm up call
+    run()
+    seconds = []
+    deadline = time.perf_counter() + min_seconds
+    while time.perf_counter() < deadline or len(seconds) < 5:
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return float(np.median(seconds))
+
+
+def main(args) -> None:
+    data_transformation = DataTransformation(DataIngestionArtifact(train_file_path="", test_file_path=""),
+                                             DataValidationArtifact(validation_status=True, message="",
+                                                                    report_file_path="", drift_sketch_file_path=""),
+                                             DataTransfomationConfig())
+    schema_config = data_transformation._schema_config
+    dataframe = cast_to_schema_dtypes(generate_usvisa_data(args.rows), get_column_dtypes(schema_config))
+    features = prepare_input_features(dataframe.drop(columns=TARGET_COLUMN), schema_config.drop_columns)
+    preprocessor = data_transformation.get_data_transformer_object().fit(features)
+    compiled_preprocessor = compile_preprocessor(preprocessor)
+    max_difference = check_parity(preprocessor, compiled_preprocessor, features.head(args.rows))
+    # raw records, as the prediction service receives them
+    records = dataframe.drop(columns=TARGET_COLUMN).to_dict(orient="records")
+
+    print(f"preprocessor fitted on {args.rows} rows, max difference of the compiled output {max_difference}")
+    print(f"{'batch':>6} {'sklearn us':>11} {'compiled us':>12} {'speedup':>8} {'target':>7}")
+    for batch_size in args.batch_sizes:
+        batch = records[:batch_size]
+        # the two paths of PredictionService._predict_records, from the records to the model input
+        sklearn_seconds = time_per_call(lambda: preprocessor.transform(prepare_input_features(
+            DataFrame(batch), schema_config.drop_columns)), args.seconds)
+        compiled_seconds = time_per_call(lambda: compiled_preprocessor.transform(prepare_input_records(batch)),
+                                         args.seconds)
+        speedup = sklearn_seconds / compiled_seconds
+        print(f"{batch_size:>6} {sklearn_seconds * 1e6:>11.1f} {compiled_seconds * 1e6:>12.1f} {speedup:>7.1f}x "
+              f"{'met' if speedup >= args.target_speedup else 'missed':>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time to preprocess a batch of records with the fitted sklearn "
+                                                 "preprocessor and with its compiled version, as the prediction "
+                                                 "service does")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic rows the preprocessor is fitted on")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 1000])
+    parser.add_argument("--seconds", type=float, default=2.0, help="measured time per path and batch size")
+    parser.add_argument("--target-speedup", type=float, default=10.0)
+    main(parser.parse_args())
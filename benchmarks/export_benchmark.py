@@ -0,0 +1,120 @@
+import os
+import gc
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from us_visa.constants import COLLECTION_NAME, DATABASE_NAME
+from us_visa.components.data_ingestion import DataIngestion
+from us_visa.configuration.mongo_db_connection import MongoDBClient
+from us_visa.data_access.synthetic_data import iter_usvisa_chunks, load_into_collection
+from us_visa.entity.config_entity import DataIngestionConfig
+from us_visa.utils.instrumentation import _peak_rss_mb, _reset_peak_rss
+
+
+class SyntheticCollection:
+    '''
+    collection whose find() returns the synthetic documents batch by batch, as a server cursor does, so the
+    process holds the documents the export keeps and nothing else. mongomock builds the whole result list first
+    '''
+
+    def __init__(self, n_rows: int):
+        self.n_rows = n_rows
+
+    def find(self, filter=None, projection=None, batch_size: int = 0, **kwargs):
+        with_id = not projection or projection.get("_id", 1)
+        n_documents = 0
+        for chunk in iter_usvisa_chunks(self.n_rows, chunk_size=batch_size or 10000):
+            for document in chunk.to_dict(orient="records"):
+                n_documents += 1
+                yield {"_id": n_documents, **document} if with_id else document
+
+
+def legacy_export(collection, feature_store_file_path: str) -> int:
+    # export of the feature store before the streaming export: the whole collection as a list of documents,
+    # then one dataframe written at once
+    df = pd.DataFrame(list(collection.find()))
+    if "_id" in df.columns.to_list():
+        df = df.drop(columns=['_id'])
+    df.replace("na", np.nan, inplace=True)
+    df.to_csv(feature_store_file_path, index=False, header=False)
+    return len(df)
+
+
+def streaming_export(data_ingestion: DataIngestion) -> int:
+    # chunks are dropped once written, as the incremental split of the ingestion does
+    return sum(len(chunk) for chunk in data_ingestion.stream_data_into_feature_store())
+
+
+def export(mode: str, tmp_dir: str, args, queue) -> None:
+    # runs in a fresh process, so the peak RSS is the one of a single export
+    if args.source == "synthetic":
+        MongoDBClient.client = {DATABASE_NAME: {args.collection: SyntheticCollection(args.rows)}}
+    elif args.source == "mongomock":
+        import mongomock
+
+        MongoDBClient.client = mongomock.MongoClient()
+        # small insert chunks, so little freed memory is left for the export to reuse without growing the RSS
+        load_into_collection(MongoDBClient.client[DATABASE_NAME][args.collection], args.rows, chunk_size=1000)
+    config = DataIngestionConfig(collection_name=args.collection, batch_size=args.batch_size,
+                                 artifact_format=args.artifact_format)
+    config.feature_store_file_path = os.path.join(tmp_dir, mode, os.path.basename(config.feature_store_file_path))
+    os.makedirs(os.path.dirname(config.feature_store_file_path))
+    collection = MongoDBClient().database[args.collection]
+
+    # the libraries the writers load are not part of the export, nor are the documents mongomock holds
+    import pyarrow.parquet
+    import pyarrow.feather
+    gc.collect()
+    # right after the reset the peak RSS is the current one
+    peak_reset = _reset_peak_rss()
+    start_rss_mb = _peak_rss_mb() if peak_reset else None
+    start = time.perf_counter()
+    if mode == "legacy":
+        n_rows = legacy_export(collection, config.feature_store_file_path)
+    else:
+        n_rows = streaming_export(DataIngestion(config))
+    seconds = time.perf_counter() - start
+    queue.put((n_rows, seconds, start_rss_mb, _peak_rss_mb() if peak_reset else None))
+
+
+def main(args) -> None:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{args.rows if args.source != 'mongo' else 'all'} documents of the {args.source} {args.collection} "
+              f"collection, batch size {args.batch_size}, {args.artifact_format} feature store")
+        print(f"{'mode':<10} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'start RSS MB':>13} {'peak RSS MB':>12} "
+              f"{'peak - start':>13}")
+        for mode in args.modes:
+            queue = context.Queue()
+            process = context.Process(target=export, args=(mode, tmp_dir, args, queue))
+            process.start()
+            # the result is a few numbers, the queue does not block the exit of the process
+            process.join()
+            if process.exitcode != 0:
+                raise Exception(f"The {mode} export failed with exit code {process.exitcode}")
+            n_rows, seconds, start_rss_mb, peak_rss_mb = queue.get()
+            rss = (f"{start_rss_mb:>13.0f} {peak_rss_mb:>12.0f} {peak_rss_mb - start_rss_mb:>13.0f}"
+                   if peak_rss_mb is not None else f"{'-':>13} {'-':>12} {'-':>13}")
+            print(f"{mode:<10} {n_rows:>9} {seconds:>9.2f} {n_rows / seconds:>10.0f} {rss}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time, rows per second and peak RSS of the export of the collection "
+                                                 "into the feature store, streamed in batches and as the former "
+                                                 "list(collection.find()) export")
+    parser.add_argument("--rows", type=int, default=500000, help="documents of the synthetic and mongomock sources")
+    parser.add_argument("--source", choices=["synthetic", "mongomock", "mongo"], default="synthetic",
+                        help="synthetic documents generated batch by batch, mongomock, whose cursor holds the whole "
+                             "result and whose server work runs in the measured process, or the collection behind "
+                             "MONGODB_URL, e.g. a local mongod loaded with generate_synthetic_data.py")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--modes", nargs="+", choices=["legacy", "streaming"], default=["legacy", "streaming"])
+    parser.add_argument("--batch-size", type=int, default=DataIngestionConfig.batch_size)
+    parser.add_argument("--artifact-format", choices=["csv", "parquet", "feather"],
+                        default=DataIngestionConfig.artifact_format)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+import os
+import timeit
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from us_visa.constants import SCHEMA_FILE_PATH
+from us_visa.utils.instrumentation import MetricsRecorder, instrument_io
+from us_visa.utils.main_utils import (read_yaml, read_dataframe, write_dataframe, load_numpy_array_data,
+                                      save_numpy_array_data)
+
+
+@instrument_io("read")
+def noop(file_path: str) -> None:
+    # the cost of the instrumentation alone
+    return None
+
+
+def main(args) -> None:
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({f"num_{i}": rng.normal(size=args.rows) for i in range(8)})
+    array = df.to_numpy()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parquet_file_path = os.path.join(tmp_dir, "data.parquet")
+        array_file_path = os.path.join(tmp_dir, "array.npy")
+        write_dataframe(parquet_file_path, df)
+        save_numpy_array_data(array_file_path, array)
+        calls = {
+            "noop": lambda: noop(array_file_path),
+            "read_yaml": lambda: read_yaml(SCHEMA_FILE_PATH),
+            "read_dataframe": lambda: read_dataframe(parquet_file_path),
+            "load_numpy_array_data": lambda: load_numpy_array_data(array_file_path),
+            "save_numpy_array_data": lambda: save_numpy_array_data(array_file_path, array),
+        }
+        # no recorder is the code path outside of a pipeline run, tracemalloc is what --profile adds on top
+        modes = {
+            "no recorder": None,
+            "recorder": lambda: MetricsRecorder(),
+            "recorder + tracemalloc": lambda: MetricsRecorder(trace_memory=True),
+        }
+
+        print(f"{'helper':<24} " + " ".join(f"{mode:>24}" for mode in modes))
+        for name, call in calls.items():
+            timings = []
+            for mode, make_recorder in modes.items():
+                recorder = make_recorder() if make_recorder else None
+                if recorder is not None:
+                    recorder.__enter__()
+                try:
+                    timings.append(min(timeit.repeat(call, number=args.number, repeat=args.repeat)) / args.number)
+                finally:
+                    if recorder is not None:
+                        recorder.__exit__(None, None, None)
+            baseline = timings[0]
+            print(f"{name:<24} " + " ".join(
+                f"{timing * 1e6:>10.1f} us ({(timing - baseline) * 1e6:>+8.1f})" for timing in timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per-call time of the I/O helpers without recorder, with the "
+                                                 "metrics recorder of a pipeline run, and with tracemalloc on top")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--number", type=int, default=50, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=7)
+    main(parser.parse_args())
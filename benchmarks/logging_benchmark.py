@@ -0,0 +1,101 @@
+import os
+import sys
+import timeit
+import argparse
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from us_visa.constants import SCHEMA_FILE_PATH
+from us_visa.exception import USvisaException
+from us_visa.logger import configure_logging, shutdown_logging, TEXT_FORMAT
+from us_visa.utils.main_utils import read_yaml, drop_columns, load_numpy_array_data, save_numpy_array_data
+
+
+def configure_synchronous(log_dir: str) -> None:
+    # the logging before the queue: every record, the DEBUG utility lines included, written by the calling thread
+    logging.basicConfig(filename=os.path.join(log_dir, "synchronous.log"), format=TEXT_FORMAT,
+                        level=logging.DEBUG, force=True)
+
+
+def reset() -> None:
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(logging.WARNING)
+    logging.disable(logging.NOTSET)
+
+
+def nested_error(depth: int = 3) -> None:
+    # an error re-wrapped by depth layers, as it propagates from a utility up to the pipeline
+    def layer(level: int) -> None:
+        try:
+            if level == 0:
+                raise ValueError("bad input")
+            layer(level - 1)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    try:
+        layer(depth)
+    except USvisaException:
+        pass
+
+
+def count_records(log_dir: str) -> int:
+    # records start with '[' in text format and '{' in json format, traceback lines do not
+    n_records = 0
+    for file_name in os.listdir(log_dir):
+        with open(os.path.join(log_dir, file_name)) as file:
+            n_records += sum(1 for line in file if line.startswith(("[", "{")))
+    return n_records
+
+
+def main(args) -> None:
+    df = pd.DataFrame({"case_id": ["EZYV1"] * 10, "continent": ["Asia"] * 10, "no_of_employees": range(10)})
+    calls = {
+        "read_yaml": lambda: read_yaml(SCHEMA_FILE_PATH),
+        "drop_columns": lambda: drop_columns(df, ["case_id"]),
+        "load_numpy_array_data": lambda: load_numpy_array_data(array_file_path, mmap_mode=None),
+        "nested_error x3": nested_error,
+    }
+    modes = {
+        "synchronous DEBUG (before)": lambda log_dir: configure_synchronous(log_dir),
+        "queue INFO (default)": lambda log_dir: configure_logging(log_dir=log_dir, level="INFO"),
+        "queue DEBUG": lambda log_dir: configure_logging(log_dir=log_dir, level="DEBUG"),
+        "logging disabled": lambda log_dir: logging.disable(logging.CRITICAL),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        array_file_path = os.path.join(tmp_dir, "array.npy")
+        save_numpy_array_data(array_file_path, np.zeros((10, 10)))
+
+        print(f"{'mode':<28} " + " ".join(f"{name:>22}" for name in calls) + f" {'records/error':>14}")
+        for mode, configure in modes.items():
+            log_dir = os.path.join(tmp_dir, mode.split(" (")[0].replace(" ", "_"))
+            os.makedirs(log_dir)
+            configure(log_dir)
+            timings = [min(timeit.repeat(call, number=args.number, repeat=args.repeat)) / args.number * 1e6
+                       for call in calls.values()]
+
+            # records written by a single wrapped error
+            reset()
+            error_log_dir = log_dir + "_error"
+            os.makedirs(error_log_dir)
+            configure(error_log_dir)
+            nested_error()
+            reset()
+            records = count_records(error_log_dir)
+            print(f"{mode:<28} " + " ".join(f"{timing:>19.1f} us" for timing in timings) + f" {records:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per-call time of the utilities and of a wrapped error under the "
+                                                 "synchronous and the queue-based logging")
+    parser.add_argument("--number", type=int, default=2000, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
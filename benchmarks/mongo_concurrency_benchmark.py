@@ -0,0 +1,140 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from dataclasses import replace
+
+import numpy as np
+
+from us_visa.constants import COLLECTION_NAME
+from us_visa.configuration.mongo_db_connection import MongoDBClient, AsyncMongoDBClient
+from us_visa.entity.config_entity import MongoDBConfig
+
+
+def case_ids(rng: random.Random, n_cases: int, ids_per_query: int) -> list:
+    # case_id values of generate_synthetic_data.py run over EZYV1 to EZYV<n_cases>
+    return [f"EZYV{rng.randint(1, n_cases)}" for _ in range(ids_per_query)]
+
+
+def query_loop(collection, seed: int, args, deadline: float) -> tuple:
+    # queries until the deadline, returns the number of documents read and the latencies
+    rng = random.Random(seed)
+    n_documents, latencies = 0, []
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        n_documents += len(list(collection.find({"case_id": {"$in": case_ids(rng, args.n_cases, args.ids_per_query)}},
+                                                projection={"_id": 0})))
+        latencies.append(time.perf_counter() - start)
+    return n_documents, latencies
+
+
+def run_threads(n_workers: int, args, mongo_db_config: MongoDBConfig) -> tuple:
+    # the threads share the client and its pool
+    collection = MongoDBClient(mongo_db_config=mongo_db_config).database[args.collection]
+    results = [None] * n_workers
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(i: int) -> None:
+        results[i] = query_loop(collection, i, args, deadline)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, MongoDBClient.get_pool_metrics()
+
+
+def process_worker(seed: int, args, mongo_db_config: MongoDBConfig, deadline: float) -> tuple:
+    # a forked worker, MongoDBClient connects again instead of using the client of the parent
+    collection = MongoDBClient(mongo_db_config=mongo_db_config).database[args.collection]
+    return query_loop(collection, seed, args, deadline)
+
+
+def run_processes(n_workers: int, args, mongo_db_config: MongoDBConfig) -> tuple:
+    # the parent connects before the fork, as a pipeline process does
+    MongoDBClient(mongo_db_config=mongo_db_config).database[args.collection].find_one()
+    with multiprocessing.get_context("fork").Pool(n_workers) as pool:
+        # pool start-up is not part of the measured time
+        pool.map(abs, range(n_workers))
+        deadline = time.perf_counter() + args.seconds
+        results = pool.starmap(process_worker, [(i, args, mongo_db_config, deadline) for i in range(n_workers)])
+    return results, {}
+
+
+async def run_coroutines(n_workers: int, args, mongo_db_config: MongoDBConfig) -> tuple:
+    # the coroutines share the async client and its pool
+    collection = AsyncMongoDBClient(mongo_db_config=mongo_db_config).database[args.collection]
+    deadline = time.perf_counter() + args.seconds
+
+    async def worker(seed: int) -> tuple:
+        rng = random.Random(seed)
+        n_documents, latencies = 0, []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            cursor = collection.find({"case_id": {"$in": case_ids(rng, args.n_cases, args.ids_per_query)}},
+                                     projection={"_id": 0})
+            n_documents += len(await cursor.to_list())
+            latencies.append(time.perf_counter() - start)
+        return n_documents, latencies
+
+    results = await asyncio.gather(*[worker(i) for i in range(n_workers)])
+    metrics = AsyncMongoDBClient.get_pool_metrics()
+    await AsyncMongoDBClient.close()
+    return results, metrics
+
+
+def main(args) -> None:
+    mongo_db_config = MongoDBConfig()
+    if args.max_pool_size is not None:
+        mongo_db_config = replace(mongo_db_config, max_pool_size=args.max_pool_size)
+    collection = MongoDBClient(mongo_db_config=mongo_db_config).database[args.collection]
+    if args.create_index:
+        collection.create_index("case_id")
+    if args.n_cases is None:
+        args.n_cases = collection.estimated_document_count()
+    print(f"{args.n_cases} cases in {args.collection}, {args.ids_per_query} case_id per query, "
+          f"max pool size {mongo_db_config.max_pool_size}, {os.cpu_count()} cpus")
+    print(f"{'mode':<12} {'workers':>7} {'queries/s':>10} {'docs/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'connections':>11} {'max in use':>10} {'wait ms':>8}")
+
+    for mode in args.modes:
+        for n_workers in args.workers:
+            # a fresh client per measurement, so the pool counters are the ones of this run
+            MongoDBClient.close()
+            if mode == "threads":
+                results, metrics = run_threads(n_workers, args, mongo_db_config)
+            elif mode == "processes":
+                results, metrics = run_processes(n_workers, args, mongo_db_config)
+            else:
+                results, metrics = asyncio.run(run_coroutines(n_workers, args, mongo_db_config))
+
+            latencies = np.concatenate([np.asarray(worker_latencies) for _, worker_latencies in results]) * 1000
+            n_documents = sum(worker_documents for worker_documents, _ in results)
+            pool = (f"{metrics['connections_created']:>11} {metrics['max_checked_out']:>10} "
+                    f"{metrics['mean_checkout_wait_ms']:>8.2f}" if metrics else f"{'-':>11} {'-':>10} {'-':>8}")
+            print(f"{mode:<12} {n_workers:>7} {len(latencies) / args.seconds:>10.0f} "
+                  f"{n_documents / args.seconds:>10.0f} {np.percentile(latencies, 50):>8.2f} "
+                  f"{np.percentile(latencies, 99):>8.2f} {pool}")
+    MongoDBClient.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="query throughput of the mongodb connection manager as the number "
+                                                 "of threads, forked processes or coroutines grows, against the "
+                                                 "collection behind MONGODB_URL, e.g. a local mongod loaded with "
+                                                 "generate_synthetic_data.py")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--modes", nargs="+", choices=["threads", "processes", "asyncio"],
+                        default=["threads", "processes", "asyncio"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--seconds", type=float, default=5.0, help="measured time per mode and worker count")
+    parser.add_argument("--ids-per-query", type=int, default=1, help="case_id values looked up per query")
+    parser.add_argument("--n-cases", type=int, help="case_id values to draw from, by default the collection size")
+    parser.add_argument("--max-pool-size", type=int, help="overrides MONGODB_MAX_POOL_SIZE, e.g. below the worker "
+                                                          "count to see the wait for a connection")
+    parser.add_argument("--create-index", action="store_true", help="create an index on case_id first")
+    main(parser.parse_args())
@@ -0,0 +1,85 @@
+import os
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.data_access.synthetic_data import iter_usvisa_chunks
+from us_visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from us_visa.entity.config_entity import DataTransfomationConfig
+from us_visa.utils.main_utils import DataFrameWriter, load_numpy_array_data
+
+
+def write_data(tmp_dir: str, n_rows: int, test_fraction: float = 0.2) -> DataIngestionArtifact:
+    # synthetic train and test files written chunk by chunk, the benchmark process never holds them
+    train_file_path, test_file_path = os.path.join(tmp_dir, "train.parquet"), os.path.join(tmp_dir, "test.parquet")
+    n_test = int(n_rows * test_fraction)
+    with DataFrameWriter(train_file_path) as train_writer, DataFrameWriter(test_file_path) as test_writer:
+        start = 0
+        for chunk in iter_usvisa_chunks(n_rows):
+            test_rows = max(0, min(len(chunk), n_test - start))
+            if test_rows:
+                test_writer.write(chunk.iloc[:test_rows])
+            if test_rows < len(chunk):
+                train_writer.write(chunk.iloc[test_rows:])
+            start += len(chunk)
+    return DataIngestionArtifact(train_file_path=train_file_path, test_file_path=test_file_path)
+
+
+def transform(data_ingestion_artifact: DataIngestionArtifact, artifact_dir: str, out_of_core: bool, args, queue) -> None:
+    # runs in a fresh process, so its peak RSS is the one of the transformation
+    config = DataTransfomationConfig()
+    for name, value in vars(config).items():
+        if isinstance(value, str) and value.startswith(config.data_transformation_dir):
+            setattr(config, name, os.path.join(artifact_dir, os.path.relpath(value, config.data_transformation_dir)))
+    config.resampling_strategy = "class_weight"
+    config.out_of_core = out_of_core
+    config.chunk_size = args.chunk_size
+    config.reservoir_size = args.reservoir_size
+
+    start = time.perf_counter()
+    artifact = DataTransformation(data_ingestion_artifact, DataValidationArtifact(True, "", "", ""),
+                                  config).initiate_data_transformation()
+    queue.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+               artifact.transformed_train_file_path))
+
+
+def main(args) -> None:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_ingestion_artifact = write_data(tmp_dir, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(data_ingestion_artifact.train_file_path) / 1024 ** 2:.0f} MB "
+              f"training parquet, chunk size {args.chunk_size}, reservoir size {args.reservoir_size}")
+        print(f"{'mode':<12} {'seconds':>9} {'peak RSS MB':>12} {'max abs diff':>13}")
+        train_file_paths = {}
+        for mode in args.modes:
+            queue = context.Queue()
+            process = context.Process(target=transform, args=(data_ingestion_artifact, os.path.join(tmp_dir, mode),
+                                                              mode == "out_of_core", args, queue))
+            process.start()
+            seconds, peak_rss_mb, train_file_paths[mode] = queue.get()
+            process.join()
+
+            difference = "-"
+            if mode != "in_memory" and "in_memory" in train_file_paths:
+                reference = load_numpy_array_data(train_file_paths["in_memory"])
+                features = load_numpy_array_data(train_file_paths[mode])
+                # block by block, the arrays may not fit in memory together
+                max_difference = max(np.abs(reference[i:i + args.chunk_size] - features[i:i + args.chunk_size]).max()
+                                     for i in range(0, len(features), args.chunk_size))
+                difference = f"{max_difference:.2e}"
+            print(f"{mode:<12} {seconds:>9.2f} {peak_rss_mb:>12.0f} {difference:>13}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time, peak RSS and output difference of the in-memory and the "
+                                                 "out-of-core data transformation")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--modes", nargs="+", choices=["in_memory", "out_of_core"], default=["in_memory", "out_of_core"])
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--reservoir-size", type=int, default=100000)
+    main(parser.parse_args())
@@ -0,0 +1,84 @@
+import time
+import argparse
+
+import bson
+import pandas as pd
+
+from us_visa.constants import COLLECTION_NAME, DATABASE_NAME, SCHEMA_FILE_PATH, TARGET_COLUMN
+from us_visa.configuration.mongo_db_connection import MongoDBClient
+from us_visa.data_access.aggregation_pipeline import compile_ingestion_pipeline, get_pushdown_schema
+from us_visa.data_access.synthetic_data import load_into_collection
+from us_visa.data_access.usvisa_data import USvisaData
+from us_visa.entity.estimator import prepare_input_features
+from us_visa.utils.main_utils import read_yaml, get_column_dtypes
+
+
+def bytes_out(usvisa_data: USvisaData):
+    # bytes sent by the server so far, None when it does not report them, e.g. mongomock
+    try:
+        return usvisa_data.mongo_client.client.admin.command("serverStatus")["network"]["bytesOut"]
+    except Exception:
+        return None
+
+
+def main(args) -> None:
+    if not args.mongo:
+        import mongomock
+
+        MongoDBClient.client = mongomock.MongoClient()
+        load_into_collection(MongoDBClient.client[DATABASE_NAME][COLLECTION_NAME], args.rows)
+
+    schema_config = read_yaml(SCHEMA_FILE_PATH)
+    pipeline = compile_ingestion_pipeline(schema_config)
+    column_dtypes = get_column_dtypes(get_pushdown_schema(schema_config))
+    usvisa_data = USvisaData()
+    collection = usvisa_data._get_collection(args.collection)
+
+    # both modes end with the features the data transformation fits the preprocessor on
+    modes = {
+        "client": (lambda: prepare_input_features(usvisa_data.export_collection_as_dataframe(args.collection)
+                                                  .drop(columns=TARGET_COLUMN), schema_config.drop_columns),
+                   lambda: collection.find()),
+        "pushdown": (lambda: prepare_input_features(usvisa_data.export_pipeline_as_dataframe(
+                         args.collection, pipeline, column_dtypes).drop(columns=TARGET_COLUMN), []),
+                     lambda: collection.aggregate(pipeline)),
+    }
+    print(f"{collection.estimated_document_count()} documents in {args.collection}"
+          + ("" if args.mongo else " (mongomock, the server work runs in this process)"))
+    print(f"{'mode':<10} {'seconds':>9} {'cpu s':>8} {'payload MB':>11} {'wire MB':>9}")
+    features = {}
+    for mode, (export, documents) in modes.items():
+        seconds, cpu_seconds, wire_bytes = [], [], None
+        for _ in range(args.repeat):
+            start_bytes = bytes_out(usvisa_data)
+            start, start_cpu = time.perf_counter(), time.process_time()
+            features[mode] = export()
+            seconds.append(time.perf_counter() - start)
+            cpu_seconds.append(time.process_time() - start_cpu)
+            end_bytes = bytes_out(usvisa_data)
+            if start_bytes is not None and end_bytes is not None:
+                wire_bytes = end_bytes - start_bytes
+        # BSON size of the documents the server returns, measured apart from the timed runs
+        payload_bytes = sum(len(bson.encode(document)) for document in documents())
+        wire = f"{wire_bytes / 1024 ** 2:>9.1f}" if wire_bytes is not None else f"{'-':>9}"
+        print(f"{mode:<10} {min(seconds):>9.3f} {min(cpu_seconds):>8.3f} {payload_bytes / 1024 ** 2:>11.1f} {wire}")
+
+    client, pushdown = features["client"], features["pushdown"]
+    equal = (list(client.columns) == list(pushdown.columns) and
+             client.reset_index(drop=True).equals(pushdown.reset_index(drop=True)))
+    print(f"equivalent output: {equal}")
+    if not equal:
+        pd.testing.assert_frame_equal(client.reset_index(drop=True), pushdown.reset_index(drop=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="export time, client cpu time and transferred bytes of the client "
+                                                 "side preprocessing and of the aggregation pipeline pushdown, and "
+                                                 "whether both produce the same features")
+    parser.add_argument("--rows", type=int, default=25000, help="synthetic documents loaded into mongomock")
+    parser.add_argument("--mongo", action="store_true",
+                        help="use the collection behind MONGODB_URL, e.g. a local mongod loaded with "
+                             "generate_synthetic_data.py, instead of mongomock")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per mode, the fastest is kept")
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score
+
+from us_visa.constants import TARGET_COLUMN
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.components.resampling import Resampler, RESAMPLING_STRATEGIES
+from us_visa.entity.config_entity import DataTransfomationConfig
+from us_visa.entity.estimator import TargetValueMapping, prepare_input_features
+from us_visa.utils.main_utils import get_column_dtypes
+
+
+def transform(train_file_path: str, test_file_path: str) -> tuple:
+    # the preprocessing of the data transformation stage, without its resampling
+    data_transformation = DataTransformation(None, None, DataTransfomationConfig())
+    columns = data_transformation.get_required_columns()
+    column_dtypes = get_column_dtypes(data_transformation._schema_config)
+    drop_columns = data_transformation._schema_config.drop_columns
+    arrays = []
+    preprocessor = data_transformation.get_data_transformer_object()
+    for i, file_path in enumerate((train_file_path, test_file_path)):
+        df = DataTransformation.read_data(file_path, columns, column_dtypes)
+        X = prepare_input_features(df.drop(columns=TARGET_COLUMN), drop_columns)
+        X = preprocessor.fit_transform(X) if i == 0 else preprocessor.transform(X)
+        arrays += [np.asarray(X, dtype=np.float64), df[TARGET_COLUMN].map(TargetValueMapping()._asdict()).to_numpy(dtype=int)]
+    return tuple(arrays)
+
+
+def scale_up(X: np.ndarray, y: np.ndarray, factor: int, noise: float = 0.01) -> tuple:
+    # copies of the training rows with a small jitter, so the neighbour searches do not see exact duplicates
+    rng = np.random.default_rng(42)
+    X = np.concatenate([X] + [X + rng.normal(scale=noise, size=X.shape) for _ in range(factor - 1)])
+    return X, np.tile(y, factor)
+
+
+def benchmark(strategy: str, X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray, y_test: np.ndarray,
+              args) -> dict:
+    resampler = Resampler(strategy, n_jobs=args.n_jobs, knn_algorithm=args.knn_algorithm,
+                          chunk_size=args.chunk_size, partition_size=args.partition_size)
+    tracemalloc.start()
+    start = time.perf_counter()
+    X, y, sample_weight = resampler.fit_resample(X_train, y_train)
+    seconds = time.perf_counter() - start
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    tracemalloc.stop()
+
+    model = RandomForestClassifier(n_estimators=args.trees, random_state=42, n_jobs=args.n_jobs)
+    model.fit(X, y, sample_weight=sample_weight)
+    return {"strategy": strategy, "rows": len(y), "seconds": seconds, "peak_mb": peak_mb,
+            "f1": f1_score(y_test, model.predict(X_test))}
+
+
+def main(args) -> None:
+    X_train, y_train, X_test, y_test = transform(args.train_file_path, args.test_file_path)
+    if args.scale > 1:
+        X_train, y_train = scale_up(X_train, y_train, args.scale)
+    print(f"{len(y_train)} training rows, {X_train.shape[1]} features, "
+          f"{np.bincount(y_train).tolist()} rows per class, {len(y_test)} test rows")
+    print(f"{'strategy':<16} {'rows':>8} {'seconds':>9} {'peak MB':>9} {'test F1':>8}")
+    for strategy in args.strategies:
+        row = benchmark(strategy, X_train, y_train, X_test, y_test, args)
+        print(f"{row['strategy']:<16} {row['rows']:>8} {row['seconds']:>9.2f} {row['peak_mb']:>9.1f} {row['f1']:>8.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time, peak memory and downstream test F1 of the resampling strategies")
+    parser.add_argument("train_file_path", help="ingested training data, e.g. artifact/<timestamp>/data_ingestion/ingested/train.csv")
+    parser.add_argument("test_file_path")
+    parser.add_argument("--strategies", nargs="+", choices=RESAMPLING_STRATEGIES, default=list(RESAMPLING_STRATEGIES))
+    parser.add_argument("--scale", type=int, default=1,
+                        help="resample this many jittered copies of the training rows, to measure larger data")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--knn-algorithm", default="auto", choices=["auto", "ball_tree", "kd_tree", "brute"])
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--partition-size", type=int, default=20000)
+    parser.add_argument("--trees", type=int, default=100, help="trees of the random forest scored on the test data")
+    main(parser.parse_args())
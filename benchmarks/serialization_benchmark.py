@@ -0,0 +1,160 @@
+import os
+import time
+import argparse
+import tempfile
+import importlib.util
+import multiprocessing
+
+import dill
+import numpy as np
+
+from us_visa.constants import MODEL_FILE_NAME, PREPROCESSING_OBJECT_FILE_NAME
+from us_visa.utils.main_utils import save_object, load_object
+
+
+def dill_dump(file_path: str, obj: object) -> None:
+    # format of save_object before the serialization header, read back by load_object
+    with open(file_path, 'wb') as file:
+        dill.dump(obj, file)
+
+
+# name: (save function, mmap_mode of load_object)
+FORMATS = {
+    "dill": (dill_dump, None),
+    "pickle5": (save_object, None),
+    "pickle5+mmap": (save_object, 'r'),
+    "pickle5+zlib": (lambda file_path, obj: save_object(file_path, obj, compression="zlib"), None),
+}
+for compression, module in (("lz4", "lz4.frame"), ("zstd", "zstandard")):
+    if importlib.util.find_spec(module.split(".")[0]) is not None:
+        FORMATS[f"pickle5+{compression}"] = (lambda file_path, obj, c=compression: save_object(file_path, obj, compression=c), None)
+
+
+def memory_mb() -> dict:
+    # private memory is what a process does not share with the other processes mapping the same pages
+    fields = {}
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def walk(obj: object):
+    # every object reachable from obj through containers, object arrays and instance attributes
+    seen, stack = set(), [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        yield item
+        if isinstance(item, np.ndarray):
+            if item.dtype == object:
+                stack.extend(item.ravel().tolist())
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.extend(vars(item).values())
+
+
+def touch_arrays(obj: object) -> None:
+    # reads every array, so memory-mapped pages are resident as they are when scoring
+    for item in walk(obj):
+        if isinstance(item, np.ndarray) and item.dtype != object and item.flags.c_contiguous:
+            item.reshape(-1).view(np.uint8).sum()
+
+
+def load_in_process(file_path: str, mmap_mode, modules: list, barrier, results) -> None:
+    # the modules of the object are imported before measuring, only the object itself is counted
+    for module in modules:
+        importlib.import_module(module)
+    before = memory_mb()
+    obj = load_object(file_path, mmap_mode=mmap_mode)
+    touch_arrays(obj)
+    # every process holds the object when memory is measured, so shared pages are counted as shared
+    barrier.wait()
+    after = memory_mb()
+    results.put({key: after[key] - before[key] for key in after})
+    barrier.wait()
+
+
+def benchmark(name: str, obj: object, n_processes: int, repeat: int) -> list:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for format_name, (save, mmap_mode) in FORMATS.items():
+            file_path = os.path.join(tmp_dir, f"{format_name}.pkl")
+            save_times, load_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                save(file_path, obj)
+                save_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                touch_arrays(load_object(file_path, mmap_mode=mmap_mode))
+                load_times.append(time.perf_counter() - start)
+
+            modules = sorted({type(item).__module__ for item in walk(obj)} - {"builtins"})
+            context = multiprocessing.get_context("spawn")
+            barrier, results = context.Barrier(n_processes), context.Queue()
+            processes = [context.Process(target=load_in_process, args=(file_path, mmap_mode, modules, barrier, results))
+                         for _ in range(n_processes)]
+            for process in processes:
+                process.start()
+            memory = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            rows.append({"object": name, "format": format_name, "file_mb": os.path.getsize(file_path) / 1024 ** 2,
+                         "save_ms": min(save_times) * 1000, "load_ms": min(load_times) * 1000,
+                         "private_mb": np.mean([m["private"] for m in memory]),
+                         "pss_mb": np.mean([m["pss"] for m in memory])})
+    return rows
+
+
+def fit_forest(n_rows: int, n_estimators: int):
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(n_rows, 20))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(size=n_rows) > 0).astype(int)
+    return RandomForestClassifier(n_estimators=n_estimators, min_samples_leaf=5, random_state=42, n_jobs=-1).fit(X, y)
+
+
+def main(args) -> None:
+    objects = {}
+    if args.objects:
+        for file_path in args.objects:
+            objects[os.path.basename(file_path)] = load_object(file_path, mmap_mode=None)
+    else:
+        from us_visa.entity.model_registry import ModelRegistry
+        model_registry = ModelRegistry()
+        if model_registry.current_version() is not None:
+            version_dir = model_registry.fetch()
+            for file_name in (PREPROCESSING_OBJECT_FILE_NAME, MODEL_FILE_NAME):
+                objects[file_name] = load_object(os.path.join(version_dir, file_name), mmap_mode=None)
+    if args.forest_rows:
+        objects[f"RandomForest({args.forest_trees} trees, {args.forest_rows} rows)"] = fit_forest(args.forest_rows, args.forest_trees)
+
+    print(f"{'object':<40} {'format':<14} {'file MB':>8} {'save ms':>9} {'load ms':>9} "
+          f"{'private MB/proc':>16} {'PSS MB/proc':>12}")
+    for name, obj in objects.items():
+        for row in benchmark(name, obj, args.processes, args.repeat):
+            print(f"{row['object'][:40]:<40} {row['format']:<14} {row['file_mb']:>8.2f} {row['save_ms']:>9.1f} "
+                  f"{row['load_ms']:>9.1f} {row['private_mb']:>16.2f} {row['pss_mb']:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="save/load time and per-process memory of the save_object formats against dill")
+    parser.add_argument("objects", nargs="*",
+                        help="saved objects to benchmark, by default the preprocessor and the model of the current "
+                             "version of the model registry")
+    parser.add_argument("--forest-rows", type=int, default=100000,
+                        help="also benchmark a RandomForestClassifier fitted on this many synthetic rows, 0 disables it")
+    parser.add_argument("--forest-trees", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=4, help="number of processes loading the object at once")
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
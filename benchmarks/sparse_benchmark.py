@@ -0,0 +1,92 @@
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from us_visa.components.resampling import Resampler, RESAMPLING_STRATEGIES
+from us_visa.utils.main_utils import save_numpy_array_data, save_sparse_matrix_data, load_numpy_array_data
+
+
+def make_data(n_rows: int, cardinality: int, n_categorical: int = 3, n_numeric: int = 4) -> tuple:
+    # categorical columns of the given cardinality next to numeric ones, the target depends on both
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({f"num_{i}": rng.normal(size=n_rows) for i in range(n_numeric)})
+    effects = rng.normal(size=cardinality)
+    logit = df["num_0"].to_numpy() - 1.0
+    for i in range(n_categorical):
+        codes = rng.zipf(1.3, size=n_rows) % cardinality
+        df[f"cat_{i}"] = pd.Series(codes).astype(str).radd("c")
+        logit = logit + effects[codes]
+    y = (logit + rng.logistic(size=n_rows) > 0).astype(int)
+    return df, y
+
+
+def run(df: pd.DataFrame, y: np.ndarray, sparse_output: bool, args) -> dict:
+    preprocessor = ColumnTransformer(
+        [("OneHotEncoder", OneHotEncoder(handle_unknown="ignore"), [c for c in df.columns if c.startswith("cat_")]),
+         ("StandardScaler", StandardScaler(), [c for c in df.columns if c.startswith("num_")])],
+        sparse_threshold=1.0 if sparse_output else 0.0)
+    timings = {}
+    tracemalloc.start()
+
+    start = time.perf_counter()
+    X = preprocessor.fit_transform(df)
+    X = X.astype(args.dtype, copy=False)
+    timings["transform_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X, y, sample_weight = Resampler(args.strategy).fit_resample(X, y)
+    timings["resample_s"] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        if sparse_output:
+            file_path = os.path.join(tmp_dir, "train.npz")
+            save_sparse_matrix_data(file_path, X)
+        else:
+            file_path = os.path.join(tmp_dir, "train.npy")
+            save_numpy_array_data(file_path, X)
+        X = load_numpy_array_data(file_path, mmap_mode=None)
+        timings["save_load_s"] = time.perf_counter() - start
+        file_mb = os.path.getsize(file_path) / 1024 ** 2
+
+    start = time.perf_counter()
+    LogisticRegression(max_iter=200).fit(X, y, sample_weight=sample_weight)
+    timings["fit_s"] = time.perf_counter() - start
+
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    tracemalloc.stop()
+    matrix_mb = (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes if sp.issparse(X) else X.nbytes) / 1024 ** 2
+    return {"width": X.shape[1], "matrix_mb": matrix_mb, "file_mb": file_mb, "peak_mb": peak_mb, **timings}
+
+
+def main(args) -> None:
+    print(f"{'cardinality':>11} {'mode':<7} {'width':>6} {'matrix MB':>10} {'file MB':>8} {'peak MB':>8} "
+          f"{'transform s':>11} {'resample s':>10} {'save+load s':>11} {'fit s':>7}")
+    for cardinality in args.cardinalities:
+        df, y = make_data(args.rows, cardinality)
+        for mode in ("dense", "sparse"):
+            row = run(df, y, mode == "sparse", args)
+            print(f"{cardinality:>11} {mode:<7} {row['width']:>6} {row['matrix_mb']:>10.1f} {row['file_mb']:>8.1f} "
+                  f"{row['peak_mb']:>8.1f} {row['transform_s']:>11.2f} {row['resample_s']:>10.2f} "
+                  f"{row['save_load_s']:>11.2f} {row['fit_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="memory and time of the dense and the sparse feature path as "
+                                                 "the one-hot width grows")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--cardinalities", type=int, nargs="+", default=[10, 100, 1000, 5000],
+                        help="categories per categorical column, three categorical columns are one-hot encoded")
+    parser.add_argument("--strategy", choices=RESAMPLING_STRATEGIES, default="class_weight",
+                        help="resampling strategy applied between the transformation and the storage")
+    parser.add_argument("--dtype", default="float32")
+    main(parser.parse_args())
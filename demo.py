@@ -1,6 +1,18 @@
 import sys
+import argparse
 
+from us_visa.logger import configure_logging
 from us_visa.pipeline.training_pipeline import TrainingPipeline
 
-obj = TrainingPipeline()
+parser = argparse.ArgumentParser()
+parser.add_argument("--force", action="store_true", help="recompute every stage, ignoring the stage cache")
+parser.add_argument("--resume", action="store_true", help="skip the stages completed by the previous, failed, run")
+parser.add_argument("--profile", nargs="?", const="cprofile", choices=["cprofile", "pyinstrument"],
+                    help="profile every stage into artifact/<timestamp>/profile, with cprofile by default")
+parser.add_argument("--trace-memory", action="store_true", default=None,
+                    help="record the tracemalloc peak of every stage, implied by --profile")
+args = parser.parse_args()
+
+configure_logging()
+obj = TrainingPipeline(force=args.force, resume=args.resume, profiler=args.profile, trace_memory=args.trace_memory)
 obj.run_pipeline()
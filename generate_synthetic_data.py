@@ -0,0 +1,41 @@
+import argparse
+
+from us_visa.constants import COLLECTION_NAME
+from us_visa.logger import configure_logging
+from us_visa.data_access.synthetic_data import iter_usvisa_chunks, load_into_collection, CERTIFIED_RATE
+from us_visa.utils.main_utils import DataFrameWriter
+
+
+def main(args) -> None:
+    if args.output:
+        n_rows = 0
+        with DataFrameWriter(args.output) as writer:
+            for chunk in iter_usvisa_chunks(args.rows, args.chunk_size, args.random_state, args.certified_rate):
+                writer.write(chunk)
+                n_rows += len(chunk)
+        print(f"Wrote {n_rows} rows to {args.output}")
+        return
+
+    from us_visa.configuration.mongo_db_connection import MongoDBClient
+
+    collection = MongoDBClient().database[args.collection]
+    if args.drop:
+        collection.drop()
+    n_rows = load_into_collection(collection, args.rows, args.chunk_size, args.random_state, args.certified_rate)
+    print(f"Inserted {n_rows} documents into {args.collection}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generates EasyVisa shaped data matching config/schema.yaml into a "
+                                                 "file, or into the mongodb collection behind MONGODB_URL")
+    parser.add_argument("--rows", type=int, default=25000, help="e.g. 25000, 1000000 or 10000000")
+    parser.add_argument("--output", help="csv, parquet or feather file, by default the rows are inserted into mongodb")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--drop", action="store_true", help="drop the collection before inserting")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--certified-rate", type=float, default=CERTIFIED_RATE)
+    args = parser.parse_args()
+
+    configure_logging()
+    main(args)
@@ -0,0 +1,106 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+CASE = {
+    "case_id": "EZYV01",
+    "continent": "Asia",
+    "education_of_employee": "Master's",
+    "has_job_experience": "Y",
+    "requires_job_training": "N",
+    "no_of_employees": 2412,
+    "yr_of_estab": 2002,
+    "region_of_employment": "West",
+    "prevailing_wage": 83425.65,
+    "unit_of_wage": "Year",
+    "full_time_position": "Y",
+}
+
+
+async def request(reader, writer, host: str, method: str, path: str, body: bytes = b"") -> bytes:
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    headers = await reader.readuntil(b"\r\n\r\n")
+    status = int(headers.split(b" ", 2)[1])
+    content_length = 0
+    for line in headers.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            content_length = int(line.split(b":", 1)[1])
+    content = await reader.readexactly(content_length)
+    if status != 200:
+        raise Exception(f"{method} {path} returned {status}: {content[:200]}")
+    return content
+
+
+async def client(host: str, port: int, n_requests: int, latencies: list) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(CASE).encode()
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        await request(reader, writer, host, "POST", "/predict", body)
+        latencies.append((start, time.perf_counter() - start))
+    writer.close()
+
+
+async def get_stats(host: str, port: int) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    stats = json.loads(await request(reader, writer, host, "GET", "/stats"))
+    writer.close()
+    return stats
+
+
+async def swap(version: str, n_requests: int, latencies: list, swap_times: list) -> None:
+    # points the model registry at version halfway through the run, the server swaps it in on its next poll
+    from us_visa.entity.model_registry import ModelRegistry
+
+    while len(latencies) < n_requests // 2:
+        await asyncio.sleep(0.01)
+    swap_times.append(time.perf_counter())
+    await asyncio.get_running_loop().run_in_executor(None, ModelRegistry().set_current, version)
+
+
+async def main(args) -> int:
+    latencies, swap_times = [], []
+    n_requests = args.requests // args.concurrency * args.concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*[client(args.host, args.port, args.requests // args.concurrency, latencies)
+                           for _ in range(args.concurrency)],
+                         *([swap(args.swap_to, n_requests, latencies, swap_times)] if args.swap_to else []))
+    wall_time = time.perf_counter() - start
+
+    p50, p99 = np.percentile([latency for _, latency in latencies], [50, 99]) * 1000
+    print(f"{len(latencies)} requests, {args.concurrency} connections: {len(latencies) / wall_time:.0f} predictions/sec, "
+          f"client p50 {p50:.2f}ms p99 {p99:.2f}ms")
+
+    stats = await get_stats(args.host, args.port)
+    print("server stats:", stats)
+    if not args.swap_to:
+        return 0
+
+    # no request sent after the pointer flip may wait longer than the p99 before it plus the model load time
+    before = [latency for sent, latency in latencies if sent < swap_times[0]]
+    after = [latency for sent, latency in latencies if sent >= swap_times[0]]
+    if stats["model_version"] != args.swap_to:
+        print(f"model version {args.swap_to} was not swapped in during the run, raise --requests")
+        return 1
+    limit = np.percentile(before, 99) + stats["model_load_seconds"]
+    print(f"hot-swap: p99 before {np.percentile(before, 99) * 1000:.2f}ms, model load {stats['model_load_seconds'] * 1000:.1f}ms, "
+          f"max after {max(after) * 1000:.2f}ms, limit {limit * 1000:.2f}ms")
+    return 0 if max(after) <= limit else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load generator for the prediction service of app.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--concurrency", type=int, default=64, help="number of concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=20000, help="total number of single-case requests")
+    parser.add_argument("--swap-to", metavar="VERSION",
+                        help="make VERSION the current version of the model registry halfway through the run and "
+                             "check that the hot-swap causes no latency spike beyond the model load time")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -5,5 +5,5 @@ setup(
   version='0.0.0.0',
   author="Gaurav",
   author_email="gauravkumaya@gmail.com",
-  packages=find_packages()
+  packages=find_packages(exclude=["benchmarks"])
 )
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from us_visa.constants import DATABASE_NAME, MODEL_FILE_NAME, TARGET_COLUMN
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def root_dir():
+    # config/ and the artifact paths are relative to the root of the repository
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(ROOT_DIR)
+        yield ROOT_DIR
+
+
+@pytest.fixture(scope="session")
+def data_transformation(root_dir):
+    from us_visa.components.data_transformation import DataTransformation
+    from us_visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+    from us_visa.entity.config_entity import DataTransfomationConfig
+
+    return DataTransformation(DataIngestionArtifact(train_file_path="", test_file_path=""),
+                              DataValidationArtifact(validation_status=True, message="", report_file_path="",
+                                                     drift_sketch_file_path=""),
+                              DataTransfomationConfig())
+
+
+@pytest.fixture(scope="session")
+def features(data_transformation):
+    '''
+    input features of synthetic data, typed as the ingestion writes them, and with the target column
+    '''
+    from us_visa.data_access.synthetic_data import generate_usvisa_data
+    from us_visa.entity.estimator import prepare_input_features
+    from us_visa.utils.main_utils import cast_to_schema_dtypes, get_column_dtypes
+
+    schema_config = data_transformation._schema_config
+    dataframe = cast_to_schema_dtypes(generate_usvisa_data(3000, random_state=3), get_column_dtypes(schema_config))
+    return prepare_input_features(dataframe, schema_config.drop_columns)
+
+
+@pytest.fixture(scope="session")
+def model_file_path(data_transformation, features, tmp_path_factory):
+    '''
+    USvisaModel of a logistic regression fitted on features, saved as the model trainer saves it
+    '''
+    from sklearn.linear_model import LogisticRegression
+
+    from us_visa.entity.estimator import TargetValueMapping, USvisaModel
+    from us_visa.utils.main_utils import save_object
+
+    X = features.drop(columns=TARGET_COLUMN)
+    y = features[TARGET_COLUMN].astype(str).map(TargetValueMapping()._asdict())
+    preprocessor = data_transformation.get_data_transformer_object().fit(X)
+    model = LogisticRegression(max_iter=1000).fit(preprocessor.transform(X), y)
+    file_path = str(tmp_path_factory.mktemp("model") / MODEL_FILE_NAME)
+    save_object(file_path, USvisaModel(preprocessor, model))
+    return file_path
+
+
+def _convert_to_double(value, on_error):
+    # string to double conversion of $convert: a number, optionally signed and with an exponent, without spaces
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value == value.strip():
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return on_error
+
+
+def _patch_mongomock_convert() -> None:
+    # mongomock 4.3 does not implement $convert, this covers the {"to": "double"} form with onError and onNull
+    # the aggregation pipeline uses
+    from mongomock.aggregate import _Parser
+
+    if getattr(_Parser, "_convert_patched", False):
+        return
+    handle_type_convertion_operator = _Parser._handle_type_convertion_operator
+
+    def _handle_type_convertion_operator(self, operator, values):
+        if operator != "$convert" or values.get("to") != "double":
+            return handle_type_convertion_operator(self, operator, values)
+        try:
+            value = self.parse(values["input"])
+        except KeyError:
+            value = None
+        if value is None:
+            return values.get("onNull")
+        return _convert_to_double(value, values.get("onError"))
+
+    _Parser._handle_type_convertion_operator = _handle_type_convertion_operator
+    _Parser._convert_patched = True
+
+
+@pytest.fixture
+def mongo_database(monkeypatch):
+    '''
+    mongomock database injected into MongoDBClient, as the benchmarks do
+    '''
+    mongomock = pytest.importorskip("mongomock")
+    from us_visa.configuration.mongo_db_connection import MongoDBClient
+
+    _patch_mongomock_convert()
+    monkeypatch.setenv("MONGODB_URL", os.getenv("MONGODB_URL", "mongodb://localhost"))
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(MongoDBClient, "client", client)
+    yield client[DATABASE_NAME]
+    client.close()
@@ -0,0 +1,94 @@
+import os
+import uuid
+
+import pandas as pd
+import pytest
+
+from us_visa.constants import SCHEMA_FILE_PATH, TARGET_COLUMN
+from us_visa.data_access.aggregation_pipeline import compile_ingestion_pipeline, get_pushdown_schema
+from us_visa.data_access.synthetic_data import generate_usvisa_data
+from us_visa.data_access.usvisa_data import USvisaData
+from us_visa.entity.estimator import prepare_input_features
+from us_visa.utils.main_utils import read_yaml, get_column_dtypes
+
+
+def dirty_documents(n_rows: int = 400) -> list:
+    # synthetic documents with the values the client side export cleans up: "na", missing fields, numeric
+    # strings and non numeric strings
+    documents = generate_usvisa_data(n_rows, random_state=7).to_dict("records")
+    for i, document in enumerate(documents):
+        if i % 7 == 0:
+            document["no_of_employees"] = "na"
+        if i % 11 == 0:
+            del document["prevailing_wage"]
+        if i % 13 == 0:
+            document["yr_of_estab"] = str(document["yr_of_estab"])
+        if i % 17 == 0:
+            document["prevailing_wage"] = f"{document.get('prevailing_wage', 1.5)}"
+        if i % 19 == 0:
+            document["no_of_employees"] = "1,200"
+        if i % 23 == 0:
+            document["yr_of_estab"] = "unknown"
+        if i % 29 == 0:
+            document["continent"] = "na"
+        if i % 31 == 0:
+            del document["unit_of_wage"]
+    return documents
+
+
+def export_features(collection_name: str) -> tuple:
+    # features the data transformation reads with the client side preprocessing and with the pushdown
+    schema_config = read_yaml(SCHEMA_FILE_PATH)
+    usvisa_data = USvisaData()
+    client = prepare_input_features(usvisa_data.export_collection_as_dataframe(collection_name),
+                                    schema_config.drop_columns)
+    pushdown = prepare_input_features(usvisa_data.export_pipeline_as_dataframe(
+        collection_name, compile_ingestion_pipeline(schema_config),
+        get_column_dtypes(get_pushdown_schema(schema_config))), [])
+    return client.reset_index(drop=True), pushdown.reset_index(drop=True)
+
+
+def assert_equivalent(client: pd.DataFrame, pushdown: pd.DataFrame) -> None:
+    # the client side columns are in the order the keys first appear in the documents, a field missing from the
+    # first document moves to the end, the transformation selects the columns by name
+    assert sorted(client.columns) == sorted(pushdown.columns)
+    pd.testing.assert_frame_equal(client[pushdown.columns], pushdown)
+
+
+def test_pushdown_matches_client_export(mongo_database):
+    mongo_database["usvisa_dirty"].insert_many(dirty_documents())
+
+    client, pushdown = export_features("usvisa_dirty")
+
+    assert_equivalent(client, pushdown)
+    # the numeric strings are parsed and the other strings are missing values on both sides
+    assert pushdown["company_age"].isna().sum() == len(range(0, 400, 23))
+    assert pushdown["no_of_employees"].notna().sum() == 400 - len({*range(0, 400, 7), *range(0, 400, 19)})
+
+
+def test_pushdown_matches_client_export_of_clean_data(mongo_database):
+    mongo_database["usvisa_clean"].insert_many(generate_usvisa_data(300).to_dict("records"))
+
+    client, pushdown = export_features("usvisa_clean")
+
+    assert list(client.columns) == list(pushdown.columns)
+    assert_equivalent(client, pushdown)
+    assert pushdown["company_age"].dtype == "int16"
+    assert TARGET_COLUMN in pushdown.columns
+
+
+@pytest.mark.skipif(not os.getenv("MONGODB_URL"), reason="needs a mongod behind MONGODB_URL")
+def test_pushdown_matches_client_export_on_mongod():
+    # $convert and the other operators run on the server here, instead of in mongomock
+    from us_visa.configuration.mongo_db_connection import MongoDBClient
+
+    collection_name = f"usvisa_pushdown_test_{uuid.uuid4().hex}"
+    collection = MongoDBClient().database[collection_name]
+    try:
+        collection.insert_many(dirty_documents())
+
+        client, pushdown = export_features(collection_name)
+
+        assert_equivalent(client, pushdown)
+    finally:
+        collection.drop()
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from us_visa.entity.compiled_preprocessor import compile_preprocessor, check_parity
+from us_visa.exception import USvisaException
+
+TOLERANCE = 1e-9
+
+
+@pytest.fixture(scope="module")
+def fitted(data_transformation, features):
+    preprocessor = data_transformation.get_data_transformer_object().fit(features)
+    return preprocessor, compile_preprocessor(preprocessor)
+
+
+@pytest.fixture(scope="module")
+def fitted_ignoring_unknown(data_transformation, features):
+    # the encoders set to accept categories unseen in fit
+    preprocessor = data_transformation.get_data_transformer_object().set_params(
+        OneHotEncoder__handle_unknown="ignore",
+        OrdinalEncoder__handle_unknown="use_encoded_value", OrdinalEncoder__unknown_value=-1).fit(features)
+    return preprocessor, compile_preprocessor(preprocessor)
+
+
+def max_difference(preprocessor, compiled_preprocessor, dataframe: pd.DataFrame, data) -> float:
+    # difference of the compiled output on data, another form of dataframe, to the fitted preprocessor output
+    expected, actual = preprocessor.transform(dataframe), compiled_preprocessor.transform(data)
+    assert expected.shape == actual.shape
+    assert np.array_equal(np.isnan(expected), np.isnan(actual))
+    return float(np.nanmax(np.abs(expected - actual), initial=0.0))
+
+
+def with_unseen_categories(dataframe: pd.DataFrame) -> pd.DataFrame:
+    dataframe = dataframe.astype({"continent": object, "education_of_employee": object})
+    dataframe.loc[dataframe.index[0], "continent"] = "Antarctica"
+    dataframe.loc[dataframe.index[1], "education_of_employee"] = "Apprenticeship"
+    return dataframe
+
+
+def test_list_of_dicts(fitted, features):
+    assert check_parity(*fitted, features, atol=TOLERANCE) <= TOLERANCE
+
+
+def test_dict_of_one_record(fitted, features):
+    for i in range(5):
+        record = features.iloc[[i]]
+        assert max_difference(*fitted, record, record.to_dict(orient="records")[0]) <= TOLERANCE
+
+
+def test_dict_of_columns(fitted, features):
+    sample = features.head(200)
+    assert max_difference(*fitted, sample, sample.to_dict(orient="list")) <= TOLERANCE
+
+
+def test_record_array(fitted, features):
+    sample = features.head(200)
+    assert max_difference(*fitted, sample, sample.to_records(index=False)) <= TOLERANCE
+
+
+def test_missing_numeric_values(fitted, features):
+    sample = features.head(200).astype({"no_of_employees": "float64", "company_age": "float64"})
+    sample.iloc[::3, sample.columns.get_loc("no_of_employees")] = np.nan
+    sample.iloc[::5, sample.columns.get_loc("prevailing_wage")] = np.nan
+    sample.iloc[::7, sample.columns.get_loc("company_age")] = np.nan
+
+    assert check_parity(*fitted, sample, atol=TOLERANCE) <= TOLERANCE
+    assert max_difference(*fitted, sample, sample.to_records(index=False)) <= TOLERANCE
+
+
+def test_unseen_categories_are_rejected(fitted, features):
+    # the encoders of the repo raise on unseen categories, and so does the compiled preprocessor
+    preprocessor, compiled_preprocessor = fitted
+    sample = with_unseen_categories(features.head(20))
+
+    with pytest.raises(ValueError, match="unknown categories"):
+        preprocessor.transform(sample)
+    with pytest.raises(USvisaException, match="unknown categories"):
+        compiled_preprocessor.transform(sample.to_dict(orient="records"))
+
+
+def test_unseen_categories_are_ignored(fitted_ignoring_unknown, features):
+    sample = with_unseen_categories(features.head(200))
+    sample.loc[sample.index[2], "continent"] = np.nan
+
+    assert check_parity(*fitted_ignoring_unknown, sample, atol=TOLERANCE) <= TOLERANCE
+    assert max_difference(*fitted_ignoring_unknown, sample, sample.to_records(index=False)) <= TOLERANCE
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.components.data_validation import DataValidation
+from us_visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from us_visa.entity.config_entity import DataValidationConfig
+from us_visa.entity.data_handle import DataFrameHandle, frame_cache
+from us_visa.exception import USvisaException
+from us_visa.pipeline.training_pipeline import TrainingPipeline
+
+
+@pytest.fixture
+def data_handles(tmp_path):
+    # train and test handles consumed by the validation and the transformation, as the ingestion creates them
+    handles = [DataFrameHandle(str(tmp_path / f"{name}.parquet"), pd.DataFrame({"a": [1, 2, 3]}), consumers=2)
+               for name in ("train", "test")]
+    yield handles
+    for data_handle in handles:
+        frame_cache.pop(data_handle.file_path)
+
+
+def test_cache_hits_release_the_handles(data_handles, monkeypatch):
+    training_pipeline = TrainingPipeline()
+    cached_artifact = DataValidationArtifact(validation_status=True, message="", report_file_path="",
+                                             drift_sketch_file_path="")
+    monkeypatch.setattr(training_pipeline.stage_cache, "get", lambda *args: cached_artifact)
+
+    for stage_name in ("data_validation", "data_transformation"):
+        assert all(frame_cache.get(data_handle.file_path) is not None for data_handle in data_handles)
+        artifact = training_pipeline._run_cached_stage(stage_name, DataValidationArtifact, "key",
+                                                       run_stage=None, data_handles=data_handles + [None])
+        assert artifact is cached_artifact
+
+    assert all(frame_cache.get(data_handle.file_path) is None for data_handle in data_handles)
+
+
+def test_failed_read_releases_the_handle(data_handles):
+    # the transformation is the last consumer, the validation released the handle already
+    data_handle = data_handles[0]
+    data_handle.release()
+
+    with pytest.raises(USvisaException):
+        DataTransformation.read_ingested_data(data_handle.file_path, data_handle, columns=["missing"],
+                                              column_dtypes={})
+    assert frame_cache.get(data_handle.file_path) is None
+
+
+def test_failed_validation_releases_the_handle(data_handles, monkeypatch):
+    # the validation is the last consumer here
+    data_handle = data_handles[0]
+    data_handle.release()
+
+    def iter_chunks(chunk_size: int):
+        yield pd.DataFrame({"a": [1]})
+        raise OSError("read failed")
+
+    monkeypatch.setattr(data_handle, "iter_chunks", iter_chunks)
+    data_validation = DataValidation(DataIngestionArtifact(train_file_path=data_handle.file_path, test_file_path=""),
+                                     DataValidationConfig())
+    with pytest.raises(USvisaException):
+        data_validation.validate_dataset(data_handle.file_path, "Training", data_handle)
+    assert frame_cache.get(data_handle.file_path) is None
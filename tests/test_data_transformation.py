@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from us_visa.components.data_transformation import DataTransformation
+from us_visa.data_access.synthetic_data import generate_usvisa_data
+from us_visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from us_visa.entity.config_entity import DataTransfomationConfig
+from us_visa.entity.data_handle import DataFrameHandle, frame_cache
+from us_visa.exception import USvisaException
+from us_visa.utils.main_utils import DataFrameWriter, load_numpy_array_data
+
+
+@pytest.fixture
+def out_of_core_transformation(tmp_path):
+    # out-of-core transformation of synthetic train and test sets held by handles, the artifacts go to tmp_path
+    dataset = generate_usvisa_data(1000)
+    data_handles = []
+    for name, split in (("train", dataset.iloc[:800]), ("test", dataset.iloc[800:])):
+        file_path = str(tmp_path / f"{name}.parquet")
+        with DataFrameWriter(file_path) as writer:
+            writer.write(split)
+        data_handles.append(DataFrameHandle(file_path, split.reset_index(drop=True), consumers=1))
+    config = DataTransfomationConfig()
+    for name, value in vars(config).items():
+        if isinstance(value, str) and value.startswith(config.data_transformation_dir):
+            setattr(config, name, str(tmp_path / os.path.relpath(value, config.data_transformation_dir)))
+    config.resampling_strategy = "class_weight"
+    config.out_of_core = True
+    config.chunk_size = 300
+    data_ingestion_artifact = DataIngestionArtifact(train_file_path=data_handles[0].file_path,
+                                                    test_file_path=data_handles[1].file_path,
+                                                    train_data=data_handles[0], test_data=data_handles[1])
+    yield DataTransformation(data_ingestion_artifact, DataValidationArtifact(True, "", "", ""), config)
+    for data_handle in data_handles:
+        frame_cache.pop(data_handle.file_path)
+
+
+def test_out_of_core_writes_dense_arrays_and_releases_the_handles(out_of_core_transformation):
+    artifact = out_of_core_transformation.initiate_data_transformation()
+
+    assert artifact.transformed_train_file_path.endswith(".npy")
+    assert load_numpy_array_data(artifact.transformed_train_file_path).shape[0] == 800
+    assert load_numpy_array_data(artifact.transformed_test_file_path).shape[0] == 200
+    data_ingestion_artifact = out_of_core_transformation.data_ingestion_artifact
+    assert frame_cache.get(data_ingestion_artifact.train_file_path) is None
+    assert frame_cache.get(data_ingestion_artifact.test_file_path) is None
+
+
+def test_sparse_output_is_rejected_out_of_core(out_of_core_transformation):
+    out_of_core_transformation.data_transformation_config.sparse_output = True
+
+    with pytest.raises(USvisaException, match="sparse"):
+        out_of_core_transformation.initiate_data_transformation()
+    # the failed transformation releases the handles all the same
+    data_ingestion_artifact = out_of_core_transformation.data_ingestion_artifact
+    assert frame_cache.get(data_ingestion_artifact.train_file_path) is None
+    assert frame_cache.get(data_ingestion_artifact.test_file_path) is None
+
+
+def test_empty_split_is_reported_out_of_core(out_of_core_transformation, monkeypatch):
+    monkeypatch.setattr(out_of_core_transformation, "iter_ingested_chunks", lambda *args, **kwargs: iter(()))
+
+    with pytest.raises(USvisaException, match="No rows to transform in empty.parquet"):
+        out_of_core_transformation.transform_out_of_core(None, "empty.parquet", None, 0, "empty.npy")
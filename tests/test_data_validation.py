@@ -0,0 +1,48 @@
+import pytest
+
+from us_visa.components.data_validation import DataValidation
+from us_visa.data_access.synthetic_data import generate_usvisa_data
+from us_visa.entity.artifact_entity import DataIngestionArtifact
+from us_visa.entity.config_entity import DataValidationConfig
+from us_visa.utils.main_utils import DataFrameWriter, read_yaml
+
+
+@pytest.fixture
+def validate(tmp_path):
+    # validates train and test sets written as the ingestion writes them, the artifacts go to tmp_path
+    def validate(train_set, test_set):
+        train_file_path, test_file_path = str(tmp_path / "train.parquet"), str(tmp_path / "test.parquet")
+        for file_path, dataset in ((train_file_path, train_set), (test_file_path, test_set)):
+            with DataFrameWriter(file_path) as writer:
+                writer.write(dataset)
+        config = DataValidationConfig(report_file_path=str(tmp_path / "report.yaml"),
+                                      drift_sketch_file_path=str(tmp_path / "sketch.yaml"),
+                                      drift_reference_file_path=str(tmp_path / "reference.yaml"))
+        artifact = DataValidation(DataIngestionArtifact(train_file_path=train_file_path, test_file_path=test_file_path),
+                                  config).initiate_data_validation()
+        return artifact, read_yaml(config.report_file_path)
+
+    return validate
+
+
+def test_disjoint_splits_pass(validate):
+    dataset = generate_usvisa_data(1000)
+
+    artifact, report = validate(dataset.iloc[:800], dataset.iloc[800:])
+
+    assert artifact.validation_status, artifact.message
+    assert report.cross_split_duplicates == {"case_id": 0}
+
+
+def test_case_ids_in_both_splits_are_reported(validate):
+    dataset = generate_usvisa_data(1000)
+    # three cases of the training set leak into the test set, each split has no duplicate of its own
+    test_set = dataset.iloc[800:].copy()
+    test_set.iloc[:3, test_set.columns.get_loc("case_id")] = dataset["case_id"].iloc[:3].to_numpy()
+
+    artifact, report = validate(dataset.iloc[:800], test_set)
+
+    assert report.train.duplicates.case_id == 0 and report.test.duplicates.case_id == 0
+    assert report.cross_split_duplicates == {"case_id": 3}
+    assert not artifact.validation_status
+    assert "3 values of case_id are in both the training and testing data" in artifact.message
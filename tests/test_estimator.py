@@ -0,0 +1,27 @@
+import sklearn.utils
+from sklearn.linear_model import LogisticRegression
+
+from us_visa.entity.estimator import accepts_sparse
+
+
+class LegacyTagsModel:
+    # tags as scikit-learn before 1.6 returns them
+    def __init__(self, x_types: list):
+        self.x_types = x_types
+
+    def _get_tags(self) -> dict:
+        return {"X_types": self.x_types, "requires_fit": True}
+
+
+def test_accepts_sparse_from_the_tags():
+    assert accepts_sparse(LogisticRegression())
+    assert not accepts_sparse(object())
+
+
+def test_accepts_sparse_without_get_tags(monkeypatch):
+    # scikit-learn before 1.6 has no get_tags
+    monkeypatch.delattr(sklearn.utils, "get_tags")
+
+    assert accepts_sparse(LegacyTagsModel(["2darray", "sparse"]))
+    assert not accepts_sparse(LegacyTagsModel(["2darray"]))
+    assert not accepts_sparse(object())
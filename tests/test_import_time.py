@@ -0,0 +1,38 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+# module: (import time budget in ms, packages it must not load)
+BUDGETS = {
+    "us_visa.serving": (50, ("numpy", "pandas", "sklearn", "scipy", "pymongo", "imblearn", "dill")),
+    "us_visa.pipeline.prediction_service": (500, ("pandas", "sklearn", "scipy", "pymongo", "imblearn", "dill")),
+}
+# scales every budget, e.g. 2 on a slow CI machine
+BUDGET_FACTOR = float(os.getenv("IMPORT_TIME_BUDGET_FACTOR", "1.0"))
+REPEAT = int(os.getenv("IMPORT_TIME_REPEAT", "5"))
+
+
+def import_time_ms(module: str) -> tuple:
+    # cumulative import time of module in a fresh interpreter, from -X importtime, and the top-level
+    # packages it loaded
+    code = f"import sys, {module}; print(','.join(sorted({{name.split('.')[0] for name in sys.modules}})))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000, set(result.stdout.strip().split(","))
+    raise Exception(f"{module} is missing from the -X importtime output")
+
+
+@pytest.mark.parametrize("module", BUDGETS)
+def test_import_time_within_budget(module):
+    budget_ms, forbidden = BUDGETS[module]
+    # the fastest of several runs, the others include disk cache and scheduler noise
+    runs = [import_time_ms(module) for _ in range(REPEAT)]
+    elapsed_ms = min(elapsed for elapsed, _ in runs)
+
+    assert not set(forbidden) & runs[0][1], f"{module} loads {', '.join(sorted(set(forbidden) & runs[0][1]))}"
+    assert elapsed_ms <= budget_ms * BUDGET_FACTOR, (f"{module} imports in {elapsed_ms:.1f}ms, over its budget of "
+                                                     f"{budget_ms * BUDGET_FACTOR:.0f}ms")
@@ -0,0 +1,49 @@
+import sys
+
+import numpy as np
+import pytest
+
+from us_visa.utils.instrumentation import MetricsRecorder, _reset_peak_rss
+
+
+def allocate(n_mb: int) -> float:
+    # touches every page, so the array is resident until it is freed
+    return float(np.ones(n_mb * 1024 ** 2 // 8).sum())
+
+
+@pytest.mark.skipif(not _reset_peak_rss(), reason="the peak RSS cannot be reset on this platform")
+def test_stage_peak_rss_excludes_the_earlier_stages():
+    with MetricsRecorder() as recorder:
+        recorder.run_stage("large", allocate, 400)
+        recorder.run_stage("small", allocate, 50)
+
+    large, small = recorder.stages["large"], recorder.stages["small"]
+    assert large["peak_rss_mb"] - small["peak_rss_mb"] > 200
+    assert small["process_peak_rss_mb"] >= large["peak_rss_mb"]
+    assert recorder.run["process_peak_rss_mb"] >= large["peak_rss_mb"]
+
+
+def test_pyinstrument_falls_back_to_cprofile(tmp_path, monkeypatch):
+    # None in sys.modules makes the import raise ImportError, as when pyinstrument is not installed
+    monkeypatch.setitem(sys.modules, "pyinstrument", None)
+
+    with MetricsRecorder(profiler="pyinstrument", profile_dir=str(tmp_path)) as recorder:
+        recorder.run_stage("first", allocate, 1)
+        recorder.run_stage("second", allocate, 1)
+
+    assert recorder.stages["first"]["profile_file_path"].endswith(".prof")
+    assert recorder.stages["second"]["status"] == "succeeded" and "wall_s" in recorder.stages["second"]
+    assert not recorder._running_stages
+
+
+def test_failed_profiler_start_is_recorded(tmp_path, monkeypatch):
+    def start_profiler(stage):
+        raise RuntimeError("profiler failed")
+
+    with MetricsRecorder(profiler="cprofile", profile_dir=str(tmp_path)) as recorder:
+        monkeypatch.setattr(recorder, "_start_profiler", start_profiler)
+        with pytest.raises(RuntimeError):
+            recorder.run_stage("stage", allocate, 1)
+
+    assert recorder.stages["stage"]["status"] == "failed" and "wall_s" in recorder.stages["stage"]
+    assert not recorder._running_stages
@@ -0,0 +1,123 @@
+import io
+
+import pytest
+
+from us_visa.configuration.aws_connection import S3Client
+from us_visa.constants import MODEL_FILE_NAME, MODEL_REGISTRY_CURRENT_FILE_NAME
+from us_visa.entity.config_entity import ModelRegistryConfig
+from us_visa.entity.estimator import USvisaModel
+from us_visa.entity.model_registry import ModelRegistry, S3RegistryBackend
+from us_visa.exception import USvisaException
+from us_visa.utils.main_utils import load_object
+
+
+class StubS3Client:
+    '''
+    in-memory stand-in of the boto3 S3 client, with the calls and the responses S3RegistryBackend relies on
+    '''
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Bucket, Key])}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:
+        self.objects[Bucket, Key] = bytes(Body)
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str) -> None:
+        with open(Filename, 'rb') as file:
+            self.objects[Bucket, Key] = file.read()
+
+    def download_file(self, Bucket: str, Key: str, Filename: str) -> None:
+        with open(Filename, 'wb') as file:
+            file.write(self.get_object(Bucket, Key)["Body"].read())
+
+    def get_paginator(self, operation_name: str):
+        assert operation_name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket: str, Prefix: str, Delimiter: str):
+        # one page per common prefix, as S3 splits long listings into pages
+        prefixes = sorted({Prefix + key[len(Prefix):].split(Delimiter)[0] + Delimiter
+                           for bucket, key in self.objects
+                           if bucket == Bucket and key.startswith(Prefix) and Delimiter in key[len(Prefix):]})
+        if not prefixes:
+            yield {}
+        for prefix in prefixes:
+            yield {"CommonPrefixes": [{"Prefix": prefix}]}
+
+
+@pytest.fixture
+def s3_client():
+    return StubS3Client()
+
+
+@pytest.fixture
+def s3_registry(s3_client, tmp_path, monkeypatch):
+    # the registry creates its backend from the config, with the stub as the shared client of the endpoint
+    config = ModelRegistryConfig(backend="s3", bucket_name="usvisa-models", s3_prefix="registry/",
+                                 cache_dir=str(tmp_path / "cache"))
+    monkeypatch.setitem(S3Client.clients, config.endpoint_url, s3_client)
+    model_registry = ModelRegistry(config)
+    assert isinstance(model_registry.backend, S3RegistryBackend)
+    return model_registry
+
+
+def test_publish_uploads_the_bundle_below_the_prefix(s3_registry, s3_client, model_file_path):
+    version = s3_registry.publish({MODEL_FILE_NAME: model_file_path}, metadata={"score": 0.8})
+
+    keys = {key for _, key in s3_client.objects}
+    assert f"registry/versions/{version}/{MODEL_FILE_NAME}" in keys
+    assert s3_client.objects["usvisa-models", f"registry/{MODEL_REGISTRY_CURRENT_FILE_NAME}"] == version.encode()
+    assert s3_registry.list_versions() == [version]
+    assert s3_registry.get_manifest(version)["metadata"] == {"score": 0.8}
+
+
+def test_current_flips_to_the_new_version_and_back(s3_registry, model_file_path):
+    assert s3_registry.current_version() is None
+    first = s3_registry.publish({MODEL_FILE_NAME: model_file_path})
+    second = s3_registry.publish({MODEL_FILE_NAME: model_file_path})
+
+    assert s3_registry.list_versions() == [first, second]
+    assert s3_registry.current_version() == second
+    s3_registry.set_current(first)
+    assert s3_registry.current_version() == first
+    with pytest.raises(USvisaException):
+        s3_registry.set_current("20000101_000000_000000")
+    assert s3_registry.current_version() == first
+
+
+def test_unfinished_upload_is_not_a_version(s3_registry, s3_client, model_file_path):
+    version = s3_registry.publish({MODEL_FILE_NAME: model_file_path})
+    # files of an upload which stopped before its manifest
+    s3_client.put_object(Bucket="usvisa-models", Key=f"registry/versions/29990101_000000_000000/{MODEL_FILE_NAME}",
+                         Body=b"partial")
+
+    assert s3_registry.list_versions() == [version]
+
+
+def test_load_downloads_and_checks_the_current_version(s3_registry, s3_client, model_file_path, tmp_path):
+    version = s3_registry.publish({MODEL_FILE_NAME: model_file_path})
+
+    local_path = s3_registry.model_file_path()
+    assert local_path == str(tmp_path / "cache" / version / MODEL_FILE_NAME)
+    assert isinstance(load_object(local_path), USvisaModel)
+    # later loads read the cache
+    s3_client.objects.clear()
+    assert s3_registry.model_file_path(version) == local_path
+
+
+def test_load_rejects_a_corrupted_download(s3_registry, s3_client, model_file_path, tmp_path):
+    version = s3_registry.publish({MODEL_FILE_NAME: model_file_path})
+    s3_client.put_object(Bucket="usvisa-models", Key=f"registry/versions/{version}/{MODEL_FILE_NAME}", Body=b"x")
+
+    with pytest.raises(USvisaException, match="Checksum mismatch"):
+        s3_registry.fetch(version)
+    assert not (tmp_path / "cache" / version).exists()
@@ -0,0 +1,45 @@
+import numpy as np
+import yaml
+from sklearn.linear_model import LogisticRegression
+
+from us_visa.components.model_trainer import ModelTrainer
+from us_visa.entity.artifact_entity import DataTransformationArtifact
+from us_visa.entity.config_entity import ModelTrainerConfig
+from us_visa.utils.main_utils import load_object, read_yaml, save_numpy_array_data, save_object
+
+
+def test_best_model_is_refitted_on_all_training_rows(tmp_path):
+    rng = np.random.default_rng(0)
+    X_train, X_test = rng.standard_normal((600, 4)), rng.standard_normal((200, 4))
+    y_train, y_test = (X_train[:, 0] > 0).astype(int), (X_test[:, 0] > 0).astype(int)
+    sample_weight = np.where(y_train == 1, 2.0, 1.0)
+    arrays = {"train.npy": X_train, "test.npy": X_test, "train_target.npy": y_train, "test_target.npy": y_test,
+              "sample_weight.npy": sample_weight}
+    for file_name, array in arrays.items():
+        save_numpy_array_data(str(tmp_path / file_name), array)
+    save_object(str(tmp_path / "preprocessing.pkl"), None)
+    model_config = {"successive_halving": {"eta": 3, "min_fraction": 0.5, "validation_fraction": 0.2,
+                                           "random_state": 42},
+                    "model_selection": {"module_0": {"class": "LogisticRegression", "module": "sklearn.linear_model",
+                                                     "params": {"max_iter": 1000},
+                                                     "search_param_grid": {"C": [0.01, 1.0]}}}}
+    (tmp_path / "model.yaml").write_text(yaml.safe_dump(model_config))
+    artifact = DataTransformationArtifact(
+        transformed_object_file_path=str(tmp_path / "preprocessing.pkl"),
+        transformed_train_file_path=str(tmp_path / "train.npy"),
+        transformed_test_file_path=str(tmp_path / "test.npy"),
+        transformed_train_target_file_path=str(tmp_path / "train_target.npy"),
+        transformed_test_target_file_path=str(tmp_path / "test_target.npy"),
+        transformed_train_sample_weight_file_path=str(tmp_path / "sample_weight.npy"))
+    config = ModelTrainerConfig(trained_model_file_path=str(tmp_path / "model.pkl"),
+                                search_report_file_path=str(tmp_path / "search_report.yaml"),
+                                model_config_file_path=str(tmp_path / "model.yaml"), n_workers=1)
+
+    ModelTrainer(artifact, config).initiate_model_trainer()
+
+    report = read_yaml(config.search_report_file_path)
+    assert report.best.n_rows == 480 and report.best.refit_rows == 600
+    assert all(evaluation.peak_memory_mb >= 0 for evaluation in report.evaluations)
+    model = load_object(config.trained_model_file_path).trained_model_object
+    expected = LogisticRegression(**report.best.params).fit(X_train, y_train, sample_weight=sample_weight)
+    np.testing.assert_allclose(model.coef_, expected.coef_)
@@ -0,0 +1,69 @@
+import time
+import asyncio
+
+import numpy as np
+import pytest
+
+from us_visa.constants import CURRENT_YEAR, MODEL_FILE_NAME, TARGET_COLUMN
+from us_visa.entity.config_entity import ModelRegistryConfig, PredictionServiceConfig
+from us_visa.entity.model_registry import ModelRegistry
+from us_visa.pipeline.prediction_service import PredictionService
+
+N_CLIENTS = 16
+
+
+@pytest.fixture
+def model_registry_config(tmp_path):
+    return ModelRegistryConfig(backend="local", registry_dir=str(tmp_path / "registry"),
+                               cache_dir=str(tmp_path / "cache"))
+
+
+async def fire(service: PredictionService, records: list, until) -> list:
+    # N_CLIENTS concurrent clients sending one case after the other until until() is true, returns the latencies
+    latencies = []
+
+    async def client(i: int) -> None:
+        n = 0
+        while not until() or n == 0:
+            record = records[(i + n * N_CLIENTS) % len(records)]
+            start = time.perf_counter()
+            assert await service.predict(record) in ("Certified", "Denied")
+            latencies.append(time.perf_counter() - start)
+            n += 1
+
+    await asyncio.gather(*[client(i) for i in range(N_CLIENTS)])
+    return latencies
+
+
+def test_requests_during_swap_stay_within_the_model_load_time(model_registry_config, model_file_path, features):
+    model_registry = ModelRegistry(model_registry_config)
+    first = model_registry.publish({MODEL_FILE_NAME: model_file_path})
+    # the polling is left out, the swap is triggered below
+    service = PredictionService(PredictionServiceConfig(model_registry_config=model_registry_config,
+                                                        registry_poll_seconds=3600))
+    # raw cases, as the service receives them
+    cases = features.drop(columns=TARGET_COLUMN).head(500)
+    records = cases.assign(yr_of_estab=CURRENT_YEAR - cases.pop("company_age")).to_dict(orient="records")
+
+    async def run() -> tuple:
+        service.load_model()
+        await service.start()
+        try:
+            baseline_deadline = time.perf_counter() + 1.0
+            baseline = await fire(service, records, lambda: time.perf_counter() > baseline_deadline)
+
+            second = model_registry.publish({MODEL_FILE_NAME: model_file_path})
+            swap = asyncio.create_task(service.swap_model(second))
+            during_swap = await fire(service, records, swap.done)
+            await swap
+            return second, baseline, during_swap
+        finally:
+            await service.stop()
+
+    second, baseline, during_swap = asyncio.run(run())
+
+    assert service.model_version == second != first
+    assert service.n_swaps == 1
+    bound = np.percentile(baseline, 99) + service.model_load_seconds
+    assert max(during_swap) <= bound, (f"slowest request during the swap took {max(during_swap):.3f}s, more than "
+                                       f"the baseline p99 plus the model load time, {bound:.3f}s")
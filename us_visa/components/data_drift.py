@@ -0,0 +1,201 @@
+import sys
+
+import numpy as np
+import pandas as pd
+from box import Box
+from scipy.special import kolmogorov
+from scipy.stats import chi2_contingency
+
+from us_visa.exception import USvisaException
+from us_visa.constants import CURRENT_YEAR
+
+OTHER_CATEGORY = "__other__"
+
+
+def population_stability_index(reference_counts: np.ndarray, current_counts: np.ndarray, eps: float = 1e-4) -> float:
+    reference = np.maximum(reference_counts / max(reference_counts.sum(), 1), eps)
+    current = np.maximum(current_counts / max(current_counts.sum(), 1), eps)
+    return float(np.sum((current - reference) * np.log(current / reference)))
+
+
+class HistogramSketch:
+    '''
+    Fixed-bin histogram of a numerical column. The bin edges only depend on the configuration, so two
+    sketches of the same column are merged by adding their counts. Values below the first edge or above
+    the last edge are counted in an underflow and an overflow bin
+    '''
+
+    def __init__(self, scale: str, min: float, max: float, n_bins: int):
+        self.spec = {"scale": scale, "min": min, "max": max, "n_bins": n_bins}
+        if scale == "log":
+            self.edges = np.geomspace(min, max, n_bins + 1)
+        else:
+            self.edges = np.linspace(min, max, n_bins + 1)
+        self.counts = np.zeros(n_bins + 2, dtype=np.int64)
+        self.n_missing = 0
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype="float64")
+        missing = np.isnan(values)
+        self.n_missing += int(missing.sum())
+        bins = np.searchsorted(self.edges, values[~missing], side="right")
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def merge(self, other: "HistogramSketch") -> None:
+        self.counts += other.counts
+        self.n_missing += other.n_missing
+
+    def drift(self, reference: "HistogramSketch") -> dict:
+        n, m = reference.counts.sum(), self.counts.sum()
+        statistic = float(np.max(np.abs(np.cumsum(reference.counts) / max(n, 1) - np.cumsum(self.counts) / max(m, 1))))
+        n_eff = n * m / (n + m) if n + m > 0 else 0
+        return {"psi": population_stability_index(reference.counts, self.counts),
+                "ks_statistic": statistic,
+                "ks_p_value": float(kolmogorov(statistic * np.sqrt(n_eff))) if n_eff > 0 else 1.0}
+
+    def to_dict(self) -> dict:
+        return {"type": "histogram", **self.spec, "counts": self.counts.tolist(), "n_missing": self.n_missing}
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "HistogramSketch":
+        sketch = cls(content["scale"], content["min"], content["max"], content["n_bins"])
+        sketch.counts = np.asarray(content["counts"], dtype=np.int64)
+        sketch.n_missing = content["n_missing"]
+        return sketch
+
+
+class FrequencySketch:
+    '''
+    Frequency table of a categorical column. At most max_categories values are tracked, the others are
+    counted under OTHER_CATEGORY, so the memory stays constant
+    '''
+
+    def __init__(self, max_categories: int = 1000):
+        self.max_categories = max_categories
+        self.counts = pd.Series(dtype="int64")
+        self.n_missing = 0
+
+    def _add(self, counts: pd.Series) -> None:
+        counts = self.counts.add(counts, fill_value=0).astype("int64")
+        if len(counts) > self.max_categories:
+            counts = counts.sort_values(ascending=False)
+            other = counts.iloc[self.max_categories - 1:].sum()
+            counts = counts.iloc[:self.max_categories - 1]
+            counts[OTHER_CATEGORY] = other
+        self.counts = counts
+
+    def update(self, values: pd.Series) -> None:
+        self.n_missing += int(values.isna().sum())
+        self._add(values.dropna().astype(str).value_counts())
+
+    def merge(self, other: "FrequencySketch") -> None:
+        self._add(other.counts)
+        self.n_missing += other.n_missing
+
+    def drift(self, reference: "FrequencySketch") -> dict:
+        table = pd.concat([reference.counts, self.counts], axis=1).fillna(0).to_numpy().T
+        table = table[:, table.sum(axis=0) > 0]
+        if table.shape[1] < 2 or (table.sum(axis=1) == 0).any():
+            p_value = 1.0
+        else:
+            p_value = float(chi2_contingency(table)[1])
+        return {"psi": population_stability_index(table[0], table[1]) if table.size > 0 else 0.0,
+                "chi2_p_value": p_value}
+
+    def to_dict(self) -> dict:
+        return {"type": "frequency", "max_categories": self.max_categories,
+                "counts": {str(key): int(value) for key, value in self.counts.items()}, "n_missing": self.n_missing}
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "FrequencySketch":
+        sketch = cls(content["max_categories"])
+        sketch.counts = pd.Series(content["counts"], dtype="int64")
+        sketch.n_missing = content["n_missing"]
+        return sketch
+
+
+class DatasetSketch:
+    '''
+    Class Name: DatasetSketch
+    Description: Mergeable sketches of every column of schema.yaml used for drift detection. Histograms
+                 for the drift_histograms columns, company_age being derived from yr_of_estab, and
+                 frequency tables for the categorical columns except the unique ones. Updating the sketch
+                 is O(rows) and its size does not depend on the number of rows
+    '''
+
+    def __init__(self, schema_config: Box = None):
+        try:
+            self.sketches = {}
+            self.n_rows = 0
+            if schema_config is None:
+                return
+
+            for col, spec in schema_config.drift_histograms.items():
+                self.sketches[col] = HistogramSketch(**spec)
+            unique_columns = schema_config.get("unique_columns", [])
+            for col in schema_config.categorical_columns:
+                if col not in unique_columns:
+                    self.sketches[col] = FrequencySketch()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        try:
+            self.n_rows += len(chunk)
+            for col, sketch in self.sketches.items():
+                if col in chunk.columns:
+                    values = chunk[col]
+                elif col == "company_age" and "yr_of_estab" in chunk.columns:
+                    values = CURRENT_YEAR - pd.to_numeric(chunk["yr_of_estab"], errors="coerce")
+                else:
+                    continue
+
+                if isinstance(sketch, HistogramSketch):
+                    sketch.update(pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64", na_value=np.nan))
+                else:
+                    sketch.update(values)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def merge(self, other: "DatasetSketch") -> None:
+        self.n_rows += other.n_rows
+        for col, sketch in other.sketches.items():
+            if col in self.sketches:
+                self.sketches[col].merge(sketch)
+            else:
+                self.sketches[col] = sketch
+
+    def drift(self, reference: "DatasetSketch", psi_threshold: float) -> dict:
+        """
+        Method Name: drift
+        Description: Compares the sketches with the ones of the reference data. PSI is reported for every
+                     column, together with the KS statistic of the histograms and the chi-square p-value of
+                     the frequency tables. A column drifts when its PSI exceeds psi_threshold
+
+        Output: dict with drift_status, drifted_columns and the per column metrics
+        On Failure: Raise an exception
+        """
+        try:
+            columns = {}
+            for col, sketch in self.sketches.items():
+                if col in reference.sketches and type(reference.sketches[col]) is type(sketch):
+                    metrics = sketch.drift(reference.sketches[col])
+                    metrics["drift"] = metrics["psi"] > psi_threshold
+                    columns[col] = metrics
+            drifted_columns = [col for col, metrics in columns.items() if metrics["drift"]]
+            return {"drift_status": len(drifted_columns) > 0, "drifted_columns": drifted_columns,
+                    "psi_threshold": psi_threshold, "columns": columns}
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def to_dict(self) -> dict:
+        return {"n_rows": self.n_rows, "sketches": {col: sketch.to_dict() for col, sketch in self.sketches.items()}}
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "DatasetSketch":
+        dataset_sketch = cls()
+        dataset_sketch.n_rows = content["n_rows"]
+        for col, sketch in content["sketches"].items():
+            sketch_cls = HistogramSketch if sketch["type"] == "histogram" else FrequencySketch
+            dataset_sketch.sketches[col] = sketch_cls.from_dict(sketch)
+        return dataset_sketch
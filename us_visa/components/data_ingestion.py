@@ -1,14 +1,25 @@
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from typing import Iterable, Iterator
 
+import numpy as np
 import pandas as pd
+from bson import ObjectId
 from sklearn.model_selection import train_test_split
 
 from us_visa.entity.config_entity import DataIngestionConfig
 from us_visa.entity.artifact_entity import DataIngestionArtifact
+from us_visa.entity.data_handle import DataFrameHandle
 from us_visa.exception import USvisaException
 from us_visa.logger import logging
+from us_visa.utils.instrumentation import instrument_stage
+from us_visa.constants import SCHEMA_FILE_PATH
 from us_visa.data_access.usvisa_data import USvisaData
+from us_visa.data_access.aggregation_pipeline import compile_ingestion_pipeline, get_pushdown_schema
+from us_visa.utils.main_utils import (read_yaml, write_yaml, read_dataframe, write_dataframe, get_column_dtypes,
+                                      DataFrameWriter)
 
 
 class DataIngestion:
@@ -17,45 +28,277 @@ class DataIngestion:
             self.data_ingestion_config = data_ingestion_config
         except Exception as e:
             raise USvisaException(e, sys) from e
-        
+
+
+    def get_pushdown_pipeline(self) -> tuple:
+        """
+        Method name: get_pushdown_pipeline
+        Description: This method compiles the aggregation pipeline of the pushdown mode from schema.yaml and
+                     the configured $match filter
+
+        Output: Returns the pipeline and the column dtypes of its output
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            schema_config = read_yaml(SCHEMA_FILE_PATH)
+            pipeline = compile_ingestion_pipeline(schema_config, match=self.data_ingestion_config.pushdown_match)
+            logging.info(f"Pushing the preprocessing down to mongodb: {pipeline}")
+            return pipeline, get_column_dtypes(get_pushdown_schema(schema_config))
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
     def export_data_into_feature_store(self) -> pd.DataFrame:
         try:
             logging.info("Exporting data from mongodb")
 
             usvisa_data = USvisaData()
-            df = usvisa_data.export_collection_as_dataframe(collection_name=DataIngestionConfig.collection_name)
+            if self.data_ingestion_config.pushdown:
+                pipeline, column_dtypes = self.get_pushdown_pipeline()
+                df = usvisa_data.export_pipeline_as_dataframe(collection_name=self.data_ingestion_config.collection_name,
+                                                              pipeline=pipeline, column_dtypes=column_dtypes)
+            else:
+                df = usvisa_data.export_collection_as_dataframe(collection_name=self.data_ingestion_config.collection_name)
             logging.info(f"Shape of dataframe: {df.shape}")
             
-            feature_store_file_path = DataIngestionConfig.feature_store_file_path
-            dir_path = os.path.dirname(feature_store_file_path)
-            os.makedirs(dir_path, exist_ok=True)
+            feature_store_file_path = self.data_ingestion_config.feature_store_file_path
             logging.info(f"Saving exported data into feature store file path: {feature_store_file_path}")
-            df.to_csv(feature_store_file_path, index=False, header=False)
+            write_dataframe(feature_store_file_path, df)
 
             return df
         
         except Exception as e:
             raise USvisaException(e, sys) from e
+
+
+    def stream_data_into_feature_store(self) -> Iterator[pd.DataFrame]:
+        """
+        Method name: stream_data_into_feature_store
+        Description: This method streams the collection from mongodb in batches and appends every batch
+                     to the feature store file, so the full collection is never held in memory
+
+        Output: Generator of the exported dataframe chunks
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            logging.info("Streaming data from mongodb")
+
+            usvisa_data = USvisaData()
+            feature_store_file_path = self.data_ingestion_config.feature_store_file_path
+            logging.info(f"Saving exported data into feature store file path: {feature_store_file_path}")
+
+            if self.data_ingestion_config.pushdown:
+                pipeline, column_dtypes = self.get_pushdown_pipeline()
+                chunks = usvisa_data.export_pipeline_in_chunks(collection_name=self.data_ingestion_config.collection_name,
+                                                               pipeline=pipeline, column_dtypes=column_dtypes,
+                                                               batch_size=self.data_ingestion_config.batch_size)
+            else:
+                chunks = usvisa_data.export_collection_in_chunks(collection_name=self.data_ingestion_config.collection_name,
+                                                                 batch_size=self.data_ingestion_config.batch_size)
+
+            n_rows = 0
+            with DataFrameWriter(feature_store_file_path) as feature_store_writer:
+                for chunk in chunks:
+                    feature_store_writer.write(chunk)
+                    n_rows += len(chunk)
+                    yield chunk
+
+            logging.info(f"Number of rows exported: {n_rows}", extra={"stage": "data_ingestion", "n_rows": n_rows})
+
+        except Exception as e:
+            raise USvisaException(e, sys) from e
         
 
-    def split_data_as_train_test(self, dataframe: pd.DataFrame) -> None:
+    def read_watermark(self) -> object:
+        """
+        Method name: read_watermark
+        Description: This method reads the watermark persisted by the last incremental ingestion
+
+        Output: Returns the watermark value, None when no watermark was persisted yet
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            watermark_file_path = self.data_ingestion_config.watermark_file_path
+            if not os.path.exists(watermark_file_path):
+                return None
+
+            content = read_yaml(watermark_file_path)
+            if content.watermark_field != self.data_ingestion_config.watermark_field:
+                raise Exception(f"Persisted watermark is on field [{content.watermark_field}], "
+                                f"expected [{self.data_ingestion_config.watermark_field}]")
+
+            if content.watermark_field == "_id":
+                return ObjectId(content.watermark)
+            return content.watermark
+
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def write_watermark(self, watermark: object) -> None:
+        try:
+            if isinstance(watermark, ObjectId):
+                watermark = str(watermark)
+            elif isinstance(watermark, np.generic):
+                watermark = watermark.item()
+            elif isinstance(watermark, pd.Timestamp):
+                watermark = watermark.to_pydatetime()
+
+            write_yaml(file_path=self.data_ingestion_config.watermark_file_path,
+                       content={"watermark_field": self.data_ingestion_config.watermark_field,
+                                "watermark": watermark})
+            logging.info(f"Persisted watermark: {watermark}")
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_feature_store_parts(self) -> list:
+        return sorted(glob(os.path.join(self.data_ingestion_config.persistent_feature_store_dir, "part-*.parquet")))
+
+
+    def load_feature_store_snapshot(self) -> pd.DataFrame:
+        """
+        Method name: load_feature_store_snapshot
+        Description: This method reads every part of the persistent feature store and keeps the latest
+                     row for every value of the dedup column
+
+        Output: Returns the merged snapshot as dataframe
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            parts = self.get_feature_store_parts()
+            if len(parts) == 0:
+                raise Exception(f"Feature store at {self.data_ingestion_config.persistent_feature_store_dir} is empty")
+
+            dataframe = pd.concat([read_dataframe(part) for part in parts], ignore_index=True)
+            dataframe = dataframe.drop_duplicates(subset=[self.data_ingestion_config.dedup_column], keep='last')
+            dataframe = dataframe.reset_index(drop=True)
+            logging.info(f"Loaded feature store snapshot of shape {dataframe.shape} from {len(parts)} parts")
+
+            return dataframe
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def compact_feature_store(self) -> None:
+        """
+        Method name: compact_feature_store
+        Description: This method rewrites the persistent feature store as a single deduplicated part once
+                     the number of parts exceeds max_feature_store_parts
+
+        Output: Feature store parts are merged
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            parts = self.get_feature_store_parts()
+            if len(parts) <= self.data_ingestion_config.max_feature_store_parts:
+                return
+
+            logging.info(f"Compacting {len(parts)} feature store parts")
+            snapshot = self.load_feature_store_snapshot()
+            compacted_file_path = os.path.join(self.data_ingestion_config.persistent_feature_store_dir, "compacted.parquet")
+            write_dataframe(compacted_file_path, snapshot)
+            os.replace(compacted_file_path, parts[-1])
+            for part in parts[:-1]:
+                os.remove(part)
+
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def export_delta_into_feature_store(self) -> pd.DataFrame:
+        """
+        Method name: export_delta_into_feature_store
+        Description: This method pulls only the documents newer than the persisted watermark, appends
+                     them as a new part of the persistent feature store and advances the watermark.
+                     The watermark is written after the part, so an interrupted run re-reads the delta
+                     and the duplicates are dropped on the dedup column
+
+        Output: Returns the merged feature store snapshot as dataframe
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            watermark_field = self.data_ingestion_config.watermark_field
+            watermark = self.read_watermark()
+            logging.info(f"Exporting documents from mongodb with {watermark_field} > {watermark}")
+
+            usvisa_data = USvisaData()
+            chunks = []
+            for chunk in usvisa_data.export_collection_in_chunks(collection_name=self.data_ingestion_config.collection_name,
+                                                                  batch_size=self.data_ingestion_config.batch_size,
+                                                                  watermark_field=watermark_field,
+                                                                  watermark=watermark):
+                watermark = chunk[watermark_field].iloc[-1]
+                if watermark_field == "_id":
+                    chunk = chunk.drop(columns=["_id"])
+                chunks.append(chunk)
+
+            if len(chunks) > 0:
+                delta = pd.concat(chunks, ignore_index=True)
+                logging.info(f"Number of new documents: {len(delta)}", extra={"stage": "data_ingestion", "n_rows": len(delta)})
+
+                os.makedirs(self.data_ingestion_config.persistent_feature_store_dir, exist_ok=True)
+                parts = self.get_feature_store_parts()
+                next_part = int(os.path.basename(parts[-1])[5:-8]) + 1 if len(parts) > 0 else 0
+                part_file_path = os.path.join(self.data_ingestion_config.persistent_feature_store_dir,
+                                              f"part-{next_part:05d}.parquet")
+                write_dataframe(part_file_path, delta)
+                self.write_watermark(watermark)
+                self.compact_feature_store()
+            else:
+                logging.info("No new documents since the last ingestion")
+
+            return self.load_feature_store_snapshot()
+
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def split_data_as_train_test(self, dataframe: pd.DataFrame) -> tuple:
         """
         Method name: split_data_as_train_test
         Description: This methods splits the data into train and test set based on the ratio
 
-        Output: Folder is created
+        Output: Folder is created, returns the train and test set
         On Failure: Write an exception log and then raise an exception
         """
         try:
             train_set, test_set = train_test_split(dataframe, test_size=self.data_ingestion_config.train_test_split_ration, random_state=42)
             logging.info("Performed train-test-split on the dataframe")
-            
-            dir_path = os.path.dirname(self.data_ingestion_config.training_file_path)
-            os.makedirs(dir_path, exist_ok=True)
 
             logging.info(f"Exporting train and test files")
-            train_set.to_csv(self.data_ingestion_config.training_file_path, index=False)
-            test_set.to_csv(self.data_ingestion_config.testing_file_path, index=False)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [executor.submit(write_dataframe, self.data_ingestion_config.training_file_path, train_set),
+                           executor.submit(write_dataframe, self.data_ingestion_config.testing_file_path, test_set)]
+                for future in futures:
+                    future.result()
+
+            logging.info("Exported train and test file path")
+
+            return train_set, test_set
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def split_chunks_as_train_test(self, chunks: Iterable[pd.DataFrame]) -> None:
+        """
+        Method name: split_chunks_as_train_test
+        Description: This methods splits a stream of dataframe chunks into train and test set. Every row
+                     is assigned to the test set with probability equal to the split ratio, so the files
+                     are written chunk by chunk
+
+        Output: Folder is created
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            random_state = np.random.RandomState(42)
+            logging.info(f"Exporting train and test files")
+            with DataFrameWriter(self.data_ingestion_config.training_file_path) as train_writer, \
+                 DataFrameWriter(self.data_ingestion_config.testing_file_path) as test_writer:
+                for chunk in chunks:
+                    test_mask = random_state.random_sample(len(chunk)) < self.data_ingestion_config.train_test_split_ration
+                    train_writer.write(chunk[~test_mask])
+                    test_writer.write(chunk[test_mask])
 
             logging.info("Exported train and test file path")
 
@@ -63,21 +306,41 @@ class DataIngestion:
             raise USvisaException(e, sys) from e
         
     
+    @instrument_stage("data_ingestion")
     def initiate_data_ingestion(self) -> DataIngestionArtifact:
         
         logging.info("Entered initiate_daata_ingestion method of Data_Ingestion class")
 
         try:
-            dataframe = self.export_data_into_feature_store()
-            logging.info("Got the dataframe from mongo db")
+            train_set, test_set = None, None
+            if self.data_ingestion_config.incremental and self.data_ingestion_config.pushdown:
+                raise Exception("The pushdown is not supported by the incremental ingestion, it drops the dedup column")
+            if self.data_ingestion_config.incremental:
+                dataframe = self.export_delta_into_feature_store()
+                logging.info("Got the merged feature store snapshot")
+
+                train_set, test_set = self.split_data_as_train_test(dataframe=dataframe)
+            elif self.data_ingestion_config.streaming_export:
+                self.split_chunks_as_train_test(chunks=self.stream_data_into_feature_store())
+                logging.info("Streamed the dataframe chunks from mongo db")
+            else:
+                dataframe = self.export_data_into_feature_store()
+                logging.info("Got the dataframe from mongo db")
 
-            self.split_data_as_train_test(dataframe=dataframe)
+                train_set, test_set = self.split_data_as_train_test(dataframe=dataframe)
 
             logging.info("Performed train-test-split of data")
             logging.info("Exited initiate_data_ingestion method of Data_Ingestion class")
 
             data_ingestion_artifact = DataIngestionArtifact(train_file_path=self.data_ingestion_config.training_file_path,
-                                                            test_file_path=self.data_ingestion_config.testing_file_path)
+                                                            test_file_path=self.data_ingestion_config.testing_file_path,
+                                                            pushdown=self.data_ingestion_config.pushdown)
+            consumers = self.data_ingestion_config.in_memory_consumers
+            if consumers > 0:
+                data_ingestion_artifact.train_data = DataFrameHandle(self.data_ingestion_config.training_file_path,
+                                                                     dataframe=train_set, consumers=consumers)
+                data_ingestion_artifact.test_data = DataFrameHandle(self.data_ingestion_config.testing_file_path,
+                                                                    dataframe=test_set, consumers=consumers)
             
             logging.info(f"Data Ingestion Artifact: {data_ingestion_artifact}")
             return data_ingestion_artifact
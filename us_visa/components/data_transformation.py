@@ -1,23 +1,31 @@
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
-from imblearn.combine import SMOTEENN
+import scipy.sparse as sp
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder, LabelEncoder, PowerTransformer
 from sklearn.compose import ColumnTransformer
 
 from us_visa.exception import USvisaException
 from us_visa.logger import logging
+from us_visa.utils.instrumentation import instrument_stage
 
-from us_visa.constants import TARGET_COLUMN, SCHEMA_FILE_PATH, CURRENT_YEAR
+from us_visa.constants import TARGET_COLUMN, SCHEMA_FILE_PATH
 from us_visa.entity.config_entity import DataTransfomationConfig
 from us_visa.entity.artifact_entity import (DataIngestionArtifact,
                                             DataValidationArtifact,
                                             DataTransformationArtifact)
-from us_visa.utils.main_utils import save_numpy_array_data, save_object, read_yaml, drop_columns
-from us_visa.entity.estimator import TargetValueMapping
+from us_visa.utils.main_utils import (save_numpy_array_data, save_sparse_matrix_data, save_object, read_yaml,
+                                     read_dataframe, get_column_dtypes, iter_dataframe_chunks, cast_to_schema_dtypes,
+                                     load_numpy_array_data)
+from us_visa.entity.estimator import TargetValueMapping, prepare_input_features
+from us_visa.entity.data_handle import DataFrameHandle
+from us_visa.entity.compiled_preprocessor import compile_preprocessor, check_parity
+from us_visa.components.resampling import Resampler
+from us_visa.data_access.aggregation_pipeline import get_pushdown_schema
 
 class DataTransformation:
     def __init__(self, 
@@ -35,16 +43,54 @@ class DataTransformation:
             self.data_validation_artifact = data_validation_artifact
             self.data_transformation_config = data_transformation_config
             self._schema_config = read_yaml(SCHEMA_FILE_PATH)
+            if data_ingestion_artifact.pushdown:
+                # the ingestion already derived company_age and dropped the drop_columns
+                self._schema_config = get_pushdown_schema(self._schema_config)
         except Exception as e:
             raise USvisaException(e, sys) from e
     
 
     @staticmethod
-    def read_data(file_path) -> pd.DataFrame:
+    def read_data(file_path, columns: list = None, column_dtypes: dict = None) -> pd.DataFrame:
         try:
-            return pd.read_csv(file_path)
+            return read_dataframe(file_path, columns=columns, column_dtypes=column_dtypes)
         except Exception as e:
             raise USvisaException(e, sys) from e
+
+
+    @staticmethod
+    def read_ingested_data(file_path: str, data_handle: DataFrameHandle, columns: list, column_dtypes: dict) -> pd.DataFrame:
+        """
+        Method Name:    read_ingested_data
+        Description:    This method returns the ingested data from its in-memory handle when the ingestion ran
+                        in the same process, else reads it from file_path. The handle is released afterwards
+
+        Output:         pandas DataFrame
+        On Failure:     Raise an exception
+        """
+        try:
+            if data_handle is None:
+                return DataTransformation.read_data(file_path, columns, column_dtypes)
+
+            try:
+                return data_handle.get(columns=columns, column_dtypes=column_dtypes)
+            finally:
+                data_handle.release()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_required_columns(self) -> list:
+        """
+        Method Name:    get_required_columns
+        Description:    This method returns the columns the transformation reads from the ingested data.
+                        Dropped columns are skipped, except yr_of_estab which company_age is derived from
+
+        Output:         list of column names
+        """
+        drop_cols = self._schema_config.drop_columns
+        return [col for col in get_column_dtypes(self._schema_config)
+                if col not in drop_cols or col == 'yr_of_estab']
         
     
     def get_data_transformer_object(self) -> Pipeline:
@@ -79,7 +125,9 @@ class DataTransformation:
                     ("OrdinalEncoder", or_encoder, or_columns),
                     ("Transformer", transform_pipe, transform_columns),
                     ("StandardScaler", numeric_transformer, num_features)
-                ]
+                ],
+                # in the sparse output mode the output stays CSR whatever its density
+                sparse_threshold=1.0 if self.data_transformation_config.sparse_output else 0.3
             )
             logging.info("Created preprocessor object from ColumnTransformer")
 
@@ -88,9 +136,222 @@ class DataTransformation:
             return preprocessor
         except Exception as e:
             raise USvisaException(e, sys) from e
+
+
+    def save_compiled_preprocessor(self, preprocessor: ColumnTransformer, input_feature_df: pd.DataFrame) -> str:
+        """
+        Method Name:    save_compiled_preprocessor
+        Description:    This method compiles the fitted preprocessor for inference, checks that the compiled
+                        version gives the same output on a sample of input_feature_df and saves it
+
+        Output:         file path of the compiled preprocessor, None when it cannot be compiled or differs
+        On Failure:     Raise an exception
+        """
+        try:
+            try:
+                compiled_preprocessor = compile_preprocessor(preprocessor)
+                sample = input_feature_df.head(self.data_transformation_config.parity_sample_size)
+                max_difference = check_parity(preprocessor, compiled_preprocessor, sample,
+                                              atol=self.data_transformation_config.parity_tolerance)
+            except USvisaException as e:
+                logging.info(f"Preprocessor not compiled, inference will use the sklearn object: {e}")
+                return None
+            logging.info(f"Compiled the preprocessor, max difference on {len(sample)} rows: {max_difference}")
+
+            save_object(
+                file_path=self.data_transformation_config.compiled_object_file_path,
+                content=compiled_preprocessor
+            )
+            logging.info("Saved the compiled preprocessor object")
+            return self.data_transformation_config.compiled_object_file_path
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_resampler(self) -> Resampler:
+        config = self.data_transformation_config
+        return Resampler(strategy=config.resampling_strategy, n_jobs=config.resampling_n_jobs,
+                         knn_algorithm=config.resampling_knn_algorithm, chunk_size=config.resampling_chunk_size,
+                         partition_size=config.resampling_partition_size, random_state=config.random_state)
+
+
+    def iter_ingested_chunks(self, file_path: str, data_handle: DataFrameHandle, columns: list = None):
+        """
+        Method Name:    iter_ingested_chunks
+        Description:    This method streams the ingested data in chunks of chunk_size rows, from its in-memory
+                        handle when the ingestion ran in the same process, else from file_path
+
+        Output:         Generator of the prepared input features and the encoded target of every chunk, the
+                        features are None when columns is the target column only
+        On Failure:     Raise an exception
+        """
+        try:
+            columns = columns or self.get_required_columns()
+            chunk_size = self.data_transformation_config.chunk_size
+            chunks = (data_handle.iter_chunks(chunk_size) if data_handle is not None
+                      else iter_dataframe_chunks(file_path, chunk_size=chunk_size, columns=columns))
+            column_dtypes = get_column_dtypes(self._schema_config)
+            for chunk in chunks:
+                chunk = cast_to_schema_dtypes(chunk[columns], column_dtypes)
+                target = chunk[TARGET_COLUMN].map(TargetValueMapping()._asdict()).astype(int).to_numpy()
+                if columns == [TARGET_COLUMN]:
+                    yield None, target
+                else:
+                    yield prepare_input_features(chunk.drop(columns=TARGET_COLUMN), self._schema_config.drop_columns), target
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def fit_preprocessor_out_of_core(self) -> tuple:
+        """
+        Method Name:    fit_preprocessor_out_of_core
+        Description:    This method fits the preprocessor in one streaming pass over the training data: the
+                        StandardScaler with incremental mean and variance, the encoders on the categories seen
+                        in any chunk, and the Yeo-Johnson lambdas and scaling on a uniform reservoir sample of
+                        reservoir_size rows. The ColumnTransformer is fitted on the sample with the streamed categories, then
+                        its StandardScaler is replaced by the incremental one
+
+        Output:         fitted preprocessor and encoded training target
+        On Failure:     Raise an exception
+        """
+        try:
+            config = self.data_transformation_config
+            preprocessor = self.get_data_transformer_object()
+            num_features = list(self._schema_config.num_features)
+            categorical_columns = list(self._schema_config.oh_columns) + list(self._schema_config.or_columns)
+
+            scaler = StandardScaler()
+            categories = {col: set() for col in categorical_columns}
+            reservoir, reservoir_keys = None, np.empty(0)
+            targets = []
+            rng = np.random.default_rng(config.random_state)
+            for features, target in self.iter_ingested_chunks(self.data_ingestion_artifact.train_file_path,
+                                                              self.data_ingestion_artifact.train_data):
+                scaler.partial_fit(features[num_features])
+                for col in categorical_columns:
+                    categories[col].update(features[col].dropna().unique())
+                # the reservoir_size rows with the smallest random keys are a uniform sample without replacement
+                keys = np.concatenate([reservoir_keys, rng.random(len(features))])
+                candidates = features if reservoir is None else pd.concat([reservoir, features], ignore_index=True)
+                kept = np.sort(np.argsort(keys, kind="stable")[:config.reservoir_size])
+                reservoir, reservoir_keys = candidates.iloc[kept].reset_index(drop=True), keys[kept]
+                targets.append(target)
+
+            preprocessor.set_params(
+                OneHotEncoder__categories=[sorted(categories[col]) for col in self._schema_config.oh_columns],
+                OrdinalEncoder__categories=[sorted(categories[col]) for col in self._schema_config.or_columns])
+            preprocessor.fit(reservoir)
+            preprocessor.transformers_ = [(name, scaler if name == "StandardScaler" else transformer, columns)
+                                          for name, transformer, columns in preprocessor.transformers_]
+            target = np.concatenate(targets)
+            logging.info(f"Fitted the preprocessor out of core on {len(target)} rows, Yeo-Johnson lambdas on "
+                         f"{len(reservoir)} sampled rows")
+            return preprocessor, target
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def transform_out_of_core(self, preprocessor: ColumnTransformer, file_path: str, data_handle: DataFrameHandle,
+                              n_rows: int, dense_file_path: str) -> tuple:
+        """
+        Method Name:    transform_out_of_core
+        Description:    This method transforms the ingested data chunk by chunk into the memory-mapped array of
+                        dense_file_path. Chunks the preprocessor returns sparse, below its sparse threshold, are
+                        densified one at a time
+
+        Output:         file path of the features and the first chunk of prepared input features
+        On Failure:     Raise an exception
+        """
+        try:
+            array_dtype = self.data_transformation_config.array_dtype
+            out, first_features, start = None, None, 0
+            for features, _ in self.iter_ingested_chunks(file_path, data_handle):
+                transformed = preprocessor.transform(features)
+                if first_features is None:
+                    first_features = features
+                if sp.issparse(transformed):
+                    transformed = transformed.toarray()
+                if out is None:
+                    os.makedirs(os.path.dirname(dense_file_path), exist_ok=True)
+                    out = np.lib.format.open_memmap(dense_file_path, mode='w+', dtype=array_dtype,
+                                                    shape=(n_rows, transformed.shape[1]))
+                out[start:start + len(transformed)] = transformed
+                start += len(transformed)
+
+            if out is None:
+                raise Exception(f"No rows to transform in {file_path}")
+            out.flush()
+            del out
+            return dense_file_path, first_features
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def initiate_out_of_core_transformation(self) -> DataTransformationArtifact:
+        """
+        Method Name:    initiate_out_of_core_transformation
+        Description:    This method runs the data transformation without materializing the data: the preprocessor
+                        is fitted in a streaming pass and the train and test data are transformed chunk by chunk.
+                        Memory is bounded by the chunk size and the reservoir size, plus the encoded targets.
+                        The features are written dense, the sparse output is not supported
+
+        Output:         Returns DataTransformationArtifact data-type
+        On Failure:     Raise an Exception
+        """
+        try:
+            config = self.data_transformation_config
+            try:
+                if config.resampling_strategy not in ("class_weight", "none"):
+                    raise Exception(f"The out-of-core transformation supports the class_weight and none resampling "
+                                    f"strategies, {config.resampling_strategy} resamples the training data in memory")
+                if config.sparse_output:
+                    raise Exception("The out-of-core transformation writes dense arrays, the sparse output would "
+                                    "hold the whole transformed data in memory, disable sparse_output or out_of_core")
+
+                preprocessor, target_train = self.fit_preprocessor_out_of_core()
+                target_test = np.concatenate([target for _, target in self.iter_ingested_chunks(
+                    self.data_ingestion_artifact.test_file_path, self.data_ingestion_artifact.test_data,
+                    columns=[TARGET_COLUMN])])
+
+                train_file_path, _ = self.transform_out_of_core(
+                    preprocessor, self.data_ingestion_artifact.train_file_path, self.data_ingestion_artifact.train_data,
+                    len(target_train), config.transformed_train_file_path)
+                test_file_path, test_sample = self.transform_out_of_core(
+                    preprocessor, self.data_ingestion_artifact.test_file_path, self.data_ingestion_artifact.test_data,
+                    len(target_test), config.transformed_test_file_path)
+            finally:
+                for data_handle in (self.data_ingestion_artifact.train_data, self.data_ingestion_artifact.test_data):
+                    if data_handle is not None:
+                        data_handle.release()
+            logging.info(f"Transformed {len(target_train)} training and {len(target_test)} testing rows out of core")
+
+            # class_weight and none only read the target, the memory-mapped features are passed through
+            _, _, sample_weight = self.get_resampler().fit_resample(load_numpy_array_data(train_file_path), target_train)
+
+            save_object(file_path=config.transformed_object_file_path, content=preprocessor)
+            compiled_object_file_path = self.save_compiled_preprocessor(preprocessor, test_sample)
+            save_numpy_array_data(file_path=config.transformed_train_target_file_path, array=target_train)
+            save_numpy_array_data(file_path=config.transformed_test_target_file_path, array=target_test)
+            sample_weight_file_path = None
+            if sample_weight is not None:
+                sample_weight_file_path = config.transformed_train_sample_weight_file_path
+                save_numpy_array_data(file_path=sample_weight_file_path, array=sample_weight)
+
+            return DataTransformationArtifact(
+                transformed_object_file_path=config.transformed_object_file_path,
+                transformed_train_file_path=train_file_path,
+                transformed_test_file_path=test_file_path,
+                transformed_train_target_file_path=config.transformed_train_target_file_path,
+                transformed_test_target_file_path=config.transformed_test_target_file_path,
+                compiled_object_file_path=compiled_object_file_path,
+                transformed_train_sample_weight_file_path=sample_weight_file_path
+            )
+        except Exception as e:
+            raise USvisaException(e, sys) from e
         
     
 
+    @instrument_stage("data_transformation")
     def initiate_data_transformation(self) -> DataIngestionArtifact:
         """
         Method Name:    initiate_data_transformer
@@ -102,13 +363,22 @@ class DataTransformation:
 
         try:
             if self.data_validation_artifact.validation_status:
+                if self.data_transformation_config.out_of_core:
+                    return self.initiate_out_of_core_transformation()
+
                 logging.info("Starting data transformation")
 
                 preprocessor = self.get_data_transformer_object()
                 logging.info("Got the preprocessor object.")
 
-                train_df = DataTransformation.read_data(self.data_ingestion_artifact.train_file_path)
-                test_df = DataTransformation.read_data(self.data_ingestion_artifact.test_file_path)
+                columns = self.get_required_columns()
+                column_dtypes = get_column_dtypes(self._schema_config)
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    train_future = executor.submit(self.read_ingested_data, self.data_ingestion_artifact.train_file_path,
+                                                   self.data_ingestion_artifact.train_data, columns, column_dtypes)
+                    test_future = executor.submit(self.read_ingested_data, self.data_ingestion_artifact.test_file_path,
+                                                  self.data_ingestion_artifact.test_data, columns, column_dtypes)
+                    train_df, test_df = train_future.result(), test_future.result()
 
                 input_feature_train_df = train_df.drop(columns=TARGET_COLUMN)
                 input_feature_test_df = test_df.drop(columns=TARGET_COLUMN)
@@ -118,21 +388,16 @@ class DataTransformation:
                 target_feature_test_df = test_df[TARGET_COLUMN]
                 logging.info("Got target feature of training and testing data.")
 
-                input_feature_train_df['company_age'] = CURRENT_YEAR - input_feature_train_df['yr_of_estab']
-                input_feature_test_df['company_age'] = CURRENT_YEAR - input_feature_test_df['yr_of_estab']
-                logging.info("Added company_age column to the training dataset.")
-
-                drop_cols = self._schema_config.drop_columns
-                input_feature_train_df = drop_columns(input_feature_train_df, drop_cols)
-                input_feature_test_df = drop_columns(input_feature_test_df, drop_cols)
-                logging.info("Droped columns from training and testing data.")
+                input_feature_train_df = prepare_input_features(input_feature_train_df, self._schema_config.drop_columns)
+                input_feature_test_df = prepare_input_features(input_feature_test_df, self._schema_config.drop_columns)
+                logging.info("Added company_age column and droped columns from training and testing data.")
 
-                target_feature_train_df = target_feature_train_df.replace(
+                target_feature_train_df = target_feature_train_df.map(
                     TargetValueMapping()._asdict()
-                )
-                target_feature_test_df = target_feature_test_df.replace(
+                ).astype(int)
+                target_feature_test_df = target_feature_test_df.map(
                     TargetValueMapping()._asdict()
-                )
+                ).astype(int)
                 logging.info("Encoded the categorical target of training and testing data.")
 
                 input_feature_train_arr = preprocessor.fit_transform(input_feature_train_df)
@@ -140,40 +405,55 @@ class DataTransformation:
                 input_feature_test_arr = preprocessor.transform(input_feature_test_df)
                 logging.info("Transformed testing input features using the preprocessing pipeline.")
 
-                smt = SMOTEENN(sampling_strategy='minority')
-                input_feature_train_final, target_feature_train_final = smt.fit_resample(
+                input_feature_train_final, target_feature_train_final, sample_weight = self.get_resampler().fit_resample(
                     input_feature_train_arr, target_feature_train_df
                 )
-                logging.info("Applied SMOTEENN on trainind data")
-
-                train_arr = np.c_[
-                    input_feature_train_final, np.array(target_feature_train_final)
-                ]
-                test_arr = np.c_[
-                    input_feature_test_arr, np.array(target_feature_test_df)
-                ]
-                logging.info("Created train and test array")
+                logging.info(f"Applied {self.data_transformation_config.resampling_strategy} resampling on training data")
 
                 save_object(
                     file_path=self.data_transformation_config.transformed_object_file_path,
                     content=preprocessor
                 )
+                logging.info("Saved the preprocessor object")
+
+                compiled_object_file_path = self.save_compiled_preprocessor(preprocessor, input_feature_test_df)
+
+                array_dtype = self.data_transformation_config.array_dtype
+                if sp.issparse(input_feature_train_final):
+                    train_file_path = self.data_transformation_config.transformed_train_sparse_file_path
+                    test_file_path = self.data_transformation_config.transformed_test_sparse_file_path
+                    save_sparse_matrix_data(train_file_path, input_feature_train_final, dtype=array_dtype)
+                    save_sparse_matrix_data(test_file_path, input_feature_test_arr, dtype=array_dtype)
+                    logging.info(f"Saved sparse train and test features, {input_feature_train_final.nnz} non-zeros "
+                                 f"in {input_feature_train_final.shape} training features")
+                else:
+                    train_file_path = self.data_transformation_config.transformed_train_file_path
+                    test_file_path = self.data_transformation_config.transformed_test_file_path
+                    save_numpy_array_data(file_path=train_file_path, array=input_feature_train_final, dtype=array_dtype)
+                    save_numpy_array_data(file_path=test_file_path, array=input_feature_test_arr, dtype=array_dtype)
                 save_numpy_array_data(
-                    file_path=self.data_transformation_config.transformed_train_file_path,
-                    array=train_arr
+                    file_path=self.data_transformation_config.transformed_train_target_file_path,
+                    array=np.asarray(target_feature_train_final)
                 )
+                sample_weight_file_path = None
+                if sample_weight is not None:
+                    sample_weight_file_path = self.data_transformation_config.transformed_train_sample_weight_file_path
+                    save_numpy_array_data(file_path=sample_weight_file_path, array=sample_weight)
                 save_numpy_array_data(
-                    file_path=self.data_transformation_config.transformed_test_file_path,
-                    array=test_arr
+                    file_path=self.data_transformation_config.transformed_test_target_file_path,
+                    array=np.asarray(target_feature_test_df)
                 )
-                logging.info("Saved the preprocessor object")
-                logging.info("Saved train and test array")
+                logging.info("Saved train and test features and targets as separate arrays")
 
 
                 data_transformation_artifact = DataTransformationArtifact(
                     transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
-                    transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
-                    transformed_test_file_path=self.data_transformation_config.transformed_test_file_path
+                    transformed_train_file_path=train_file_path,
+                    transformed_test_file_path=test_file_path,
+                    transformed_train_target_file_path=self.data_transformation_config.transformed_train_target_file_path,
+                    transformed_test_target_file_path=self.data_transformation_config.transformed_test_target_file_path,
+                    compiled_object_file_path=compiled_object_file_path,
+                    transformed_train_sample_weight_file_path=sample_weight_file_path
                 )
 
                 logging.info("Exited initiate_data_transformation method of DataTransformation class")
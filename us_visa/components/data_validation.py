@@ -1,15 +1,21 @@
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 
 from us_visa.entity.config_entity import DataValidationConfig
 from us_visa.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from us_visa.entity.data_handle import DataFrameHandle
 
 from us_visa.exception import USvisaException
 from us_visa.logger import logging
-from us_visa.utils.main_utils import read_yaml, write_yaml
+from us_visa.utils.instrumentation import instrument_stage
+from us_visa.utils.main_utils import read_yaml, write_yaml, read_dataframe, iter_dataframe_chunks
+from us_visa.components.schema_validation import SchemaValidator
+from us_visa.components.data_drift import DatasetSketch
 from us_visa.constants import SCHEMA_FILE_PATH
+from us_visa.data_access.aggregation_pipeline import get_pushdown_schema
 
 class DataValidation:
     def __init__(self, data_ingestion_artifact: DataIngestionArtifact, data_validation_config: DataValidationConfig):
@@ -22,6 +28,9 @@ class DataValidation:
             self.data_ingestion_artifact = data_ingestion_artifact
             self.data_validation_config = data_validation_config
             self._schema_config = read_yaml(SCHEMA_FILE_PATH)
+            if data_ingestion_artifact.pushdown:
+                # the ingestion already derived company_age and dropped the drop_columns
+                self._schema_config = get_pushdown_schema(self._schema_config)
         except Exception as e:
             raise USvisaException(e, sys) from e
         
@@ -75,14 +84,95 @@ class DataValidation:
     @staticmethod
     def read_data(file_path: str) -> pd.DataFrame:
         try: 
-            return pd.read_csv(file_path)
+            return read_dataframe(file_path)
         except Exception as e:
             raise USvisaException(e, sys) from e
     
+    def validate_dataset(self, file_path: str, dataset_name: str, data_handle: DataFrameHandle = None) -> tuple:
+        """
+        Method Name:    validate_dataset
+        Description:    This method streams one dataset in chunks through the schema validator and the drift
+                        sketch, in a single scan, and runs the column validations on its header. The chunks
+                        come from the in-memory handle of the dataset when there is one, else from file_path
+
+        Output:         Returns the validation error message, empty when every validation passed, the
+                        validation report, the drift sketch of the dataset and the hashes of its unique columns
+        On Failure:     Raise an exception
+        """
+
+        try:
+            validation_error_message = ""
+            validator = SchemaValidator(schema_config=self._schema_config,
+                                        max_null_rate=self.data_validation_config.max_null_rate,
+                                        max_out_of_range_rate=self.data_validation_config.max_out_of_range_rate,
+                                        max_out_of_domain_rate=self.data_validation_config.max_out_of_domain_rate)
+            sketch = DatasetSketch(schema_config=self._schema_config)
+            header = None
+            chunk_size = self.data_validation_config.chunk_size
+            try:
+                chunks = (data_handle.iter_chunks(chunk_size) if data_handle is not None
+                          else iter_dataframe_chunks(file_path, chunk_size=chunk_size))
+                for chunk in chunks:
+                    if header is None:
+                        header = chunk.iloc[:0]
+                    validator.update(chunk)
+                    sketch.update(chunk)
+            finally:
+                # released on failure too, so the frame does not stay cached for a consumer that is gone
+                if data_handle is not None:
+                    data_handle.release()
+            if header is None:
+                header = pd.DataFrame()
+
+            status = self.validate_number_of_columns(dataframe=header)
+            logging.info(f"{dataset_name} data column count validation result: {'PASSED' if status else 'FAILED'}")
+            if not status:
+                validation_error_message += f"{dataset_name} data column count validation FAILED."
+
+            status = self.has_required_columns(dataframe=header)
+            logging.info(f"{dataset_name} data columns presence validation: {'PASSED' if status else 'FAILED'}")
+            if not status:
+                validation_error_message += f"Required columns missing in {dataset_name.lower()} data"
+
+            report = validator.report()
+            logging.info(f"{dataset_name} data schema validation: {'PASSED' if report['validation_status'] else 'FAILED'}")
+            for error in report["errors"]:
+                validation_error_message += f"{dataset_name} data: {error}."
+
+            return validation_error_message, report, sketch, validator.unique_hashes()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def detect_drift(self, sketch: DatasetSketch) -> dict:
+        """
+        Method Name:    detect_drift
+        Description:    This method compares the sketch of the ingested data with the reference sketch of the
+                        data the deployed model was trained on
+
+        Output:         Returns the drift report, drift is not checked when there is no reference sketch yet
+        On Failure:     Raise an exception
+        """
+
+        try:
+            reference_file_path = self.data_validation_config.drift_reference_file_path
+            if not os.path.exists(reference_file_path):
+                logging.info(f"No drift reference at {reference_file_path}, skipping drift detection")
+                return {"drift_status": False, "drifted_columns": [], "reference": None}
+
+            reference = DatasetSketch.from_dict(read_yaml(reference_file_path).to_dict())
+            drift_report = sketch.drift(reference, psi_threshold=self.data_validation_config.drift_psi_threshold)
+            drift_report["reference"] = reference_file_path
+            logging.info(f"Drifted columns: {drift_report['drifted_columns']}")
+            return drift_report
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    @instrument_stage("data_validation")
     def initiate_data_validation(self) -> DataValidationArtifact:
         """
         Method Name:    initiate_data_validation
-        Description:    This method initiates the data validation components for the pipeline
+        Description:    This method initiates the data validation components for the pipeline and writes
+                        the validation report of the training and testing data
 
         Output:         Returns bool value based on validation result
         On Failure:     Raise an exception
@@ -90,35 +180,43 @@ class DataValidation:
 
         try:
             logging.info("Starting Data Validation")
-            validation_error_message = ""
-            train_df, test_df = (DataValidation.read_data(file_path=self.data_ingestion_artifact.train_file_path),
-                                DataValidation.read_data(file_path=self.data_ingestion_artifact.test_file_path))
-            
-            status = self.validate_number_of_columns(dataframe=train_df)
-            logging.info(f"Training data column count validation result: {'PASSED' if status else 'FAILED'}")
-            if not status:
-                validation_error_message += "Training data column count validation FAILED."
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                ((train_message, train_report, sketch, train_hashes),
+                 (test_message, test_report, test_sketch, test_hashes)) = executor.map(
+                    self.validate_dataset,
+                    [self.data_ingestion_artifact.train_file_path, self.data_ingestion_artifact.test_file_path],
+                    ["Training", "Testing"],
+                    [self.data_ingestion_artifact.train_data, self.data_ingestion_artifact.test_data])
+            validation_error_message = train_message + test_message
 
-            status = self.validate_number_of_columns(dataframe=test_df)
-            logging.info(f"Testing data column count validation result: {'PASSED' if status else 'FAILED'}")
-            if not status:
-                validation_error_message += "Testing data column count validation FAILED."
-            
-            status = self.has_required_columns(dataframe=train_df)
-            logging.info(f"Training data columns presence validation: {'PASSED' if status else 'FAILED'}")
-            if not status:
-                validation_error_message += "Required columns missing in training data"
-            
-            status = self.has_required_columns(dataframe=test_df)
-            logging.info(f"Testing data columns presence validation: {'PASSED' if status else 'FAILED'}")
-            if not status:
-                validation_error_message += "Required columns missing in testing data"
+            # the unique columns are validated per split above, a value in both splits leaks the test set
+            cross_split_duplicates = {col: SchemaValidator.count_shared_values(hashes, test_hashes[col])
+                                      for col, hashes in train_hashes.items() if col in test_hashes}
+            for col, count in cross_split_duplicates.items():
+                logging.info(f"{col} values in both the training and the testing data: {count}")
+                if count > 0:
+                    validation_error_message += f"{count} values of {col} are in both the training and testing data."
+
+            sketch.merge(test_sketch)
+            drift_report = self.detect_drift(sketch)
+            if drift_report["drift_status"] and self.data_validation_config.fail_on_drift:
+                validation_error_message += f"Data drift detected on columns {drift_report['drifted_columns']}."
 
             validation_status = len(validation_error_message) == 0
 
+            report_file_path = self.data_validation_config.report_file_path
+            os.makedirs(os.path.dirname(report_file_path), exist_ok=True)
+            write_yaml(file_path=report_file_path,
+                       content={"validation_status": validation_status, "train": train_report, "test": test_report,
+                                "cross_split_duplicates": cross_split_duplicates, "drift": drift_report})
+            write_yaml(file_path=self.data_validation_config.drift_sketch_file_path, content=sketch.to_dict())
+            logging.info(f"Saved validation report at {report_file_path}")
+
             data_validation_artifact = DataValidationArtifact(
                 validation_status=validation_status,
-                message=validation_error_message
+                message=validation_error_message,
+                report_file_path=report_file_path,
+                drift_sketch_file_path=self.data_validation_config.drift_sketch_file_path
             )
 
             logging.info(f"Data Validation Artifact: {data_validation_artifact}")
@@ -0,0 +1,252 @@
+import os
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+from us_visa.utils.instrumentation import instrument_stage
+
+from us_visa.constants import TARGET_COLUMN, SCHEMA_FILE_PATH
+from us_visa.entity.config_entity import ModelEvaluationConfig
+from us_visa.entity.artifact_entity import (DataIngestionArtifact, DataTransformationArtifact,
+                                            ModelTrainerArtifact, ModelEvaluationArtifact)
+from us_visa.entity.estimator import USvisaModel, prepare_input_features, to_model_input
+from us_visa.entity.model_registry import ModelRegistry
+from us_visa.utils.main_utils import (load_object, load_numpy_array_data, read_dataframe, read_yaml, write_yaml,
+                                     get_column_dtypes)
+
+METRICS = ("f1_score", "precision_score", "recall_score", "roc_auc_score")
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=np.float64), where=denominator > 0)
+
+
+def bootstrap_metrics(y_true: np.ndarray, predictions: dict, scores: dict, n_bootstrap: int,
+                      random_state: int = 42, max_block_elements: int = 10_000_000) -> tuple:
+    """
+    Method Name: bootstrap_metrics
+    Description: Computes F1, precision, recall and ROC-AUC of several models on the same rows, together with
+                 n_bootstrap replicates of them. Every block of replicates is a matrix of row counts drawn
+                 with replacement, and the metrics of all the replicates of the block are computed at once.
+                 The columns hold the negative rows then the positive rows, so the confusion counts are
+                 matrix products and ROC-AUC is a cumulative sum of the negative counts read at the
+                 static positions of the positive scores. The models share the replicates, so differences
+                 of metrics are paired
+
+    Output: tuple of dict model -> metric -> point estimate and dict model -> metric -> array of replicates
+    On Failure: Raise an exception
+    """
+    try:
+        y_true = np.asarray(y_true).astype(bool)
+        negative_rows, positive_rows = np.flatnonzero(~y_true), np.flatnonzero(y_true)
+        # negative rows in the score order of the first model, whose count matrix then needs no reordering
+        first_score = np.asarray(scores[next(iter(predictions))])
+        negative_rows = negative_rows[np.argsort(first_score[negative_rows], kind="stable")]
+        n_negatives, n_rows = len(negative_rows), len(y_true)
+
+        models = {}
+        for name, y_pred in predictions.items():
+            y_pred = np.asarray(y_pred).astype(bool)
+            score = np.asarray(scores[name])
+            negative_order = np.argsort(score[negative_rows], kind="stable")
+            sorted_negative_scores = score[negative_rows][negative_order]
+            models[name] = {
+                "negative_pred": y_pred[negative_rows].astype(np.int64),
+                "positive_pred": y_pred[positive_rows].astype(np.int64),
+                # None when the negative rows are already in the score order of the model
+                "negative_order": None if np.array_equal(negative_order, np.arange(n_negatives)) else negative_order,
+                # number of negatives scored below, and below or equal, every positive
+                "below": np.searchsorted(sorted_negative_scores, score[positive_rows], side="left"),
+                "below_or_equal": np.searchsorted(sorted_negative_scores, score[positive_rows], side="right"),
+            }
+
+        def block_metrics(negative_weights, positive_weights):
+            negatives = negative_weights.sum(axis=1)
+            positives = positive_weights.sum(axis=1)
+            metrics = {}
+            for name, model in models.items():
+                tp = positive_weights @ model["positive_pred"]
+                fp = negative_weights @ model["negative_pred"]
+                sorted_weights = negative_weights if model["negative_order"] is None else \
+                    np.take(negative_weights, model["negative_order"], axis=1)
+                cumulative = np.zeros((len(negative_weights), n_negatives + 1), dtype=np.int64)
+                np.cumsum(sorted_weights, axis=1, out=cumulative[:, 1:])
+                below = np.take(cumulative, model["below"], axis=1) + np.take(cumulative, model["below_or_equal"], axis=1)
+                metrics[name] = {"f1_score": _safe_divide(2 * tp, tp + fp + positives),
+                                 "precision_score": _safe_divide(tp, tp + fp),
+                                 "recall_score": _safe_divide(tp, positives),
+                                 "roc_auc_score": _safe_divide(np.einsum("ij,ij->i", positive_weights, below) / 2,
+                                                               positives * negatives)}
+            return metrics
+
+        point = {name: {metric: float(value[0]) for metric, value in metrics.items()} for name, metrics in
+                 block_metrics(np.ones((1, n_negatives), dtype=np.int64),
+                               np.ones((1, n_rows - n_negatives), dtype=np.int64)).items()}
+
+        rng = np.random.default_rng(random_state)
+        block_size = max(1, min(n_bootstrap, max_block_elements // max(n_rows, 1)))
+        replicates = {name: {metric: [] for metric in METRICS} for name in models}
+        for start in range(0, n_bootstrap, block_size):
+            n_replicates = min(block_size, n_bootstrap - start)
+            draws = rng.integers(0, n_rows, size=(n_replicates, n_rows))
+            draws += (np.arange(n_replicates) * n_rows)[:, None]
+            weights = np.bincount(draws.ravel(), minlength=n_replicates * n_rows).reshape(n_replicates, n_rows)
+            # rows are exchangeable, so the first n_negatives columns are read as the negative rows
+            for name, metrics in block_metrics(weights[:, :n_negatives], weights[:, n_negatives:]).items():
+                for metric, values in metrics.items():
+                    replicates[name][metric].append(values)
+
+        replicates = {name: {metric: np.concatenate(values) for metric, values in metrics.items()}
+                      for name, metrics in replicates.items()}
+        return point, replicates
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+def _positive_scores(model: object, features) -> np.ndarray:
+    if hasattr(model, "predict_proba"):
+        return np.asarray(model.predict_proba(features))[:, 1]
+    return np.asarray(model.decision_function(features))
+
+
+class ModelEvaluation:
+
+    def __init__(self, model_eval_config: ModelEvaluationConfig, data_ingestion_artifact: DataIngestionArtifact,
+                 data_transformation_artifact: DataTransformationArtifact, model_trainer_artifact: ModelTrainerArtifact):
+        try:
+            self.model_eval_config = model_eval_config
+            self.data_ingestion_artifact = data_ingestion_artifact
+            self.data_transformation_artifact = data_transformation_artifact
+            self.model_trainer_artifact = model_trainer_artifact
+            self._schema_config = read_yaml(SCHEMA_FILE_PATH)
+            self.production_model_file_path = None
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_production_model(self) -> Optional[USvisaModel]:
+        """
+        Method Name: get_production_model
+        Description: This function loads the model currently in production, the one of production_model_file_path
+                     when it is set, else the current version of the model registry
+
+        Output: USvisaModel, None when no model is in production
+        On Failure: Raise an exception
+        """
+        try:
+            production_model_file_path = self.model_eval_config.production_model_file_path
+            if production_model_file_path is None:
+                model_registry = ModelRegistry(self.model_eval_config.model_registry_config)
+                version = model_registry.current_version()
+                if version is not None:
+                    production_model_file_path = model_registry.model_file_path(version)
+            if production_model_file_path is None or not os.path.exists(production_model_file_path):
+                return None
+            self.production_model_file_path = production_model_file_path
+            return load_object(production_model_file_path)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _confidence_interval(self, values: np.ndarray) -> tuple:
+        alpha = 1 - self.model_eval_config.confidence_level
+        lower, upper = np.quantile(values, [alpha / 2, 1 - alpha / 2])
+        return float(lower), float(upper)
+
+
+    def evaluate_model(self) -> dict:
+        """
+        Method Name: evaluate_model
+        Description: Scores the trained model on the transformed test array and the production model on the
+                     same test rows through its own preprocessor, then bootstraps their metrics
+
+        Output: evaluation report
+        On Failure: Raise an exception
+        """
+        try:
+            y_test = np.asarray(load_numpy_array_data(self.data_transformation_artifact.transformed_test_target_file_path))
+            x_test = load_numpy_array_data(self.data_transformation_artifact.transformed_test_file_path)
+            trained_model = load_object(self.model_trainer_artifact.trained_model_file_path).trained_model_object
+            x_test = to_model_input(trained_model, x_test)
+            predictions = {"trained_model": trained_model.predict(x_test)}
+            scores = {"trained_model": _positive_scores(trained_model, x_test)}
+
+            production_model = self.get_production_model()
+            if production_model is not None:
+                test_df = read_dataframe(self.data_ingestion_artifact.test_file_path,
+                                         column_dtypes=get_column_dtypes(self._schema_config))
+                features = prepare_input_features(test_df.drop(columns=TARGET_COLUMN), self._schema_config.drop_columns)
+                predictions["production_model"] = production_model.predict(features)
+                scores["production_model"] = production_model.predict_proba(features)[:, 1]
+
+            start = time.perf_counter()
+            point, replicates = bootstrap_metrics(y_test, predictions, scores,
+                                                  n_bootstrap=self.model_eval_config.n_bootstrap,
+                                                  random_state=self.model_eval_config.random_state,
+                                                  max_block_elements=self.model_eval_config.max_block_elements)
+            duration = time.perf_counter() - start
+            logging.info(f"Computed {self.model_eval_config.n_bootstrap} bootstrap replicates on {len(y_test)} rows "
+                         f"in {duration:.2f}s",
+                         extra={"stage": "model_evaluation", "duration_s": duration, "n_rows": len(y_test)})
+
+            report = {"n_rows": int(len(y_test)), "n_bootstrap": self.model_eval_config.n_bootstrap,
+                      "confidence_level": self.model_eval_config.confidence_level, "models": {}}
+            for name in predictions:
+                report["models"][name] = {}
+                for metric in METRICS:
+                    lower, upper = self._confidence_interval(replicates[name][metric])
+                    report["models"][name][metric] = {"value": point[name][metric], "lower": lower, "upper": upper}
+
+            if production_model is not None:
+                difference = replicates["trained_model"]["f1_score"] - replicates["production_model"]["f1_score"]
+                lower, upper = self._confidence_interval(difference)
+                report["f1_score_difference"] = {
+                    "value": point["trained_model"]["f1_score"] - point["production_model"]["f1_score"],
+                    "lower": lower, "upper": upper}
+            return report
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    @instrument_stage("model_evaluation")
+    def initiate_model_evaluation(self) -> ModelEvaluationArtifact:
+        """
+        Method Name: initiate_model_evaluation
+        Description: This function is used to initiate all steps of the model evaluation. The trained model is
+                     accepted when no model is in production, or when it improves the F1 score by at least
+                     changed_threshold_score and the lower bound of the confidence interval of the improvement
+                     is above 0
+
+        Output: Returns model evaluation artifact
+        On Failure: Raise an exception
+        """
+        try:
+            report = self.evaluate_model()
+            if "f1_score_difference" in report:
+                difference = report["f1_score_difference"]
+                is_model_accepted = (difference["value"] >= self.model_eval_config.changed_threshold_score
+                                     and difference["lower"] > 0)
+                changed_accuracy = difference["value"]
+            else:
+                is_model_accepted = True
+                changed_accuracy = report["models"]["trained_model"]["f1_score"]["value"]
+            report["is_model_accepted"] = is_model_accepted
+
+            report_file_path = self.model_eval_config.report_file_path
+            os.makedirs(os.path.dirname(report_file_path), exist_ok=True)
+            write_yaml(file_path=report_file_path, content=report)
+
+            model_evaluation_artifact = ModelEvaluationArtifact(
+                is_model_accepted=is_model_accepted,
+                changed_accuracy=changed_accuracy,
+                trained_model_path=self.model_trainer_artifact.trained_model_file_path,
+                production_model_path=self.production_model_file_path,
+                report_file_path=report_file_path)
+            logging.info(f"Model evaluation artifact: {model_evaluation_artifact}")
+            return model_evaluation_artifact
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -0,0 +1,97 @@
+import os
+import sys
+import shutil
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+from us_visa.utils.instrumentation import instrument_stage
+
+from us_visa.constants import (MODEL_FILE_NAME, PREPROCESSING_OBJECT_FILE_NAME, COMPILED_PREPROCESSING_OBJECT_FILE_NAME,
+                               DATA_VALIDATION_DRIFT_SKETCH_FILE_NAME)
+from us_visa.entity.config_entity import ModelPusherConfig, training_pipeline_config
+from us_visa.entity.artifact_entity import (DataValidationArtifact, DataTransformationArtifact,
+                                            ModelEvaluationArtifact, ModelPusherArtifact)
+from us_visa.entity.model_registry import ModelRegistry
+
+
+class ModelPusher:
+    def __init__(self, model_pusher_config: ModelPusherConfig, model_evaluation_artifact: ModelEvaluationArtifact,
+                 data_validation_artifact: DataValidationArtifact,
+                 data_transformation_artifact: DataTransformationArtifact):
+        """
+        :param model_pusher_config: Configuration for model pusher
+        :param model_evaluation_artifact: Output reference of model evaluation artifact stage
+        :param data_validation_artifact: Output reference of data validation artifact stage
+        :param data_transformation_artifact: Output reference of data transformation artifact stage
+        """
+        try:
+            self.model_pusher_config = model_pusher_config
+            self.model_evaluation_artifact = model_evaluation_artifact
+            self.data_validation_artifact = data_validation_artifact
+            self.data_transformation_artifact = data_transformation_artifact
+            self.model_registry = ModelRegistry(model_pusher_config.model_registry_config)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_bundle_files(self) -> dict:
+        """
+        Method Name: get_bundle_files
+        Description: Files published together as one version: the model, the preprocessors it was trained
+                     with, and the drift sketch of its training data
+
+        Output: dict of file name to local file path
+        On Failure: Raise an exception
+        """
+        try:
+            files = {MODEL_FILE_NAME: self.model_evaluation_artifact.trained_model_path,
+                     PREPROCESSING_OBJECT_FILE_NAME: self.data_transformation_artifact.transformed_object_file_path,
+                     DATA_VALIDATION_DRIFT_SKETCH_FILE_NAME: self.data_validation_artifact.drift_sketch_file_path}
+            if self.data_transformation_artifact.compiled_object_file_path:
+                files[COMPILED_PREPROCESSING_OBJECT_FILE_NAME] = self.data_transformation_artifact.compiled_object_file_path
+            return files
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def update_drift_reference(self) -> None:
+        # copied next to the reference then renamed over it, a concurrent validation reads a whole sketch
+        reference_file_path = self.model_pusher_config.drift_reference_file_path
+        os.makedirs(os.path.dirname(reference_file_path), exist_ok=True)
+        tmp_file_path = reference_file_path + ".tmp"
+        shutil.copyfile(self.data_validation_artifact.drift_sketch_file_path, tmp_file_path)
+        os.replace(tmp_file_path, reference_file_path)
+        logging.info(f"Drift reference {reference_file_path} updated")
+
+
+    @instrument_stage("model_pusher")
+    def initiate_model_pusher(self) -> ModelPusherArtifact:
+        """
+        Method Name: initiate_model_pusher
+        Description: Publishes the accepted model to the model registry and makes it the current version.
+                     Running prediction services pick it up on their next poll of the registry
+
+        Output: Returns model pusher artifact
+        On Failure: Raise an exception
+        """
+        logging.info("Entered initiate_model_pusher method of ModelPusher class")
+        try:
+            if not self.model_evaluation_artifact.is_model_accepted:
+                logging.info("Trained model was not accepted, the current version of the model registry is kept")
+                return ModelPusherArtifact(is_model_pushed=False,
+                                           model_version=self.model_registry.current_version(),
+                                           registry_uri=self.model_registry.uri)
+
+            version = self.model_registry.publish(
+                self.get_bundle_files(),
+                metadata={"training_run": training_pipeline_config.timestamp,
+                          "changed_accuracy": float(self.model_evaluation_artifact.changed_accuracy),
+                          "previous_version": self.model_registry.current_version()})
+            self.update_drift_reference()
+
+            model_pusher_artifact = ModelPusherArtifact(is_model_pushed=True, model_version=version,
+                                                        registry_uri=self.model_registry.uri)
+            logging.info(f"Model pusher artifact: {model_pusher_artifact}")
+            return model_pusher_artifact
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -0,0 +1,283 @@
+import os
+import sys
+import math
+import time
+import resource
+import importlib
+import multiprocessing
+
+import numpy as np
+from sklearn.metrics import f1_score, precision_score, recall_score
+from sklearn.model_selection import ParameterGrid
+from sklearn.utils.validation import has_fit_parameter
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+from us_visa.utils.instrumentation import instrument_stage, _max_rss_mb, _peak_rss_mb, _reset_peak_rss
+
+from us_visa.entity.config_entity import ModelTrainerConfig
+from us_visa.entity.artifact_entity import DataTransformationArtifact, ModelTrainerArtifact
+from us_visa.entity.estimator import USvisaModel, to_model_input
+from us_visa.utils.main_utils import load_numpy_array_data, load_object, save_object, read_yaml, write_yaml
+
+
+# state of a search worker process, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(train_file_path: str, train_target_file_path: str, sample_weight_file_path: str,
+                 fit_index: np.ndarray, validation_index: np.ndarray) -> None:
+    _worker["X"] = load_numpy_array_data(train_file_path)
+    _worker["y"] = load_numpy_array_data(train_target_file_path)
+    _worker["sample_weight"] = load_numpy_array_data(sample_weight_file_path) if sample_weight_file_path else None
+    _worker["fit_index"] = fit_index
+    _worker["validation_index"] = validation_index
+
+
+def _fit_candidate(candidate: dict, X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray = None) -> object:
+    # models without sample_weight support, e.g. k-nearest neighbours, are fitted unweighted
+    model = getattr(importlib.import_module(candidate["module"]), candidate["class"])(**candidate["params"])
+    fit_params = {}
+    if sample_weight is not None and has_fit_parameter(model, "sample_weight"):
+        fit_params["sample_weight"] = sample_weight
+    return model.fit(to_model_input(model, X), y, **fit_params)
+
+
+def _rss_peak_mb(peak_reset: bool) -> float:
+    # VmHWM since the last reset, the peak of the worker lifetime where the peak cannot be reset
+    return _peak_rss_mb() if peak_reset else _max_rss_mb(resource.RUSAGE_SELF)
+
+
+def _evaluate_candidate(candidate: dict, n_rows: int) -> dict:
+    X, y, sample_weight = _worker["X"], _worker["y"], _worker["sample_weight"]
+    fit_index = np.sort(_worker["fit_index"][:n_rows])
+    validation_index = _worker["validation_index"]
+
+    # the peak RSS covers the native allocations of the boosting and tree libraries, tracemalloc would miss them
+    # and slow down the timed fit
+    peak_reset = _reset_peak_rss()
+    start_rss_mb = _rss_peak_mb(peak_reset)
+    start = time.perf_counter()
+    model = _fit_candidate(candidate, X[fit_index], y[fit_index],
+                           sample_weight[fit_index] if sample_weight is not None else None)
+    fit_time = time.perf_counter() - start
+    peak_memory_mb = _rss_peak_mb(peak_reset) - start_rss_mb
+
+    score = f1_score(y[validation_index], model.predict(to_model_input(model, X[validation_index])))
+    return {"score": float(score), "fit_time": fit_time, "peak_memory_mb": peak_memory_mb, "model": model}
+
+
+class ModelTrainer:
+    def __init__(self, data_transformation_artifact: DataTransformationArtifact,
+                 model_trainer_config: ModelTrainerConfig):
+        """
+        :param data_transformation_artifact: Output reference of data transformation artifact stage
+        :param model_trainer_config: Configuration for model trainer
+        """
+        try:
+            self.data_transformation_artifact = data_transformation_artifact
+            self.model_trainer_config = model_trainer_config
+            self._model_config = read_yaml(model_trainer_config.model_config_file_path)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_candidates(self) -> list:
+        """
+        Method Name: get_candidates
+        Description: Expands the search_param_grid of every model of model.yaml into configurations. Models
+                     whose module cannot be imported are skipped
+
+        Output: list of dicts with id, name, module, class and params
+        On Failure: Raise an exception
+        """
+        try:
+            candidates = []
+            for module_name, model_config in self._model_config.model_selection.items():
+                try:
+                    importlib.import_module(model_config.module)
+                except ImportError:
+                    logging.info(f"Skipping {model_config['class']} of {module_name}, {model_config.module} is not installed")
+                    continue
+
+                search_param_grid = model_config.get("search_param_grid") or {}
+                for params in ParameterGrid(search_param_grid.to_dict() if search_param_grid else {}):
+                    candidates.append({
+                        "id": len(candidates),
+                        "name": model_config["class"],
+                        "module": model_config.module,
+                        "class": model_config["class"],
+                        "params": {**(model_config.get("params") or {}), **params},
+                    })
+            return candidates
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def successive_halving(self, candidates: list, n_train_rows: int) -> tuple:
+        """
+        Method Name: successive_halving
+        Description: Fits every candidate on a small fraction of the training rows, keeps the best 1 / eta
+                     on the held out rows and fits the survivors on eta times more rows, until the last rung
+                     is fitted on all the rows. Fits run on a process pool. When time_budget_seconds expires
+                     the running fits are terminated and the best model fitted so far is returned
+
+        Output: tuple of the best evaluation, with its fitted model, and the list of all evaluations
+        On Failure: Raise an exception
+        """
+        try:
+            search_config = self._model_config.successive_halving
+            eta = search_config.eta
+            random_state = np.random.RandomState(search_config.random_state)
+            permutation = random_state.permutation(n_train_rows)
+            n_validation = int(n_train_rows * search_config.validation_fraction)
+            validation_index, fit_index = np.sort(permutation[:n_validation]), permutation[n_validation:]
+
+            n_rungs = 1 + min(math.ceil(math.log(len(candidates), eta)) if len(candidates) > 1 else 0,
+                              math.floor(math.log(1 / search_config.min_fraction, eta)))
+            deadline = time.monotonic() + self.model_trainer_config.time_budget_seconds
+
+            evaluations, best = [], None
+            survivors = candidates
+            with multiprocessing.Pool(self.model_trainer_config.n_workers, initializer=_init_worker,
+                                      initargs=(self.data_transformation_artifact.transformed_train_file_path,
+                                                self.data_transformation_artifact.transformed_train_target_file_path,
+                                                self.data_transformation_artifact.transformed_train_sample_weight_file_path,
+                                                fit_index, validation_index)) as pool:
+                for rung in range(n_rungs):
+                    n_rows = max(int(len(fit_index) * eta ** (rung - n_rungs + 1)), 1)
+                    logging.info(f"Successive halving rung {rung}: {len(survivors)} candidates on {n_rows} rows")
+                    results = [(candidate, pool.apply_async(_evaluate_candidate, (candidate, n_rows)))
+                               for candidate in survivors]
+
+                    scores = {}
+                    for candidate, result in results:
+                        try:
+                            evaluation = result.get(timeout=max(deadline - time.monotonic(), 0))
+                        except multiprocessing.TimeoutError:
+                            logging.info("Model search time budget expired, terminating the running fits")
+                            return best, evaluations
+                        except Exception as e:
+                            logging.info(f"Candidate {candidate['id']} {candidate['name']} {candidate['params']} failed: {e}")
+                            continue
+
+                        model = evaluation.pop("model")
+                        evaluation.update(candidate=candidate["id"], name=candidate["name"], params=candidate["params"],
+                                          rung=rung, n_rows=n_rows)
+                        evaluations.append(evaluation)
+                        scores[candidate["id"]] = evaluation["score"]
+                        logging.info(f"Candidate {candidate['id']} {candidate['name']} {candidate['params']} on {n_rows} rows: "
+                                     f"f1 {evaluation['score']:.4f}, fit time {evaluation['fit_time']:.3f}s, "
+                                     f"peak memory {evaluation['peak_memory_mb']:.1f}MB",
+                                     extra={"stage": "model_trainer", "candidate": candidate["id"],
+                                            "duration_s": evaluation["fit_time"], "n_rows": n_rows})
+                        if best is None or (rung, evaluation["score"]) > (best["rung"], best["score"]):
+                            best = {**evaluation, "model": model}
+
+                    n_survivors = max(math.ceil(len(scores) / eta), 1)
+                    survivors = sorted((candidate for candidate in survivors if candidate["id"] in scores),
+                                       key=lambda candidate: scores[candidate["id"]], reverse=True)[:n_survivors]
+                    if not survivors:
+                        break
+            return best, evaluations
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def refit_candidate(self, candidate: dict) -> object:
+        """
+        Method Name: refit_candidate
+        Description: Fits the configuration of candidate on all the training rows, the held out rows
+                     included, with the sample weights of the class_weight resampling strategy
+
+        Output: fitted model
+        On Failure: Raise an exception
+        """
+        try:
+            artifact = self.data_transformation_artifact
+            sample_weight_file_path = artifact.transformed_train_sample_weight_file_path
+            X = load_numpy_array_data(artifact.transformed_train_file_path)
+            y = load_numpy_array_data(artifact.transformed_train_target_file_path)
+            sample_weight = load_numpy_array_data(sample_weight_file_path) if sample_weight_file_path else None
+            start = time.perf_counter()
+            model = _fit_candidate(candidate, X, y, sample_weight)
+            logging.info(f"Refitted {candidate['name']} {candidate['params']} on {len(y)} rows "
+                         f"in {time.perf_counter() - start:.1f}s")
+            return model
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    @instrument_stage("model_trainer")
+    def initiate_model_trainer(self) -> ModelTrainerArtifact:
+        """
+        Method Name: initiate_model_trainer
+        Description: This function initiates a model trainer steps
+
+        Output: Returns model trainer artifact
+        On Failure: Write an exception log and then raise an exception
+        """
+        logging.info("Entered initiate_model_trainer method of ModelTrainer class")
+        try:
+            candidates = self.get_candidates()
+            if not candidates:
+                raise Exception("No model of model.yaml can be imported")
+
+            n_train_rows = len(load_numpy_array_data(self.data_transformation_artifact.transformed_train_target_file_path))
+            start = time.perf_counter()
+            best, evaluations = self.successive_halving(candidates, n_train_rows)
+            logging.info(f"Model search evaluated {len(evaluations)} fits of {len(candidates)} candidates "
+                         f"in {time.perf_counter() - start:.1f}s")
+            if best is None:
+                raise Exception("No candidate model could be fitted within the time budget")
+            if best["n_rows"] < n_train_rows - int(n_train_rows * self._model_config.successive_halving.validation_fraction):
+                logging.info(f"Best model was fitted on {best['n_rows']} rows only, the time budget expired before the last rung")
+
+            # the search held validation_fraction of the rows out, the shipped model is fitted on all of them
+            if time.perf_counter() - start < self.model_trainer_config.time_budget_seconds:
+                best["model"] = self.refit_candidate(candidates[best["candidate"]])
+                best["refit_rows"] = n_train_rows
+            else:
+                logging.info(f"Best model is not refitted on all the {n_train_rows} training rows, the time budget "
+                             f"expired during the search, it keeps its fit on {best['n_rows']} rows")
+
+            os.makedirs(os.path.dirname(self.model_trainer_config.search_report_file_path), exist_ok=True)
+            write_yaml(file_path=self.model_trainer_config.search_report_file_path,
+                       content={"candidates": len(candidates),
+                                "best": {key: value for key, value in best.items() if key != "model"},
+                                "evaluations": evaluations})
+
+            x_test = load_numpy_array_data(self.data_transformation_artifact.transformed_test_file_path)
+            y_test = load_numpy_array_data(self.data_transformation_artifact.transformed_test_target_file_path)
+            y_pred = best["model"].predict(to_model_input(best["model"], x_test))
+            f1 = f1_score(y_test, y_pred)
+            precision = precision_score(y_test, y_pred)
+            recall = recall_score(y_test, y_pred)
+            logging.info(f"Best model {best['name']} {best['params']}: test f1 {f1:.4f}, "
+                         f"precision {precision:.4f}, recall {recall:.4f}")
+
+            if f1 < self.model_trainer_config.expected_accuracy:
+                logging.info("No best model found with score more than base score")
+                raise Exception("No best model found with score more than base score")
+
+            compiled_object_file_path = self.data_transformation_artifact.compiled_object_file_path
+            usvisa_model = USvisaModel(
+                preprocessing_object=load_object(self.data_transformation_artifact.transformed_object_file_path),
+                trained_model_object=best["model"],
+                compiled_preprocessing_object=load_object(compiled_object_file_path) if compiled_object_file_path else None
+            )
+            save_object(self.model_trainer_config.trained_model_file_path, usvisa_model)
+            logging.info("Created usvisa model object with preprocessor and model")
+
+            model_trainer_artifact = ModelTrainerArtifact(
+                trained_model_file_path=self.model_trainer_config.trained_model_file_path,
+                search_report_file_path=self.model_trainer_config.search_report_file_path,
+                best_model_name=best["name"],
+                f1_score=float(f1),
+                precision_score=float(precision),
+                recall_score=float(recall),
+            )
+            logging.info(f"Model trainer artifact: {model_trainer_artifact}")
+            return model_trainer_artifact
+        except Exception as e:
+            raise USvisaException(e, sys) from e
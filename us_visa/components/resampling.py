@@ -0,0 +1,176 @@
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+from imblearn.combine import SMOTEENN
+from imblearn.over_sampling import SMOTE
+from imblearn.under_sampling import EditedNearestNeighbours
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import NearestNeighbors
+from sklearn.utils.class_weight import compute_sample_weight
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+RESAMPLING_STRATEGIES = ("smoteenn", "parallel_knn", "chunked_enn", "approximate_knn", "class_weight", "none")
+
+# neighbours of SMOTE synthesis and of the Edited Nearest Neighbours cleanup, the imblearn defaults
+SMOTE_K_NEIGHBORS = 5
+ENN_N_NEIGHBORS = 3
+
+
+class Resampler:
+    '''
+    Class Name: Resampler
+    Description: Balances the transformed training set, a dense array or a CSR matrix, with one of
+                 RESAMPLING_STRATEGIES
+                 smoteenn:        imblearn SMOTEENN on the minority class, single-threaded
+                 parallel_knn:    the same SMOTEENN with the neighbour searches on n_jobs threads, with the
+                                  knn_algorithm index, e.g. ball_tree for low-dimensional data
+                 chunked_enn:     parallel SMOTE, then Edited Nearest Neighbours querying chunk_size rows at a
+                                  time against one neighbour index, so the cleanup memory is bounded
+                 approximate_knn: SMOTE and ENN with neighbours searched only within k-means partitions of
+                                  about partition_size rows, an inverted-file approximate nearest neighbours
+                 class_weight:    no resampling, balanced sample weights are returned for the trainer
+                 none:            no resampling and no weights
+    '''
+
+    def __init__(self, strategy: str, n_jobs: int = -1, knn_algorithm: str = "auto", chunk_size: int = 100000,
+                 partition_size: int = 20000, random_state: int = 42):
+        try:
+            if strategy not in RESAMPLING_STRATEGIES:
+                raise Exception(f"Unsupported resampling strategy: {strategy}, expected one of {RESAMPLING_STRATEGIES}")
+            self.strategy = strategy
+            self.n_jobs = n_jobs
+            self.knn_algorithm = knn_algorithm
+            self.chunk_size = chunk_size
+            self.partition_size = partition_size
+            self.random_state = random_state
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _neighbors(self, n_neighbors: int) -> NearestNeighbors:
+        return NearestNeighbors(n_neighbors=n_neighbors, algorithm=self.knn_algorithm, n_jobs=self.n_jobs)
+
+
+    def _smote(self) -> SMOTE:
+        # the estimator is queried for k + 1 neighbours, the first one being the sample itself
+        return SMOTE(sampling_strategy="minority", k_neighbors=self._neighbors(SMOTE_K_NEIGHBORS + 1),
+                     random_state=self.random_state)
+
+
+    def edited_nearest_neighbours(self, X: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Method Name: edited_nearest_neighbours
+        Description: Removes the samples whose ENN_N_NEIGHBORS nearest neighbours are not all of their class,
+                     as EditedNearestNeighbours(sampling_strategy='all') does, querying chunk_size rows at a time
+
+        Output: tuple of the kept rows of X and y
+        On Failure: Raise an exception
+        """
+        try:
+            nn = self._neighbors(ENN_N_NEIGHBORS + 1).fit(X)
+            keep = np.empty(X.shape[0], dtype=bool)
+            for start in range(0, X.shape[0], self.chunk_size):
+                end = min(start + self.chunk_size, X.shape[0])
+                neighbors = nn.kneighbors(X[start:end], return_distance=False)[:, 1:]
+                keep[start:end] = (y[neighbors] == y[start:end, None]).all(axis=1)
+            return X[keep], y[keep]
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _partitioned_kneighbors(self, X: np.ndarray, partitions: np.ndarray, n_neighbors: int) -> np.ndarray:
+        # exact neighbours within every partition, the sample itself first. Partitions with fewer rows than
+        # n_neighbors repeat their farthest neighbour
+        indices = np.empty((X.shape[0], n_neighbors), dtype=np.int64)
+        order = np.argsort(partitions, kind="stable")
+        bounds = np.cumsum(np.bincount(partitions))
+        for start, end in zip(np.concatenate([[0], bounds[:-1]]), bounds):
+            rows = order[start:end]
+            if len(rows) == 0:
+                continue
+            k = min(n_neighbors, len(rows))
+            neighbors = rows[NearestNeighbors(n_neighbors=k).fit(X[rows]).kneighbors(X[rows], return_distance=False)]
+            indices[rows] = np.pad(neighbors, ((0, 0), (0, n_neighbors - k)), mode="edge")
+        return indices
+
+
+    def approximate_smoteenn(self, X: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Method Name: approximate_smoteenn
+        Description: SMOTE of the minority class up to the size of the majority class, then ENN, with the
+                     neighbours searched only within the k-means partition of every sample
+
+        Output: tuple of the resampled X and y
+        On Failure: Raise an exception
+        """
+        try:
+            rng = np.random.default_rng(self.random_state)
+            n_partitions = max(1, int(np.ceil(X.shape[0] / self.partition_size)))
+            kmeans = MiniBatchKMeans(n_clusters=n_partitions, batch_size=max(1024, 8 * n_partitions), n_init=1,
+                                     random_state=self.random_state).fit(X)
+            partitions = kmeans.labels_
+
+            classes, counts = np.unique(y, return_counts=True)
+            minority = classes[np.argmin(counts)]
+            minority_rows = np.flatnonzero(y == minority)
+            X_minority = X[minority_rows]
+            neighbors = self._partitioned_kneighbors(X_minority, partitions[minority_rows], SMOTE_K_NEIGHBORS + 1)[:, 1:]
+
+            n_synthetic = counts.max() - counts.min()
+            samples = rng.integers(len(minority_rows), size=n_synthetic)
+            partners = neighbors[samples, rng.integers(SMOTE_K_NEIGHBORS, size=n_synthetic)]
+            gaps = rng.random(n_synthetic)
+            if sp.issparse(X):
+                X_synthetic = X_minority[samples] + sp.diags(gaps) @ (X_minority[partners] - X_minority[samples])
+                X = sp.vstack([X, X_synthetic.astype(X.dtype, copy=False)], format="csr")
+            else:
+                X_synthetic = X_minority[samples] + gaps[:, None] * (X_minority[partners] - X_minority[samples])
+                X = np.concatenate([X, X_synthetic.astype(X.dtype, copy=False)])
+            y = np.concatenate([y, np.full(n_synthetic, minority, dtype=y.dtype)])
+            # a synthetic sample lies between two samples of the same partition, it is kept in that partition
+            partitions = np.concatenate([partitions, partitions[minority_rows[samples]]])
+
+            neighbors = self._partitioned_kneighbors(X, partitions, ENN_N_NEIGHBORS + 1)[:, 1:]
+            keep = (y[neighbors] == y[:, None]).all(axis=1)
+            return X[keep], y[keep]
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def fit_resample(self, X: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Method Name: fit_resample
+        Description: Resamples X and y with the configured strategy
+
+        Output: tuple of the resampled X and y and of the sample weights, None unless the strategy is class_weight
+        On Failure: Raise an exception
+        """
+        try:
+            start = time.perf_counter()
+            y = np.asarray(y)
+            n_rows = len(y)
+            sample_weight: Optional[np.ndarray] = None
+            if self.strategy == "smoteenn":
+                X, y = SMOTEENN(sampling_strategy="minority", random_state=self.random_state).fit_resample(X, y)
+            elif self.strategy == "parallel_knn":
+                enn = EditedNearestNeighbours(sampling_strategy="all", n_neighbors=self._neighbors(ENN_N_NEIGHBORS + 1),
+                                              n_jobs=self.n_jobs)
+                X, y = SMOTEENN(smote=self._smote(), enn=enn, random_state=self.random_state).fit_resample(X, y)
+            elif self.strategy == "chunked_enn":
+                X, y = self._smote().fit_resample(X, y)
+                X, y = self.edited_nearest_neighbours(X, y)
+            elif self.strategy == "approximate_knn":
+                X, y = self.approximate_smoteenn(X, y)
+            elif self.strategy == "class_weight":
+                sample_weight = compute_sample_weight("balanced", y)
+
+            logging.info(f"Resampled {n_rows} rows to {len(y)} rows with the {self.strategy} strategy",
+                         extra={"stage": "resampling", "duration_s": time.perf_counter() - start, "n_rows": len(y)})
+            return X, y, sample_weight
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -0,0 +1,192 @@
+import sys
+
+import numpy as np
+import pandas as pd
+from box import Box
+
+from us_visa.exception import USvisaException
+from us_visa.utils.main_utils import get_column_dtypes
+
+
+class SchemaValidator:
+    '''
+    Class Name: SchemaValidator
+    Description: Validation rules compiled from schema.yaml. Chunks of a dataset are fed to update, which
+                 runs every check as one vectorized pass over the chunk and accumulates counters, so a
+                 dataset of any size is validated in a single streaming scan:
+                   - presence of the schema columns and absence of unexpected ones
+                   - dtype conformance of the numerical columns
+                   - null rate of every column
+                   - min / max ranges of the numerical columns
+                   - allowed values (domains) of the categorical columns
+                   - duplicates of the unique columns
+    '''
+
+    def __init__(self, schema_config: Box, max_null_rate: float = 0.0, max_out_of_range_rate: float = 0.0,
+                 max_out_of_domain_rate: float = 0.0, n_unknown_values: int = 5):
+        try:
+            self.column_dtypes = get_column_dtypes(schema_config)
+            self.numerical_columns = [col for col, dtype in self.column_dtypes.items() if dtype != "category"]
+            self.ranges = {col: (bounds.get("min", -np.inf), bounds.get("max", np.inf))
+                           for col, bounds in schema_config.get("ranges", {}).items()}
+            self.domains = {col: pd.Index(values) for col, values in schema_config.get("domains", {}).items()}
+            self.unique_columns = list(schema_config.get("unique_columns", []))
+
+            self.max_null_rate = max_null_rate
+            self.max_out_of_range_rate = max_out_of_range_rate
+            self.max_out_of_domain_rate = max_out_of_domain_rate
+            self.n_unknown_values = n_unknown_values
+            self.reset()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def reset(self) -> None:
+        self.n_rows = 0
+        self.columns = None
+        self.null_counts = pd.Series(0, index=list(self.column_dtypes), dtype="int64")
+        self.non_conforming_counts = {col: 0 for col in self.numerical_columns}
+        self.out_of_range_counts = {col: 0 for col in self.ranges}
+        self.minimums = {col: np.inf for col in self.numerical_columns}
+        self.maximums = {col: -np.inf for col in self.numerical_columns}
+        self.out_of_domain_counts = {col: pd.Series(dtype="int64") for col in self.domains}
+        self._unique_hashes = {col: [] for col in self.unique_columns}
+
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """
+        Method Name: update
+        Description: Accumulates the checks over one chunk of the dataset
+
+        Output: Counters are updated
+        On Failure: Raise an exception
+        """
+        try:
+            if self.columns is None:
+                self.columns = list(chunk.columns)
+            self.n_rows += len(chunk)
+
+            present = [col for col in self.column_dtypes if col in chunk.columns]
+            self.null_counts = self.null_counts.add(chunk[present].isna().sum(), fill_value=0).astype("int64")
+
+            for col in self.numerical_columns:
+                if col not in chunk.columns:
+                    continue
+                values = chunk[col]
+                if not pd.api.types.is_numeric_dtype(values):
+                    numeric = pd.to_numeric(values, errors="coerce")
+                    self.non_conforming_counts[col] += int((numeric.isna() & values.notna()).sum())
+                    values = numeric
+                values = values.to_numpy(dtype="float64", na_value=np.nan)
+                if np.issubdtype(np.dtype(self.column_dtypes[col]), np.integer):
+                    self.non_conforming_counts[col] += int(np.count_nonzero(np.isfinite(values) & (values != np.floor(values))))
+
+                if np.isfinite(values).any():
+                    self.minimums[col] = min(self.minimums[col], float(np.nanmin(values)))
+                    self.maximums[col] = max(self.maximums[col], float(np.nanmax(values)))
+                if col in self.ranges:
+                    low, high = self.ranges[col]
+                    self.out_of_range_counts[col] += int(np.count_nonzero((values < low) | (values > high)))
+
+            for col, domain in self.domains.items():
+                if col not in chunk.columns:
+                    continue
+                values = chunk[col]
+                unknown = values[values.notna() & ~values.isin(domain)]
+                if len(unknown) > 0:
+                    self.out_of_domain_counts[col] = self.out_of_domain_counts[col].add(
+                        unknown.astype(str).value_counts(), fill_value=0).astype("int64")
+
+            for col in self.unique_columns:
+                if col in chunk.columns:
+                    self._unique_hashes[col].append(pd.util.hash_pandas_object(chunk[col], index=False).to_numpy())
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def unique_hashes(self) -> dict:
+        '''
+        sorted distinct hashes of the values of every unique column seen since the last reset, the hashes of
+        two datasets are compared by count_shared_values
+        '''
+        return {col: np.unique(np.concatenate(hashes)) for col, hashes in self._unique_hashes.items() if hashes}
+
+
+    @staticmethod
+    def count_shared_values(hashes: np.ndarray, other_hashes: np.ndarray) -> int:
+        '''
+        number of distinct values two datasets share, from their unique_hashes
+        '''
+        return int(len(np.intersect1d(hashes, other_hashes, assume_unique=True)))
+
+
+    def report(self) -> dict:
+        """
+        Method Name: report
+        Description: Builds the validation report of the chunks seen since the last reset
+
+        Output: dict with validation_status, errors and the per column statistics
+        On Failure: Raise an exception
+        """
+        try:
+            errors = []
+            columns = self.columns or []
+            missing_columns = [col for col in self.column_dtypes if col not in columns]
+            unexpected_columns = [col for col in columns if col not in self.column_dtypes]
+            if missing_columns:
+                errors.append(f"Missing columns: {missing_columns}")
+            if unexpected_columns:
+                errors.append(f"Unexpected columns: {unexpected_columns}")
+
+            n_rows = max(self.n_rows, 1)
+            column_reports = {}
+            for col in self.column_dtypes:
+                if col in missing_columns:
+                    continue
+                null_count = int(self.null_counts[col])
+                column_report = {"dtype": self.column_dtypes[col], "null_count": null_count,
+                                 "null_rate": null_count / n_rows}
+                if null_count / n_rows > self.max_null_rate:
+                    errors.append(f"Null rate of {col} is {null_count / n_rows:.4f}")
+
+                if col in self.non_conforming_counts:
+                    column_report["non_conforming_count"] = self.non_conforming_counts[col]
+                    column_report["min"] = self.minimums[col] if np.isfinite(self.minimums[col]) else None
+                    column_report["max"] = self.maximums[col] if np.isfinite(self.maximums[col]) else None
+                    if self.non_conforming_counts[col] > 0:
+                        errors.append(f"{self.non_conforming_counts[col]} values of {col} are not {self.column_dtypes[col]}")
+
+                if col in self.out_of_range_counts:
+                    count = self.out_of_range_counts[col]
+                    column_report["out_of_range_count"] = count
+                    if count / n_rows > self.max_out_of_range_rate:
+                        errors.append(f"{count} values of {col} are out of range")
+
+                if col in self.out_of_domain_counts:
+                    unknown = self.out_of_domain_counts[col].sort_values(ascending=False)
+                    count = int(unknown.sum())
+                    column_report["out_of_domain_count"] = count
+                    column_report["unknown_values"] = [str(value) for value in unknown.index[:self.n_unknown_values]]
+                    if count / n_rows > self.max_out_of_domain_rate:
+                        errors.append(f"{count} values of {col} are outside of the allowed domain")
+
+                column_reports[col] = column_report
+
+            duplicates = {}
+            for col, hashes in self.unique_hashes().items():
+                n_values = sum(len(chunk_hashes) for chunk_hashes in self._unique_hashes[col])
+                duplicates[col] = int(n_values - len(hashes))
+                if duplicates[col] > 0:
+                    errors.append(f"{duplicates[col]} duplicated values of {col}")
+
+            return {
+                "validation_status": len(errors) == 0,
+                "errors": errors,
+                "n_rows": self.n_rows,
+                "missing_columns": missing_columns,
+                "unexpected_columns": unexpected_columns,
+                "duplicates": duplicates,
+                "columns": column_reports,
+            }
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -0,0 +1,32 @@
+import sys
+from typing import Optional
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+from us_visa.constants import REGION_NAME
+
+
+class S3Client:
+    '''
+    Class Name: S3Client
+    Description: Creates the boto3 S3 client, shared by the instances using the same endpoint. Credentials
+                 are read by boto3 from the environment. endpoint_url points the client at an S3
+                 compatible store, e.g. a local MinIO, instead of AWS
+
+    Output: boto3 S3 client
+    On Failure: raises an exception
+    '''
+
+    clients = {}
+
+    def __init__(self, endpoint_url: Optional[str] = None, region_name: str = REGION_NAME) -> None:
+        try:
+            if endpoint_url not in S3Client.clients:
+                import boto3
+                S3Client.clients[endpoint_url] = boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name)
+                logging.info(f"S3 client created for {endpoint_url or 'AWS'}")
+
+            self.client = S3Client.clients[endpoint_url]
+        except Exception as e:
+            raise USvisaException(e, sys) from e
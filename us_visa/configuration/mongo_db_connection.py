@@ -4,34 +4,183 @@ from us_visa.exception import USvisaException
 from us_visa.logger import logging
 
 import os
+from typing import Optional
 from us_visa.constants import DATABASE_NAME, MONGODB_URL_KEY
-import pymongo
-import certifi
+from us_visa.entity.config_entity import MongoDBConfig
+
+
+def _get_mongo_db_url() -> str:
+    mongo_db_url = os.getenv(MONGODB_URL_KEY)
+    if mongo_db_url is None:
+        raise Exception(f"Environment key: {MONGODB_URL_KEY} is not set.")
+    return mongo_db_url
+
+
+def _client_options(mongo_db_url: str, mongo_db_config: MongoDBConfig) -> dict:
+    '''
+    keyword arguments of pymongo.MongoClient and pymongo.AsyncMongoClient for mongo_db_config
+    '''
+    options = {"maxPoolSize": mongo_db_config.max_pool_size,
+               "minPoolSize": mongo_db_config.min_pool_size,
+               "maxIdleTimeMS": mongo_db_config.max_idle_time_ms,
+               "connectTimeoutMS": mongo_db_config.connect_timeout_ms,
+               "serverSelectionTimeoutMS": mongo_db_config.server_selection_timeout_ms,
+               "socketTimeoutMS": mongo_db_config.socket_timeout_ms,
+               "waitQueueTimeoutMS": mongo_db_config.wait_queue_timeout_ms,
+               "readPreference": mongo_db_config.read_preference}
+    # the certifi CA bundle for the TLS connections, e.g. of mongodb+srv urls. pymongo enables TLS when a CA
+    # file is given, so it is left out for a plain local mongod
+    url = mongo_db_url.lower()
+    if url.startswith("mongodb+srv://") or "tls=true" in url or "ssl=true" in url:
+        import certifi
+        options["tlsCAFile"] = certifi.where()
+    return options
 
-ca = certifi.where()
 
 class MongoDBClient:
     '''
     Class Name: MongoDBClient
-    Description: This method exports the dataframe from mongodb feature store as dataframe
+    Description: Connection manager of the mongodb feature store. The instances of a process share one
+                 pymongo client, and so one connection pool per server, created on the first connection with
+                 the pool size, timeouts and read preference of mongo_db_config. A client must not be used
+                 across fork, so a forked child creates a client of its own instead of reusing the one of its
+                 parent. A client assigned to MongoDBClient.client, e.g. a mongomock client, is used as is
 
     Output: Connection to Mongo Database and gets the data
     On Failure: raises an exception
     '''
 
-    client = None;
+    client = None
+    mongo_db_config = None
+    pool_metrics = None
+    # the client created by this class and the pid of the process it was created in
+    _owner = (None, None)
 
-    def __init__(self, database_name=DATABASE_NAME) -> None:
+    def __init__(self, database_name=DATABASE_NAME, mongo_db_config: Optional[MongoDBConfig] = None) -> None:
         try:
-            if MongoDBClient.client is None:
-                mongo_db_url = os.getenv(MONGODB_URL_KEY)
-                if mongo_db_url is None:
-                    raise Exception(f"Environment key: {MONGODB_URL_KEY} is not set.")
-                MongoDBClient.client = pymongo.MongoClient(mongo_db_url, tlsCAFile=ca)
-                
+            owner_pid, owner_client = MongoDBClient._owner
+            if MongoDBClient.client is None or (MongoDBClient.client is owner_client and owner_pid != os.getpid()):
+                mongo_db_url = _get_mongo_db_url()
+                # imported on the first connection, offline scoring never loads the driver
+                import pymongo
+                from us_visa.configuration.mongo_pool_metrics import MongoPoolMetrics
+
+                mongo_db_config = mongo_db_config or MongoDBConfig()
+                pool_metrics = MongoPoolMetrics()
+                MongoDBClient.client = pymongo.MongoClient(mongo_db_url, event_listeners=[pool_metrics],
+                                                           **_client_options(mongo_db_url, mongo_db_config))
+                MongoDBClient.mongo_db_config = mongo_db_config
+                MongoDBClient.pool_metrics = pool_metrics
+                MongoDBClient._owner = (os.getpid(), MongoDBClient.client)
+                logging.info(f"MongoDB client created with max pool size {mongo_db_config.max_pool_size} and "
+                             f"read preference {mongo_db_config.read_preference}")
+
             self.client = MongoDBClient.client
+            self.mongo_db_config = MongoDBClient.mongo_db_config or mongo_db_config or MongoDBConfig()
             self.database = self.client[database_name]
             self.database_name = database_name
             logging.info("MongoDB connection succesfull")
         except Exception as e:
             raise USvisaException(e, sys) from e
+
+    @classmethod
+    def get_pool_metrics(cls) -> dict:
+        '''
+        return connection pool counters of the client of this process, see MongoPoolMetrics.snapshot, empty
+        when no client was created by this class
+        '''
+        if cls.pool_metrics is None or cls._owner[0] != os.getpid():
+            return {}
+        return cls.pool_metrics.snapshot()
+
+    @classmethod
+    def close(cls) -> None:
+        '''
+        close the client created in this process, the next instance connects again, e.g. with another config
+        '''
+        try:
+            owner_pid, owner_client = cls._owner
+            if owner_client is not None and owner_pid == os.getpid():
+                owner_client.close()
+            if cls.client is owner_client:
+                cls.client = None
+            cls.mongo_db_config = None
+            cls.pool_metrics = None
+            cls._owner = (None, None)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+class AsyncMongoDBClient:
+    '''
+    Class Name: AsyncMongoDBClient
+    Description: asyncio variant of MongoDBClient on pymongo.AsyncMongoClient, to be created in a coroutine.
+                 The instances of a process and event loop share one client, a forked child or another event
+                 loop gets a client of its own. A client assigned to AsyncMongoDBClient.client is used as is
+
+    Output: Connection to Mongo Database
+    On Failure: raises an exception
+    '''
+
+    client = None
+    mongo_db_config = None
+    pool_metrics = None
+    # the client created by this class, the pid and the event loop it belongs to
+    _owner = (None, None, None)
+
+    def __init__(self, database_name=DATABASE_NAME, mongo_db_config: Optional[MongoDBConfig] = None) -> None:
+        try:
+            import asyncio
+
+            loop = asyncio.get_running_loop()
+            owner_pid, owner_loop, owner_client = AsyncMongoDBClient._owner
+            if AsyncMongoDBClient.client is None or (AsyncMongoDBClient.client is owner_client and
+                                                     (owner_pid, owner_loop) != (os.getpid(), loop)):
+                mongo_db_url = _get_mongo_db_url()
+                import pymongo
+                from us_visa.configuration.mongo_pool_metrics import MongoPoolMetrics
+
+                mongo_db_config = mongo_db_config or MongoDBConfig()
+                pool_metrics = MongoPoolMetrics()
+                AsyncMongoDBClient.client = pymongo.AsyncMongoClient(mongo_db_url, event_listeners=[pool_metrics],
+                                                                     **_client_options(mongo_db_url, mongo_db_config))
+                AsyncMongoDBClient.mongo_db_config = mongo_db_config
+                AsyncMongoDBClient.pool_metrics = pool_metrics
+                AsyncMongoDBClient._owner = (os.getpid(), loop, AsyncMongoDBClient.client)
+                logging.info(f"Async MongoDB client created with max pool size {mongo_db_config.max_pool_size} "
+                             f"and read preference {mongo_db_config.read_preference}")
+
+            self.client = AsyncMongoDBClient.client
+            self.mongo_db_config = AsyncMongoDBClient.mongo_db_config or mongo_db_config or MongoDBConfig()
+            self.database = self.client[database_name]
+            self.database_name = database_name
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    @classmethod
+    def get_pool_metrics(cls) -> dict:
+        '''
+        return connection pool counters of the async client of this process, see MongoPoolMetrics.snapshot
+        '''
+        if cls.pool_metrics is None or cls._owner[0] != os.getpid():
+            return {}
+        return cls.pool_metrics.snapshot()
+
+    @classmethod
+    async def close(cls) -> None:
+        '''
+        close the async client created in this process and event loop
+        '''
+        try:
+            import asyncio
+
+            owner_pid, owner_loop, owner_client = cls._owner
+            if owner_client is not None and (owner_pid, owner_loop) == (os.getpid(), asyncio.get_running_loop()):
+                await owner_client.close()
+            if cls.client is owner_client:
+                cls.client = None
+            cls.mongo_db_config = None
+            cls.pool_metrics = None
+            cls._owner = (None, None, None)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -0,0 +1,95 @@
+import threading
+
+from pymongo import monitoring
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    '''
+    Class Name: MongoPoolMetrics
+    Description: Connection pool listener of a pymongo client, counts the connections and the check outs of
+                 its pools. The events are published by the threads and coroutines using the client
+
+    Output: pool counters, see snapshot
+    '''
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.pools = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts = 0
+        self.checkout_failures = {}
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkout_wait_s = 0.0
+        self.max_checkout_wait_s = 0.0
+        self.pool_clears = 0
+
+    def snapshot(self) -> dict:
+        '''
+        return dict of the counters, open_connections are the connections created and not yet closed and
+        checked_out the ones in use right now
+        '''
+        with self._lock:
+            return {"pools": self.pools,
+                    "open_connections": self.connections_created - self.connections_closed,
+                    "connections_created": self.connections_created,
+                    "connections_closed": self.connections_closed,
+                    "checked_out": self.checked_out,
+                    "max_checked_out": self.max_checked_out,
+                    "checkouts": self.checkouts,
+                    "checkout_failures": dict(self.checkout_failures),
+                    "mean_checkout_wait_ms": 1000 * self.checkout_wait_s / self.checkouts if self.checkouts else 0.0,
+                    "max_checkout_wait_ms": 1000 * self.max_checkout_wait_s,
+                    "pool_clears": self.pool_clears}
+
+    def _waited(self, event) -> None:
+        # duration is published by pymongo 4.7 and later
+        duration = getattr(event, "duration", None) or 0.0
+        self.checkout_wait_s += duration
+        self.max_checkout_wait_s = max(self.max_checkout_wait_s, duration)
+
+    def pool_created(self, event) -> None:
+        with self._lock:
+            self.pools += 1
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event) -> None:
+        with self._lock:
+            self.pools -= 1
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def connection_check_out_failed(self, event) -> None:
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+            self._waited(event)
+
+    def connection_checked_out(self, event) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self._waited(event)
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            self.checked_out -= 1
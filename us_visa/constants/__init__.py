@@ -18,9 +18,59 @@ MODEL_FILE_NAME = "model.pkl"
 TARGET_COLUMN = "case_status"
 CURRENT_YEAR = date.today().year
 PREPROCESSING_OBJECT_FILE_NAME = "preprocessing.pkl"
+COMPILED_PREPROCESSING_OBJECT_FILE_NAME = "preprocessing_compiled.pkl"
 SCHEMA_FILE_PATH = os.path.join("config", "schema.yaml")
 
 
+"""
+Logging related constants
+"""
+LOG_DIR: str = "logs"
+# environment variable overriding LOG_LEVEL, e.g. DEBUG to also log the utility calls
+LOG_LEVEL_KEY = "LOG_LEVEL"
+LOG_LEVEL: str = "INFO"
+# json or text
+LOG_FORMAT: str = "json"
+
+
+"""
+Serialization related constants
+"""
+# pickle or dill, objects pickle cannot serialize fall back to dill
+SERIALIZATION_SERIALIZER: str = "pickle"
+# None, zlib, lz4 or zstd. Compressed objects are smaller but decompressed on load instead of memory-mapped
+SERIALIZATION_COMPRESSION = None
+
+
+"""
+MongoDB connection related constants
+"""
+# environment variables overriding the defaults below, "none" unsets a timeout
+MONGODB_MAX_POOL_SIZE_KEY = "MONGODB_MAX_POOL_SIZE"
+MONGODB_MIN_POOL_SIZE_KEY = "MONGODB_MIN_POOL_SIZE"
+MONGODB_MAX_IDLE_TIME_MS_KEY = "MONGODB_MAX_IDLE_TIME_MS"
+MONGODB_CONNECT_TIMEOUT_MS_KEY = "MONGODB_CONNECT_TIMEOUT_MS"
+MONGODB_SERVER_SELECTION_TIMEOUT_MS_KEY = "MONGODB_SERVER_SELECTION_TIMEOUT_MS"
+MONGODB_SOCKET_TIMEOUT_MS_KEY = "MONGODB_SOCKET_TIMEOUT_MS"
+MONGODB_WAIT_QUEUE_TIMEOUT_MS_KEY = "MONGODB_WAIT_QUEUE_TIMEOUT_MS"
+MONGODB_READ_PREFERENCE_KEY = "MONGODB_READ_PREFERENCE"
+MONGODB_BATCH_SIZE_KEY = "MONGODB_BATCH_SIZE"
+# connections per server and process, every worker process has a pool of its own
+MONGODB_MAX_POOL_SIZE: int = 100
+MONGODB_MIN_POOL_SIZE: int = 0
+MONGODB_MAX_IDLE_TIME_MS: int = 300000
+MONGODB_CONNECT_TIMEOUT_MS: int = 10000
+MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+# None waits for the server as long as a streaming export takes
+MONGODB_SOCKET_TIMEOUT_MS = None
+# time a thread or coroutine waits for a free connection of a full pool
+MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 30000
+# primary, primaryPreferred, secondary, secondaryPreferred or nearest
+MONGODB_READ_PREFERENCE: str = "primary"
+# documents per cursor batch
+MONGODB_BATCH_SIZE: int = 10000
+
+
 """
 Data Ingestion related constants
 """
@@ -30,6 +80,22 @@ DATA_INGESTION_DIR_NAME: str = "data_ingestion"
 DATA_INGESTION_FEATURE_STORE_DIR: str = "feature_store"
 DATA_INGESTION_INGESTED_DIR: str = "ingested"
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO: float = 0.2
+DATA_INGESTION_ARTIFACT_FORMAT: str = "parquet"
+DATA_INGESTION_STREAMING_EXPORT: bool = False
+DATA_INGESTION_BATCH_SIZE: int = 10000
+DATA_INGESTION_INCREMENTAL: bool = False
+DATA_INGESTION_WATERMARK_FIELD: str = "_id"
+DATA_INGESTION_WATERMARK_FILE_NAME: str = "watermark.yaml"
+DATA_INGESTION_DEDUP_COLUMN: str = "case_id"
+DATA_INGESTION_MAX_FEATURE_STORE_PARTS: int = 20
+DATA_INGESTION_IN_MEMORY_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+# stages reading the train and test sets: data validation and data transformation
+DATA_INGESTION_IN_MEMORY_CONSUMERS: int = 2
+# compiles the schema driven preprocessing into a mongodb aggregation pipeline, so only the projected fields
+# with the derived company_age are transferred. Not supported by the incremental ingestion
+DATA_INGESTION_PUSHDOWN: bool = False
+# None or a $match filter on the stored documents run first by the pushdown, e.g. {"case_status": {"$ne": "na"}}
+DATA_INGESTION_PUSHDOWN_MATCH = None
 
 
 """
@@ -38,6 +104,14 @@ Data Validation related constants
 DATA_VALIDATION_DIR_NAME: str = "data_validation"
 # DATA_VALIDATION_DRIFT_REPORT_DIR: str = "drift_report"
 DATA_VALIDATION_DRIFT_REPORT_FILENAME: str = "report.yaml"
+DATA_VALIDATION_CHUNK_SIZE: int = 100000
+DATA_VALIDATION_MAX_NULL_RATE: float = 0.0
+DATA_VALIDATION_MAX_OUT_OF_RANGE_RATE: float = 0.01
+DATA_VALIDATION_MAX_OUT_OF_DOMAIN_RATE: float = 0.0
+DATA_VALIDATION_DRIFT_SKETCH_FILE_NAME: str = "drift_sketch.yaml"
+DATA_VALIDATION_DRIFT_REFERENCE_DIR: str = "drift_reference"
+DATA_VALIDATION_DRIFT_PSI_THRESHOLD: float = 0.2
+DATA_VALIDATION_FAIL_ON_DRIFT: bool = True
 
 
 """
@@ -46,4 +120,114 @@ Data Transformation related constants
 DATA_TARNSFORMATION_DIR_NAME: str = "data_transformation"
 DATA_TRANSFORMATION_TRANSFORMED_DIR: str = "transformed"
 DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
+DATA_TRANSFORMATION_ARRAY_DTYPE: str = "float32"
+# keeps the one-hot columns sparse: CSR features through resampling, stored as .npz
+DATA_TRANSFORMATION_SPARSE_OUTPUT: bool = False
+DATA_TRANSFORMATION_PARITY_SAMPLE_SIZE: int = 1000
+DATA_TRANSFORMATION_PARITY_TOLERANCE: float = 1e-9
+# smoteenn, parallel_knn, chunked_enn, approximate_knn, class_weight or none
+DATA_TRANSFORMATION_RESAMPLING_STRATEGY: str = "chunked_enn"
+DATA_TRANSFORMATION_RESAMPLING_N_JOBS: int = -1
+# auto, ball_tree, kd_tree or brute
+DATA_TRANSFORMATION_RESAMPLING_KNN_ALGORITHM: str = "auto"
+DATA_TRANSFORMATION_RESAMPLING_CHUNK_SIZE: int = 100000
+DATA_TRANSFORMATION_RESAMPLING_PARTITION_SIZE: int = 20000
+# fits the preprocessor in a streaming pass and transforms chunk by chunk into the on-disk arrays, for training
+# data larger than memory. Only the class_weight and none resampling strategies keep the memory bounded
+DATA_TRANSFORMATION_OUT_OF_CORE: bool = False
+DATA_TRANSFORMATION_CHUNK_SIZE: int = 100000
+# rows sampled for the Yeo-Johnson lambdas of the out-of-core fit
+DATA_TRANSFORMATION_RESERVOIR_SIZE: int = 100000
+
+
+"""
+MODEL TRAINER related constant start with MODEL_TRAINER var name
+"""
+MODEL_TRAINER_DIR_NAME: str = "model_trainer"
+MODEL_TRAINER_TRAINED_MODEL_DIR: str = "trained_model"
+MODEL_TRAINER_TRAINED_MODEL_NAME: str = "model.pkl"
+MODEL_TRAINER_EXPECTED_SCORE: float = 0.6
+MODEL_TRAINER_MODEL_CONFIG_FILE_PATH: str = os.path.join("config", "model.yaml")
+MODEL_TRAINER_SEARCH_REPORT_FILE_NAME: str = "search_report.yaml"
+MODEL_TRAINER_N_WORKERS: int = os.cpu_count() or 1
+MODEL_TRAINER_TIME_BUDGET_SECONDS: float = 3600
+
 
+"""
+MODEL EVALUATION related constants
+"""
+MODEL_EVALUATION_DIR_NAME: str = "model_evaluation"
+MODEL_EVALUATION_REPORT_FILE_NAME: str = "report.yaml"
+MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE: float = 0.02
+MODEL_EVALUATION_N_BOOTSTRAP: int = 2000
+MODEL_EVALUATION_CONFIDENCE_LEVEL: float = 0.95
+# bootstrap replicates are drawn in blocks of at most this many resampled rows
+MODEL_EVALUATION_MAX_BLOCK_ELEMENTS: int = 10_000_000
+
+
+"""
+Model registry related constants
+"""
+# local or s3, read from the environment
+MODEL_REGISTRY_BACKEND_KEY = "MODEL_REGISTRY_BACKEND"
+MODEL_REGISTRY_DEFAULT_BACKEND: str = "local"
+MODEL_REGISTRY_DIR: str = "saved_models"
+MODEL_REGISTRY_VERSIONS_DIR: str = "versions"
+MODEL_REGISTRY_CURRENT_FILE_NAME: str = "CURRENT"
+MODEL_REGISTRY_MANIFEST_FILE_NAME: str = "manifest.yaml"
+# local copies of the versions downloaded from a remote registry
+MODEL_REGISTRY_CACHE_DIR: str = os.path.join(MODEL_REGISTRY_DIR, "cache")
+MODEL_BUCKET_NAME: str = "usvisa-model-registry"
+MODEL_REGISTRY_S3_PREFIX: str = "model-registry"
+# endpoint of an S3 compatible store, e.g. a local MinIO, unset for AWS
+AWS_ENDPOINT_URL_KEY = "AWS_ENDPOINT_URL"
+REGION_NAME: str = "us-east-1"
+
+
+"""
+Stage cache related constants
+"""
+STAGE_CACHE_DIR_NAME: str = "stage_cache"
+STAGE_CACHE_MANIFEST_FILE_NAME: str = "manifest.yaml"
+STAGE_CACHE_MAX_SIZE_BYTES: int = 5 * 1024 ** 3
+STAGE_CACHE_MAX_AGE_DAYS: int = 7
+
+
+"""
+Pipeline executor related constants
+"""
+PIPELINE_STATE_DIR_NAME: str = "pipeline_state"
+PIPELINE_MAX_WORKERS: int = 4
+
+
+"""
+Instrumentation related constants
+"""
+METRICS_FILE_NAME: str = "metrics.json"
+PROFILE_DIR_NAME: str = "profile"
+# None, cprofile or pyinstrument, profiles every stage of the training pipeline
+INSTRUMENTATION_PROFILER = None
+# traces the python allocations for the tracemalloc peak of every stage, slows the pipeline down
+INSTRUMENTATION_TRACE_MEMORY: bool = False
+
+
+"""
+Batch prediction related constants
+"""
+BATCH_PREDICTION_CHUNK_SIZE: int = 50000
+BATCH_PREDICTION_N_WORKERS: int = os.cpu_count() or 1
+# chunks submitted to the process pool and not yet written, per worker
+BATCH_PREDICTION_MAX_PENDING_CHUNKS: int = 2
+BATCH_PREDICTION_ID_COLUMN: str = "case_id"
+
+
+"""
+Prediction service related constants
+"""
+APP_HOST: str = "0.0.0.0"
+APP_PORT: int = 8080
+PREDICTION_SERVICE_MAX_BATCH_SIZE: int = 64
+PREDICTION_SERVICE_MAX_WAIT_MS: float = 2.0
+PREDICTION_SERVICE_LATENCY_WINDOW: int = 10000
+PREDICTION_SERVICE_WARMUP_ROUNDS: int = 20
+PREDICTION_SERVICE_REGISTRY_POLL_SECONDS: float = 5.0
@@ -0,0 +1,88 @@
+import sys
+from typing import Optional
+
+from box import Box
+
+from us_visa.constants import CURRENT_YEAR
+from us_visa.exception import USvisaException
+from us_visa.utils.main_utils import get_column_dtypes
+
+# company_age is derived from yr_of_estab, as prepare_input_features does on the client
+SOURCE_COLUMN = "yr_of_estab"
+DERIVED_COLUMN = "company_age"
+
+
+def _normalized_field(col: str, numeric: bool) -> dict:
+    '''
+    aggregation expression of a field with the nulls normalized the way the client side export does, the field
+    is null, and not missing, in every output document
+    '''
+    not_na = {"$cond": [{"$eq": [f"${col}", "na"]}, None, {"$ifNull": [f"${col}", None]}]}
+    if numeric:
+        # numeric strings are parsed and the other values are null, as pd.to_numeric(errors="coerce") does on
+        # the client. The client casts the doubles to the dtype of the schema
+        return {"$convert": {"input": not_na, "to": "double", "onError": None, "onNull": None}}
+    return not_na
+
+
+def compile_ingestion_pipeline(schema_config: Box, match: Optional[dict] = None) -> list:
+    '''
+    compile the schema driven preprocessing into a mongodb aggregation pipeline: the optional $match filter,
+    a $project of the schema columns but the drop_columns, with "na" normalized to null and without _id, and
+    the $addFields of company_age
+    schema_config: schema.yaml content
+    match: $match filter on the stored documents, run first so it can use the indexes of the collection
+    return list of the pipeline stages, the documents have the columns of get_pushdown_schema in its order
+    '''
+    try:
+        column_dtypes = get_column_dtypes(schema_config)
+        drop_cols = schema_config.drop_columns
+        pipeline = [{"$match": match}] if match else []
+
+        projection = {"_id": 0}
+        for col, dtype in column_dtypes.items():
+            if col not in drop_cols or col == SOURCE_COLUMN:
+                projection[col] = _normalized_field(col, dtype != "category")
+        pipeline.append({"$project": projection})
+        # $subtract of a null year is null
+        pipeline.append({"$addFields": {DERIVED_COLUMN: {"$subtract": [CURRENT_YEAR, f"${SOURCE_COLUMN}"]}}})
+        if SOURCE_COLUMN in drop_cols:
+            pipeline.append({"$project": {SOURCE_COLUMN: 0}})
+        return pipeline
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+def get_pushdown_schema(schema_config: Box) -> Box:
+    '''
+    schema of the data exported by compile_ingestion_pipeline: the drop_columns are gone and company_age is a
+    numerical column of the dtype of yr_of_estab, with the ranges of yr_of_estab carried over to it. There is
+    nothing left to drop, and the validation rules of the dropped columns no longer apply
+    schema_config: schema.yaml content
+    '''
+    try:
+        column_dtypes = get_column_dtypes(schema_config)
+        drop_cols = set(schema_config.drop_columns)
+        content = schema_config.to_dict()
+
+        content["columns"] = ([{col: dtype} for col, dtype in column_dtypes.items() if col not in drop_cols] +
+                              [{DERIVED_COLUMN: column_dtypes[SOURCE_COLUMN]}])
+        content["numerical_columns"] = ([col for col in schema_config.numerical_columns if col not in drop_cols] +
+                                        [DERIVED_COLUMN])
+        content["categorical_columns"] = [col for col in schema_config.categorical_columns if col not in drop_cols]
+        content["drop_columns"] = []
+        content["unique_columns"] = [col for col in schema_config.get("unique_columns", []) if col not in drop_cols]
+        content["domains"] = {col: values for col, values in schema_config.get("domains", {}).items()
+                              if col not in drop_cols}
+
+        ranges = {col: bounds for col, bounds in schema_config.get("ranges", {}).items() if col not in drop_cols}
+        source_bounds = schema_config.get("ranges", {}).get(SOURCE_COLUMN, {})
+        # the earliest year of establishment bounds the age from above, and the latest from below
+        derived_bounds = {bound: CURRENT_YEAR - source_bounds[source_bound]
+                          for bound, source_bound in (("max", "min"), ("min", "max")) if source_bound in source_bounds}
+        if derived_bounds:
+            ranges[DERIVED_COLUMN] = derived_bounds
+        content["ranges"] = ranges
+        return Box(content)
+    except Exception as e:
+        raise USvisaException(e, sys) from e
@@ -0,0 +1,127 @@
+import sys
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+# category frequencies and certification log-odds effects of the EasyVisa data, the effects are the log-odds of
+# the certification rate of the category relative to the overall rate
+CATEGORIES = {
+    "continent": {"Asia": (0.662, -0.08), "Europe": (0.146, 0.62), "North America": (0.129, -0.21),
+                  "South America": (0.033, -0.38), "Africa": (0.022, 0.24), "Oceania": (0.008, -0.12)},
+    "education_of_employee": {"Bachelor's": (0.402, -0.21), "Master's": (0.378, 0.62), "High School": (0.134, -1.36),
+                              "Doctorate": (0.086, 1.2)},
+    "has_job_experience": {"Y": (0.581, 0.35), "N": (0.419, -0.46)},
+    "requires_job_training": {"N": (0.884, 0.0), "Y": (0.116, 0.0)},
+    "region_of_employment": {"Northeast": (0.282, -0.17), "South": (0.275, 0.15), "West": (0.258, -0.21),
+                             "Midwest": (0.169, 0.45), "Island": (0.016, -0.29)},
+    "unit_of_wage": {"Year": (0.901, 0.15), "Hour": (0.085, -1.32), "Week": (0.011, -0.21), "Month": (0.003, -0.21)},
+    "full_time_position": {"Y": (0.894, 0.0), "N": (0.106, 0.02)},
+}
+# median and log-scale spread of the prevailing wage per unit of wage
+WAGES = {"Year": (82000, 0.45), "Hour": (95, 0.9), "Week": (1600, 0.5), "Month": (7000, 0.5)}
+LAST_YEAR_OF_ESTAB = 2016
+CERTIFIED_RATE = 0.668
+
+
+def _generate_features(rng: np.random.Generator, start: int, n_rows: int) -> tuple:
+    # feature columns and certification log-odds of the rows, without the intercept
+    columns = {"case_id": np.char.add("EZYV", np.arange(start + 1, start + n_rows + 1).astype(str))}
+    logit = np.zeros(n_rows)
+    for column, categories in CATEGORIES.items():
+        names = np.array(list(categories))
+        frequencies, effects = (np.array(values) for values in zip(*categories.values()))
+        codes = rng.choice(len(names), size=n_rows, p=frequencies / frequencies.sum())
+        columns[column] = names[codes]
+        logit += effects[codes]
+
+    no_of_employees = np.clip(np.round(rng.lognormal(np.log(2100), 1.2, n_rows)), 11, 602069).astype(np.int64)
+    company_age = np.clip(np.round(rng.lognormal(np.log(19), 0.9, n_rows)), 0, LAST_YEAR_OF_ESTAB - 1800)
+    prevailing_wage, median_wage = np.empty(n_rows), np.empty(n_rows)
+    for unit, (median, sigma) in WAGES.items():
+        mask = columns["unit_of_wage"] == unit
+        prevailing_wage[mask] = rng.lognormal(np.log(median), sigma, mask.sum())
+        median_wage[mask] = median
+    # larger companies and higher wages for the unit of wage are certified more often
+    logit += 0.15 * np.log(no_of_employees / 2100) + 0.2 * np.log(prevailing_wage / median_wage)
+
+    return columns, no_of_employees, company_age, prevailing_wage, logit
+
+
+def _generate_chunk(rng: np.random.Generator, start: int, n_rows: int, intercept: float) -> pd.DataFrame:
+    columns, no_of_employees, company_age, prevailing_wage, logit = _generate_features(rng, start, n_rows)
+    certified = rng.random(n_rows) < 1 / (1 + np.exp(-(logit + intercept)))
+    return pd.DataFrame({
+        "case_id": columns["case_id"],
+        "continent": columns["continent"],
+        "education_of_employee": columns["education_of_employee"],
+        "has_job_experience": columns["has_job_experience"],
+        "requires_job_training": columns["requires_job_training"],
+        "no_of_employees": no_of_employees,
+        "yr_of_estab": (LAST_YEAR_OF_ESTAB - company_age).astype(np.int64),
+        "region_of_employment": columns["region_of_employment"],
+        "prevailing_wage": np.round(prevailing_wage, 2),
+        "unit_of_wage": columns["unit_of_wage"],
+        "full_time_position": columns["full_time_position"],
+        "case_status": np.where(certified, "Certified", "Denied"),
+    })
+
+
+def _calibrate_intercept(certified_rate: float, n_rows: int = 200000) -> float:
+    # bisection of the intercept on the expected rate of a fixed sample, so the rate does not depend on the size
+    # or the seed of the data
+    logit = _generate_features(np.random.default_rng(0), 0, n_rows)[-1]
+    low, high = -5.0, 5.0
+    for _ in range(30):
+        intercept = (low + high) / 2
+        rate = np.mean(1 / (1 + np.exp(-(logit + intercept))))
+        low, high = (low, intercept) if rate > certified_rate else (intercept, high)
+    return (low + high) / 2
+
+
+def iter_usvisa_chunks(n_rows: int, chunk_size: int = 100000, random_state: int = 42,
+                       certified_rate: float = CERTIFIED_RATE) -> Iterator[pd.DataFrame]:
+    '''
+    generate EasyVisa shaped data matching config/schema.yaml, as pandas DataFrames of at most chunk_size rows
+    n_rows: total number of rows, the case_id values EZYV1 to EZYV<n_rows> are unique
+    certified_rate: share of Certified case_status, the certification odds depend on the features
+    The data is the same for the same n_rows, chunk_size and random_state
+    '''
+    try:
+        intercept = _calibrate_intercept(certified_rate)
+        rng = np.random.default_rng(random_state)
+        for start in range(0, n_rows, chunk_size):
+            yield _generate_chunk(rng, start, min(chunk_size, n_rows - start), intercept)
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+def generate_usvisa_data(n_rows: int, chunk_size: int = 100000, random_state: int = 42,
+                         certified_rate: float = CERTIFIED_RATE) -> pd.DataFrame:
+    '''
+    generate EasyVisa shaped data as one pandas DataFrame, see iter_usvisa_chunks
+    '''
+    return pd.concat(iter_usvisa_chunks(n_rows, chunk_size, random_state, certified_rate), ignore_index=True)
+
+
+def load_into_collection(collection, n_rows: int, chunk_size: int = 50000, random_state: int = 42,
+                         certified_rate: float = CERTIFIED_RATE) -> int:
+    '''
+    insert generated documents into a pymongo or mongomock collection, chunk by chunk
+    collection: collection the documents are inserted into, e.g. MongoDBClient().database[COLLECTION_NAME]
+    return number of inserted documents
+    '''
+    try:
+        n_inserted = 0
+        for chunk in iter_usvisa_chunks(n_rows, chunk_size, random_state, certified_rate):
+            collection.insert_many(chunk.to_dict(orient="records"), ordered=False)
+            n_inserted += len(chunk)
+            logging.debug(f"Inserted {n_inserted} of {n_rows} synthetic documents")
+        logging.info(f"Inserted {n_inserted} synthetic documents into {collection.name}",
+                     extra={"stage": "synthetic_data", "n_rows": n_inserted})
+        return n_inserted
+    except Exception as e:
+        raise USvisaException(e, sys) from e
@@ -2,12 +2,15 @@ import os
 import sys
 
 from us_visa.configuration.mongo_db_connection import MongoDBClient
-from us_visa.constants import DATABASE_NAME
+from us_visa.constants import DATABASE_NAME, SCHEMA_FILE_PATH, DATA_INGESTION_BATCH_SIZE
+from us_visa.entity.config_entity import MongoDBConfig
 from us_visa.exception import USvisaException
+from us_visa.utils.main_utils import read_yaml, get_column_dtypes, cast_to_schema_dtypes
+from us_visa.utils.instrumentation import instrument_io
 
 import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Iterator, Optional
 
 
 class USvisaData:
@@ -15,26 +18,167 @@ class USvisaData:
     This class help to export entire mongo db record as pandas dataframe
     '''
 
-    def __init__(self):
+    def __init__(self, mongo_db_config: Optional[MongoDBConfig]=None):
         try:
-            self.mongo_client = MongoDBClient(database_name=DATABASE_NAME)
+            self.mongo_client = MongoDBClient(database_name=DATABASE_NAME, mongo_db_config=mongo_db_config)
+            self._schema_config = read_yaml(SCHEMA_FILE_PATH)
         except Exception as e:
             raise USvisaException(e, sys) from e
-        
-    
+
+
+    def _get_collection(self, collection_name: str, database_name: Optional[str]=None):
+        if database_name is None:
+            return self.mongo_client.database[collection_name]
+        return self.mongo_client.client[database_name][collection_name]
+
+
+    def get_collection_fingerprint(self, collection_name: str, database_name: Optional[str]=None) -> dict:
+        """
+        Method Name: get_collection_fingerprint
+        Description: Returns a cheap fingerprint of the collection, its estimated document count and
+                     its newest _id. In-place updates of existing documents are not reflected
+
+        Output: dict with count and last_id
+        On Failure: Raise an exception
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            last_document = collection.find_one({}, projection={"_id": 1}, sort=[("_id", -1)])
+            return {"count": collection.estimated_document_count(),
+                    "last_id": None if last_document is None else str(last_document["_id"])}
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    @instrument_io("read", file_path_arg=None)
     def export_collection_as_dataframe(self, collection_name: str, database_name: Optional[str]=None) -> pd.DataFrame:
         try:
-            if database_name is None:
-                collection = self.mongo_client.database[collection_name]
-            else:
-                collection = self.mongo_client[database_name][collection_name]
-        
-            df = pd.DataFrame(list(collection.find()))
+            collection = self._get_collection(collection_name, database_name)
+
+            df = pd.DataFrame(list(collection.find(batch_size=self.mongo_client.mongo_db_config.batch_size)))
 
             if "_id" in df.columns.to_list():
-                df = df.drop(columns=['_id'], axis=1)
+                df = df.drop(columns=['_id'])
             df.replace("na", np.nan, inplace=True)
-            return df
-        
+            return cast_to_schema_dtypes(df, get_column_dtypes(self._schema_config))
+
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _build_chunk(self, documents: list, column_dtypes: dict) -> pd.DataFrame:
+        """
+        Method Name: _build_chunk
+        Description: Builds a typed dataframe from a batch of documents, one column at a time
+
+        Output: Returns the dataframe for the batch
+        """
+        columns = list(dict.fromkeys(key for document in documents for key in document))
+        data = {}
+        for col in columns:
+            values = pd.Series([document.get(col) for document in documents], dtype=object)
+            data[col] = values.where(values != "na", np.nan)
+
+        return cast_to_schema_dtypes(pd.DataFrame(data), column_dtypes)
+
+
+    @staticmethod
+    def _build_projected_chunk(documents: list, column_dtypes: dict) -> pd.DataFrame:
+        """
+        Method Name: _build_projected_chunk
+        Description: Builds a typed dataframe from a batch of aggregation pipeline documents. The pipeline
+                     already shaped the fields and normalized the nulls, so the documents are read as records
+
+        Output: Returns the dataframe for the batch
+        """
+        return cast_to_schema_dtypes(pd.DataFrame.from_records(documents, columns=list(column_dtypes)), column_dtypes)
+
+
+    @instrument_io("read", file_path_arg=None)
+    def export_pipeline_as_dataframe(self, collection_name: str, pipeline: list, column_dtypes: dict,
+                                     database_name: Optional[str]=None) -> pd.DataFrame:
+        """
+        Method Name: export_pipeline_as_dataframe
+        Description: Runs the aggregation pipeline on the collection and returns its output, see
+                     compile_ingestion_pipeline, typed with column_dtypes
+
+        Output: pandas dataframe with the column_dtypes columns
+        On Failure: Raise an exception
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            documents = list(collection.aggregate(pipeline, batchSize=self.mongo_client.mongo_db_config.batch_size))
+            return self._build_projected_chunk(documents, column_dtypes)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    @instrument_io("read", file_path_arg=None)
+    def export_pipeline_in_chunks(self, collection_name: str, pipeline: list, column_dtypes: dict,
+                                  database_name: Optional[str]=None,
+                                  batch_size: int=DATA_INGESTION_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Method Name: export_pipeline_in_chunks
+        Description: Streams the output of the aggregation pipeline as dataframes of at most batch_size rows,
+                     typed with column_dtypes
+
+        Output: Generator of pandas dataframes
+        On Failure: Raise an exception
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            documents = []
+            for document in collection.aggregate(pipeline, batchSize=batch_size):
+                documents.append(document)
+                if len(documents) == batch_size:
+                    yield self._build_projected_chunk(documents, column_dtypes)
+                    documents = []
+
+            if len(documents) > 0:
+                yield self._build_projected_chunk(documents, column_dtypes)
+
         except Exception as e:
-            raise USvisaException(e, sys) from e
\ No newline at end of file
+            raise USvisaException(e, sys) from e
+
+
+    @instrument_io("read", file_path_arg=None)
+    def export_collection_in_chunks(self, collection_name: str, database_name: Optional[str]=None,
+                                    batch_size: int=DATA_INGESTION_BATCH_SIZE,
+                                    watermark_field: Optional[str]=None, watermark: object=None) -> Iterator[pd.DataFrame]:
+        """
+        Method Name: export_collection_in_chunks
+        Description: Streams the collection as dataframes of at most batch_size rows. The _id field is
+                     excluded on the server and the columns are typed with the dtypes from schema.yaml.
+                     When watermark_field is given, only documents with watermark_field > watermark are
+                     read, in ascending watermark order, and the watermark field is kept in the output
+
+        Output: Generator of pandas dataframes
+        On Failure: Raise an exception
+        """
+        try:
+            collection = self._get_collection(collection_name, database_name)
+            column_dtypes = get_column_dtypes(self._schema_config)
+
+            query = {}
+            projection = {"_id": 0}
+            if watermark_field is not None:
+                if watermark is not None:
+                    query = {watermark_field: {"$gt": watermark}}
+                if watermark_field == "_id":
+                    projection = None
+
+            cursor = collection.find(query, projection=projection, batch_size=batch_size)
+            if watermark_field is not None:
+                cursor = cursor.sort(watermark_field, 1)
+            documents = []
+            for document in cursor:
+                documents.append(document)
+                if len(documents) == batch_size:
+                    yield self._build_chunk(documents, column_dtypes)
+                    documents = []
+
+            if len(documents) > 0:
+                yield self._build_chunk(documents, column_dtypes)
+
+        except Exception as e:
+            raise USvisaException(e, sys) from e
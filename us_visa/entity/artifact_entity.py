@@ -1,17 +1,68 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
+from typing import Optional
+
+from us_visa.entity.data_handle import DataFrameHandle
+
+
+def transient_field():
+    # in-memory only, not persisted by artifact_to_dict
+    return field(default=None, repr=False, compare=False, metadata={"transient": True})
+
+
+def artifact_to_dict(artifact) -> dict:
+    return {f.name: getattr(artifact, f.name) for f in fields(artifact) if not f.metadata.get("transient")}
+
 
 @dataclass
 class DataIngestionArtifact:
     train_file_path: str
     test_file_path: str
+    # the files hold the pushed down columns, see get_pushdown_schema
+    pushdown: bool = False
+    train_data: Optional[DataFrameHandle] = transient_field()
+    test_data: Optional[DataFrameHandle] = transient_field()
 
 @dataclass
 class DataValidationArtifact:
     validation_status: bool
     message: str
+    report_file_path: str
+    drift_sketch_file_path: str
 
 @dataclass
 class DataTransformationArtifact:
     transformed_object_file_path: str
     transformed_train_file_path: str
     transformed_test_file_path: str
+    transformed_train_target_file_path: str
+    transformed_test_target_file_path: str
+    # None when the preprocessor could not be compiled
+    compiled_object_file_path: Optional[str] = None
+    # None unless the class_weight resampling strategy is used
+    transformed_train_sample_weight_file_path: Optional[str] = None
+
+@dataclass
+class ModelTrainerArtifact:
+    trained_model_file_path: str
+    search_report_file_path: str
+    best_model_name: str
+    f1_score: float
+    precision_score: float
+    recall_score: float
+
+@dataclass
+class ModelEvaluationArtifact:
+    is_model_accepted: bool
+    changed_accuracy: float
+    trained_model_path: str
+    # None when no model is in production yet
+    production_model_path: Optional[str]
+    report_file_path: str
+
+
+@dataclass
+class ModelPusherArtifact:
+    is_model_pushed: bool
+    # current version of the registry after the push, None when the registry is still empty
+    model_version: Optional[str]
+    registry_uri: str
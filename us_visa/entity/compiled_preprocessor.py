@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import sys
+from collections.abc import Mapping
+from itertools import repeat
+from operator import itemgetter
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from us_visa.exception import USvisaException
+
+# scikit-learn is only needed to compile, a CompiledPreprocessor is loaded and applied without it
+if TYPE_CHECKING:
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import StandardScaler
+
+
+def _yeo_johnson(x: np.ndarray, lmbda: float) -> np.ndarray:
+    # same operations as scipy.stats.yeojohnson, which PowerTransformer calls, so results are identical
+    eps = np.finfo(np.float64).eps
+    out = np.zeros_like(x)
+    pos = x >= 0
+    if abs(lmbda) < eps:
+        out[pos] = np.log1p(x[pos])
+    else:
+        out[pos] = np.expm1(lmbda * np.log1p(x[pos])) / lmbda
+    if abs(lmbda - 2) > eps:
+        out[~pos] = -np.expm1((2 - lmbda) * np.log1p(-x[~pos])) / (2 - lmbda)
+    else:
+        out[~pos] = -np.log1p(-x[~pos])
+    return out
+
+
+def _scaler_parameters(scaler: StandardScaler, n_columns: int) -> tuple:
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_columns)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_columns)
+    return mean, scale
+
+
+class CompiledPreprocessor:
+    '''
+    Class Name: CompiledPreprocessor
+    Description: NumPy only equivalent of the fitted preprocessor of DataTransformation, built by
+                 compile_preprocessor. Categorical columns are encoded with dict lookup tables, the
+                 Yeo-Johnson columns with the fitted lambdas, and every standardization (the one of
+                 PowerTransformer and the StandardScaler) is applied as a single shift and scale of
+                 the numerical block. Input is a dict (one record or column -> values), a list of
+                 dicts, a NumPy record array or a dataframe
+    '''
+
+    def __init__(self, feature_names_in: list, n_features_out: int, one_hot: list, ordinal: list,
+                 numeric_columns: list, numeric_positions: np.ndarray, lambdas: np.ndarray,
+                 mean: np.ndarray, scale: np.ndarray):
+        self.feature_names_in = feature_names_in
+        self.n_features_out = n_features_out
+        # (column, value -> output position, handle_unknown)
+        self.one_hot = one_hot
+        # (column, value -> code, output position, unknown_value or None)
+        self.ordinal = ordinal
+        self.numeric_columns = numeric_columns
+        self.numeric_positions = numeric_positions
+        # nan where the column is not Yeo-Johnson transformed
+        self.lambdas = lambdas
+        self.mean = mean
+        self.scale = scale
+        self.required_columns = list(dict.fromkeys(
+            [col for col, *_ in one_hot] + [col for col, *_ in ordinal] + numeric_columns))
+
+
+    def _to_columns(self, data) -> tuple:
+        if isinstance(data, np.ndarray) and data.dtype.names is not None:
+            missing = [col for col in self.required_columns if col not in data.dtype.names]
+            columns = None if missing else {col: data[col].reshape(-1) for col in self.required_columns}
+        elif hasattr(data, "columns"):
+            missing = [col for col in self.required_columns if col not in data.columns]
+            columns = None if missing else {col: data[col].to_numpy() for col in self.required_columns}
+        elif isinstance(data, Mapping):
+            missing = [col for col in self.required_columns if col not in data]
+            if missing:
+                columns = None
+            elif np.ndim(data[self.required_columns[0]]) == 0:
+                columns = {col: [data[col]] for col in self.required_columns}
+            else:
+                columns = {col: data[col] for col in self.required_columns}
+        else:
+            records = list(data)
+            missing = [col for col in self.required_columns if records and col not in records[0]]
+            columns = None if missing else {col: list(map(itemgetter(col), records)) for col in self.required_columns}
+
+        if missing:
+            raise ValueError(f"Columns are missing from the input: {missing}")
+        return columns, len(columns[self.required_columns[0]])
+
+
+    def transform(self, data) -> np.ndarray:
+        """
+        Method Name: transform
+        Description: Transforms the input the same way the fitted preprocessor does
+
+        Output: float64 array of shape (n_rows, n_features_out)
+        On Failure: Raise an exception
+        """
+        try:
+            columns, n_rows = self._to_columns(data)
+            out = np.zeros((n_rows, self.n_features_out))
+
+            # map of dict.get keeps the per value lookups out of the interpreter loop
+            for col, lookup, handle_unknown in self.one_hot:
+                positions = np.fromiter(map(lookup.get, columns[col], repeat(-1)), dtype=np.intp, count=n_rows)
+                known = positions >= 0
+                if not known.all():
+                    if handle_unknown == "error":
+                        unknown = sorted({str(value) for value, ok in zip(columns[col], known) if not ok})
+                        raise ValueError(f"Found unknown categories {unknown} in column {col} during transform")
+                    rows = np.flatnonzero(known)
+                    out[rows, positions[rows]] = 1.0
+                else:
+                    out[np.arange(n_rows), positions] = 1.0
+
+            for col, lookup, position, unknown_value in self.ordinal:
+                codes = np.fromiter(map(lookup.get, columns[col], repeat(np.nan)), dtype=np.float64, count=n_rows)
+                unknown = np.isnan(codes)
+                if unknown.any():
+                    if unknown_value is None:
+                        values = sorted({str(value) for value, flag in zip(columns[col], unknown) if flag})
+                        raise ValueError(f"Found unknown categories {values} in column {col} during transform")
+                    codes[unknown] = unknown_value
+                out[:, position] = codes
+
+            numeric = np.empty((n_rows, len(self.numeric_columns)))
+            for j, col in enumerate(self.numeric_columns):
+                numeric[:, j] = np.asarray(columns[col], dtype=np.float64)
+                if not np.isnan(self.lambdas[j]):
+                    numeric[:, j] = _yeo_johnson(numeric[:, j], self.lambdas[j])
+            numeric -= self.mean
+            numeric /= self.scale
+            out[:, self.numeric_positions] = numeric
+
+            return out
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+def compile_preprocessor(preprocessor: ColumnTransformer) -> CompiledPreprocessor:
+    """
+    Method Name: compile_preprocessor
+    Description: Compiles a fitted ColumnTransformer made of OneHotEncoder, OrdinalEncoder, PowerTransformer
+                 (yeo-johnson) and StandardScaler transformers, possibly wrapped in a Pipeline, into a
+                 CompiledPreprocessor
+
+    Output: CompiledPreprocessor
+    On Failure: Raise an exception, also for transformers or options the compiler does not support
+    """
+    try:
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, PowerTransformer, StandardScaler
+
+        one_hot, ordinal = [], []
+        numeric_columns, numeric_positions, lambdas, means, scales = [], [], [], [], []
+        n_features_out = 0
+
+        for name, transformer, transformer_columns in preprocessor.transformers_:
+            if transformer == "drop":
+                continue
+            output_slice = preprocessor.output_indices_[name]
+            n_features_out = max(n_features_out, output_slice.stop)
+            if output_slice.stop == output_slice.start:
+                continue
+            transformer_columns = list(transformer_columns)
+            if transformer == "passthrough":
+                transformer_columns = [preprocessor.feature_names_in_[col] if isinstance(col, (int, np.integer)) else col
+                                       for col in transformer_columns]
+                steps = []
+            elif isinstance(transformer, Pipeline):
+                steps = [step for _, step in transformer.steps if step != "passthrough"]
+            else:
+                steps = [transformer]
+
+            if len(steps) == 1 and isinstance(steps[0], OneHotEncoder):
+                encoder = steps[0]
+                if getattr(encoder, "drop_idx_", None) is not None or getattr(encoder, "_infrequent_enabled", False):
+                    raise NotImplementedError(f"OneHotEncoder [{name}] uses drop or infrequent categories")
+                position = output_slice.start
+                for col, categories in zip(transformer_columns, encoder.categories_):
+                    one_hot.append((col, {value: position + i for i, value in enumerate(categories)},
+                                    encoder.handle_unknown))
+                    position += len(categories)
+                continue
+
+            if len(steps) == 1 and isinstance(steps[0], OrdinalEncoder):
+                encoder = steps[0]
+                unknown_value = encoder.unknown_value if encoder.handle_unknown == "use_encoded_value" else None
+                for i, (col, categories) in enumerate(zip(transformer_columns, encoder.categories_)):
+                    ordinal.append((col, {value: float(code) for code, value in enumerate(categories)},
+                                    output_slice.start + i, unknown_value))
+                continue
+
+            n_columns = len(transformer_columns)
+            column_lambdas = np.full(n_columns, np.nan)
+            mean, scale = np.zeros(n_columns), np.ones(n_columns)
+            for step in steps:
+                if isinstance(step, PowerTransformer) and step.method == "yeo-johnson" and np.isnan(column_lambdas).all():
+                    column_lambdas = np.asarray(step.lambdas_, dtype=np.float64)
+                    if step.standardize:
+                        mean, scale = _scaler_parameters(step._scaler, n_columns)
+                elif isinstance(step, StandardScaler) and (mean == 0).all() and (scale == 1).all():
+                    mean, scale = _scaler_parameters(step, n_columns)
+                else:
+                    raise NotImplementedError(f"Transformer [{name}] cannot be compiled: {steps}")
+
+            numeric_columns += transformer_columns
+            numeric_positions += list(range(output_slice.start, output_slice.stop))
+            lambdas.append(column_lambdas)
+            means.append(mean)
+            scales.append(scale)
+
+        return CompiledPreprocessor(
+            feature_names_in=list(preprocessor.feature_names_in_),
+            n_features_out=n_features_out,
+            one_hot=one_hot,
+            ordinal=ordinal,
+            numeric_columns=numeric_columns,
+            numeric_positions=np.asarray(numeric_positions, dtype=np.intp),
+            lambdas=np.concatenate(lambdas) if lambdas else np.empty(0),
+            mean=np.concatenate(means) if means else np.empty(0),
+            scale=np.concatenate(scales) if scales else np.empty(0),
+        )
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+def check_parity(preprocessor: ColumnTransformer, compiled_preprocessor: CompiledPreprocessor, data, atol: float = 1e-9) -> float:
+    """
+    Method Name: check_parity
+    Description: Transforms a dataframe with both the fitted preprocessor and its compiled version, the
+                 latter through the list of dicts path used at inference time
+
+    Output: max absolute difference of the two outputs
+    On Failure: Raise an exception when the difference exceeds atol or the shapes differ
+    """
+    try:
+        expected = preprocessor.transform(data)
+        if hasattr(expected, "toarray"):
+            expected = expected.toarray()
+        actual = compiled_preprocessor.transform(data.to_dict(orient="records"))
+        if expected.shape != actual.shape:
+            raise ValueError(f"Compiled preprocessor output has shape {actual.shape} instead of {expected.shape}")
+        max_difference = float(np.nanmax(np.abs(expected - actual), initial=0.0))
+        if not np.array_equal(np.isnan(expected), np.isnan(actual)) or max_difference > atol:
+            raise ValueError(f"Compiled preprocessor differs from the fitted preprocessor by {max_difference}")
+        return max_difference
+    except Exception as e:
+        raise USvisaException(e, sys) from e
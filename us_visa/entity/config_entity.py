@@ -1,7 +1,8 @@
 import os
 from us_visa.constants import *
 from us_visa.logger import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
 from datetime import datetime
 
 TIMESTAMP: str = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
@@ -14,6 +15,35 @@ class TrainingPipelineConfig:
 
 training_pipeline_config: TrainingPipelineConfig = TrainingPipelineConfig()
 
+
+def _getenv_int(key: str, default: Optional[int]) -> Optional[int]:
+    # integer environment variable, "none" maps to None
+    value = os.getenv(key)
+    if value is None:
+        return default
+    return None if value.strip().lower() == "none" else int(value)
+
+
+@dataclass(frozen=True)
+class MongoDBConfig:
+    # the defaults are read from the environment when the config is created, so every process picks up its own
+    max_pool_size: int = field(default_factory=lambda: _getenv_int(MONGODB_MAX_POOL_SIZE_KEY, MONGODB_MAX_POOL_SIZE))
+    min_pool_size: int = field(default_factory=lambda: _getenv_int(MONGODB_MIN_POOL_SIZE_KEY, MONGODB_MIN_POOL_SIZE))
+    max_idle_time_ms: Optional[int] = field(
+        default_factory=lambda: _getenv_int(MONGODB_MAX_IDLE_TIME_MS_KEY, MONGODB_MAX_IDLE_TIME_MS))
+    connect_timeout_ms: Optional[int] = field(
+        default_factory=lambda: _getenv_int(MONGODB_CONNECT_TIMEOUT_MS_KEY, MONGODB_CONNECT_TIMEOUT_MS))
+    server_selection_timeout_ms: Optional[int] = field(
+        default_factory=lambda: _getenv_int(MONGODB_SERVER_SELECTION_TIMEOUT_MS_KEY,
+                                            MONGODB_SERVER_SELECTION_TIMEOUT_MS))
+    socket_timeout_ms: Optional[int] = field(
+        default_factory=lambda: _getenv_int(MONGODB_SOCKET_TIMEOUT_MS_KEY, MONGODB_SOCKET_TIMEOUT_MS))
+    wait_queue_timeout_ms: Optional[int] = field(
+        default_factory=lambda: _getenv_int(MONGODB_WAIT_QUEUE_TIMEOUT_MS_KEY, MONGODB_WAIT_QUEUE_TIMEOUT_MS))
+    read_preference: str = field(default_factory=lambda: os.getenv(MONGODB_READ_PREFERENCE_KEY, MONGODB_READ_PREFERENCE))
+    batch_size: int = field(default_factory=lambda: _getenv_int(MONGODB_BATCH_SIZE_KEY, MONGODB_BATCH_SIZE))
+
+
 @dataclass
 class DataIngestionConfig:
     data_ingestion_dir: str = os.path.join(training_pipeline_config.artifact_dir, DATA_INGESTION_DIR_NAME)
@@ -22,11 +52,42 @@ class DataIngestionConfig:
     testing_file_path = os.path.join(data_ingestion_dir, DATA_INGESTION_INGESTED_DIR, TEST_FILE_NAME)
     train_test_split_ration: float = DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
     collection_name: str = COLLECTION_NAME
+    streaming_export: bool = DATA_INGESTION_STREAMING_EXPORT
+    batch_size: int = DATA_INGESTION_BATCH_SIZE
+    incremental: bool = DATA_INGESTION_INCREMENTAL
+    watermark_field: str = DATA_INGESTION_WATERMARK_FIELD
+    dedup_column: str = DATA_INGESTION_DEDUP_COLUMN
+    max_feature_store_parts: int = DATA_INGESTION_MAX_FEATURE_STORE_PARTS
+    persistent_feature_store_dir: str = os.path.join(ARTIFACT_DIR, DATA_INGESTION_FEATURE_STORE_DIR)
+    watermark_file_path: str = os.path.join(persistent_feature_store_dir, DATA_INGESTION_WATERMARK_FILE_NAME)
+    # number of stages reusing the in-memory train and test sets, 0 disables the in-memory handoff
+    in_memory_consumers: int = DATA_INGESTION_IN_MEMORY_CONSUMERS
+    # one of csv, parquet or feather
+    artifact_format: str = DATA_INGESTION_ARTIFACT_FORMAT
+    pushdown: bool = DATA_INGESTION_PUSHDOWN
+    pushdown_match: Optional[dict] = DATA_INGESTION_PUSHDOWN_MATCH
+
+    def __post_init__(self):
+        extension = f".{self.artifact_format}"
+        self.feature_store_file_path = os.path.splitext(self.feature_store_file_path)[0] + extension
+        self.training_file_path = os.path.splitext(self.training_file_path)[0] + extension
+        self.testing_file_path = os.path.splitext(self.testing_file_path)[0] + extension
 
 
 @dataclass
 class DataValidationConfig:
     data_validation_dir: str = os.path.join(TrainingPipelineConfig.artifact_dir, DATA_VALIDATION_DIR_NAME)
+    report_file_path: str = os.path.join(data_validation_dir, DATA_VALIDATION_DRIFT_REPORT_FILENAME)
+    chunk_size: int = DATA_VALIDATION_CHUNK_SIZE
+    max_null_rate: float = DATA_VALIDATION_MAX_NULL_RATE
+    max_out_of_range_rate: float = DATA_VALIDATION_MAX_OUT_OF_RANGE_RATE
+    max_out_of_domain_rate: float = DATA_VALIDATION_MAX_OUT_OF_DOMAIN_RATE
+    drift_sketch_file_path: str = os.path.join(data_validation_dir, DATA_VALIDATION_DRIFT_SKETCH_FILE_NAME)
+    # sketch of the data the deployed model was trained on
+    drift_reference_file_path: str = os.path.join(ARTIFACT_DIR, DATA_VALIDATION_DRIFT_REFERENCE_DIR,
+                                                  DATA_VALIDATION_DRIFT_SKETCH_FILE_NAME)
+    drift_psi_threshold: float = DATA_VALIDATION_DRIFT_PSI_THRESHOLD
+    fail_on_drift: bool = DATA_VALIDATION_FAIL_ON_DRIFT
     
 @dataclass
 class DataTransfomationConfig: 
@@ -37,6 +98,131 @@ class DataTransfomationConfig:
     transformed_test_file_path: str = os.path.join(data_transformation_dir,
                                                    DATA_TRANSFORMATION_TRANSFORMED_DIR,
                                                    TEST_FILE_NAME.replace('csv', 'npy'))
+    # features of the sparse output mode
+    transformed_train_sparse_file_path: str = os.path.join(data_transformation_dir,
+                                                           DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                           TRAIN_FILE_NAME.replace('csv', 'npz'))
+    transformed_test_sparse_file_path: str = os.path.join(data_transformation_dir,
+                                                          DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                          TEST_FILE_NAME.replace('csv', 'npz'))
+    transformed_train_target_file_path: str = os.path.join(data_transformation_dir,
+                                                           DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                           TRAIN_FILE_NAME.replace('.csv', '_target.npy'))
+    transformed_test_target_file_path: str = os.path.join(data_transformation_dir,
+                                                          DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                          TEST_FILE_NAME.replace('.csv', '_target.npy'))
     transformed_object_file_path: str = os.path.join(data_transformation_dir,
                                                      DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
-                                                     PREPROCESSING_OBJECT_FILE_NAME)
\ No newline at end of file
+                                                     PREPROCESSING_OBJECT_FILE_NAME)
+    compiled_object_file_path: str = os.path.join(data_transformation_dir,
+                                                  DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
+                                                  COMPILED_PREPROCESSING_OBJECT_FILE_NAME)
+    transformed_train_sample_weight_file_path: str = os.path.join(data_transformation_dir,
+                                                                  DATA_TRANSFORMATION_TRANSFORMED_DIR,
+                                                                  TRAIN_FILE_NAME.replace('.csv', '_sample_weight.npy'))
+    array_dtype: str = DATA_TRANSFORMATION_ARRAY_DTYPE
+    sparse_output: bool = DATA_TRANSFORMATION_SPARSE_OUTPUT
+    parity_sample_size: int = DATA_TRANSFORMATION_PARITY_SAMPLE_SIZE
+    parity_tolerance: float = DATA_TRANSFORMATION_PARITY_TOLERANCE
+    resampling_strategy: str = DATA_TRANSFORMATION_RESAMPLING_STRATEGY
+    resampling_n_jobs: int = DATA_TRANSFORMATION_RESAMPLING_N_JOBS
+    resampling_knn_algorithm: str = DATA_TRANSFORMATION_RESAMPLING_KNN_ALGORITHM
+    # rows queried at once by the chunked Edited Nearest Neighbours
+    resampling_chunk_size: int = DATA_TRANSFORMATION_RESAMPLING_CHUNK_SIZE
+    # rows per k-means partition of the approximate nearest neighbours
+    resampling_partition_size: int = DATA_TRANSFORMATION_RESAMPLING_PARTITION_SIZE
+    random_state: int = 42
+    out_of_core: bool = DATA_TRANSFORMATION_OUT_OF_CORE
+    # rows read, fitted and transformed at once by the out-of-core mode
+    chunk_size: int = DATA_TRANSFORMATION_CHUNK_SIZE
+    reservoir_size: int = DATA_TRANSFORMATION_RESERVOIR_SIZE
+
+
+@dataclass
+class ModelTrainerConfig:
+    model_trainer_dir: str = os.path.join(training_pipeline_config.artifact_dir, MODEL_TRAINER_DIR_NAME)
+    trained_model_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_TRAINER_TRAINED_MODEL_NAME)
+    search_report_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_SEARCH_REPORT_FILE_NAME)
+    expected_accuracy: float = MODEL_TRAINER_EXPECTED_SCORE
+    model_config_file_path: str = MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
+    n_workers: int = MODEL_TRAINER_N_WORKERS
+    time_budget_seconds: float = MODEL_TRAINER_TIME_BUDGET_SECONDS
+
+
+@dataclass
+class ModelRegistryConfig:
+    # local or s3
+    backend: str = os.getenv(MODEL_REGISTRY_BACKEND_KEY, MODEL_REGISTRY_DEFAULT_BACKEND)
+    registry_dir: str = MODEL_REGISTRY_DIR
+    cache_dir: str = MODEL_REGISTRY_CACHE_DIR
+    bucket_name: str = MODEL_BUCKET_NAME
+    s3_prefix: str = MODEL_REGISTRY_S3_PREFIX
+    endpoint_url: Optional[str] = os.getenv(AWS_ENDPOINT_URL_KEY)
+    region_name: str = REGION_NAME
+
+
+@dataclass
+class ModelEvaluationConfig:
+    changed_threshold_score: float = MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE
+    # None compares against the current version of the model registry
+    production_model_file_path: Optional[str] = None
+    model_registry_config: ModelRegistryConfig = field(default_factory=ModelRegistryConfig)
+    report_file_path: str = os.path.join(training_pipeline_config.artifact_dir, MODEL_EVALUATION_DIR_NAME,
+                                         MODEL_EVALUATION_REPORT_FILE_NAME)
+    n_bootstrap: int = MODEL_EVALUATION_N_BOOTSTRAP
+    confidence_level: float = MODEL_EVALUATION_CONFIDENCE_LEVEL
+    max_block_elements: int = MODEL_EVALUATION_MAX_BLOCK_ELEMENTS
+    random_state: int = 42
+
+
+@dataclass
+class ModelPusherConfig:
+    model_registry_config: ModelRegistryConfig = field(default_factory=ModelRegistryConfig)
+    # the drift sketch of the pushed model becomes the reference of the next data validations
+    drift_reference_file_path: str = DataValidationConfig.drift_reference_file_path
+
+
+@dataclass
+class StageCacheConfig:
+    stage_cache_dir: str = os.path.join(ARTIFACT_DIR, STAGE_CACHE_DIR_NAME)
+    max_size_bytes: int = STAGE_CACHE_MAX_SIZE_BYTES
+    max_age_days: int = STAGE_CACHE_MAX_AGE_DAYS
+
+
+@dataclass
+class PipelineExecutorConfig:
+    state_dir: str = os.path.join(ARTIFACT_DIR, PIPELINE_STATE_DIR_NAME)
+    max_workers: int = PIPELINE_MAX_WORKERS
+
+
+@dataclass
+class InstrumentationConfig:
+    metrics_file_path: str = os.path.join(training_pipeline_config.artifact_dir, METRICS_FILE_NAME)
+    profile_dir: str = os.path.join(training_pipeline_config.artifact_dir, PROFILE_DIR_NAME)
+    # None, cprofile or pyinstrument
+    profiler: Optional[str] = INSTRUMENTATION_PROFILER
+    trace_memory: bool = INSTRUMENTATION_TRACE_MEMORY
+
+
+@dataclass
+class BatchPredictionConfig:
+    # None scores with the current version of the model registry
+    model_file_path: Optional[str] = None
+    model_registry_config: ModelRegistryConfig = field(default_factory=ModelRegistryConfig)
+    chunk_size: int = BATCH_PREDICTION_CHUNK_SIZE
+    n_workers: int = BATCH_PREDICTION_N_WORKERS
+    max_pending_chunks: int = BATCH_PREDICTION_MAX_PENDING_CHUNKS
+    id_column: str = BATCH_PREDICTION_ID_COLUMN
+    prediction_column: str = TARGET_COLUMN
+
+
+@dataclass
+class PredictionServiceConfig:
+    # None serves the current version of the model registry and hot-swaps the versions published later
+    model_file_path: Optional[str] = None
+    model_registry_config: ModelRegistryConfig = field(default_factory=ModelRegistryConfig)
+    registry_poll_seconds: float = PREDICTION_SERVICE_REGISTRY_POLL_SECONDS
+    max_batch_size: int = PREDICTION_SERVICE_MAX_BATCH_SIZE
+    max_wait_ms: float = PREDICTION_SERVICE_MAX_WAIT_MS
+    latency_window: int = PREDICTION_SERVICE_LATENCY_WINDOW
+    warmup_rounds: int = PREDICTION_SERVICE_WARMUP_ROUNDS
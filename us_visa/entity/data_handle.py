@@ -0,0 +1,118 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+from pandas import DataFrame
+
+from us_visa.constants import DATA_INGESTION_IN_MEMORY_CACHE_MAX_BYTES
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+from us_visa.utils.main_utils import read_dataframe, iter_dataframe_chunks, cast_to_schema_dtypes
+from us_visa.utils.instrumentation import record_io
+
+
+class InMemoryFrameCache:
+    '''
+    Process wide LRU cache of dataframes keyed by the artifact file they were written to.
+    The total size is bounded by max_bytes, evicted frames are read from disk again
+    '''
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, key: str, dataframe: DataFrame) -> None:
+        size = int(dataframe.memory_usage(deep=True).sum())
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                logging.info(f"Frame of {key} ({size} bytes) exceeds the in-memory cache size, not cached")
+                return
+            self._frames[key] = (dataframe, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                evicted_key, _ = next(iter(self._frames.items()))
+                logging.info(f"Evicting frame of {evicted_key} from the in-memory cache")
+                self._pop(evicted_key)
+
+    def get(self, key: str) -> Optional[DataFrame]:
+        with self._lock:
+            if key not in self._frames:
+                return None
+            self._frames.move_to_end(key)
+            return self._frames[key][0]
+
+    def _pop(self, key: str) -> None:
+        if key in self._frames:
+            _, size = self._frames.pop(key)
+            self._total_bytes -= size
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+
+frame_cache = InMemoryFrameCache(max_bytes=DATA_INGESTION_IN_MEMORY_CACHE_MAX_BYTES)
+
+
+class DataFrameHandle:
+    '''
+    Class Name: DataFrameHandle
+    Description: In-memory handle to the dataframe of an artifact file, shared by the stages running in the
+                 same process. The frame is kept in the bounded frame_cache until every consumer released
+                 the handle, and is read from the file when it is not in memory
+    '''
+
+    def __init__(self, file_path: str, dataframe: Optional[DataFrame] = None, consumers: int = 1):
+        self.file_path = file_path
+        self._consumers = consumers
+        self._lock = threading.Lock()
+        if dataframe is not None:
+            frame_cache.put(file_path, dataframe)
+
+    def get(self, columns: list = None, column_dtypes: dict = None) -> DataFrame:
+        """
+        Method Name: get
+        Description: Returns the frame restricted to columns and cast to column_dtypes. On a miss, the whole
+                     file is loaded and cached while other consumers are left, else only columns are read
+
+        Output: pandas DataFrame
+        On Failure: Raise an exception
+        """
+        try:
+            dataframe = frame_cache.get(self.file_path)
+            if dataframe is None:
+                with self._lock:
+                    if self._consumers <= 1:
+                        return read_dataframe(self.file_path, columns=columns, column_dtypes=column_dtypes)
+                dataframe = read_dataframe(self.file_path, column_dtypes=column_dtypes)
+                frame_cache.put(self.file_path, dataframe)
+            else:
+                # rows handed over in memory, the reads from the file are recorded by read_dataframe
+                record_io("DataFrameHandle", write=False, n_rows=len(dataframe))
+
+            if columns is not None:
+                dataframe = dataframe[columns]
+            return cast_to_schema_dtypes(dataframe.copy(), column_dtypes or {})
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[DataFrame]:
+        dataframe = frame_cache.get(self.file_path)
+        if dataframe is None:
+            yield from iter_dataframe_chunks(self.file_path, chunk_size=chunk_size)
+            return
+
+        for start in range(0, len(dataframe), chunk_size):
+            chunk = dataframe.iloc[start:start + chunk_size]
+            record_io("DataFrameHandle", write=False, n_rows=len(chunk))
+            yield chunk
+
+    def release(self) -> None:
+        with self._lock:
+            self._consumers -= 1
+            if self._consumers <= 0:
+                frame_cache.pop(self.file_path)
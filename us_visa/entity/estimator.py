@@ -1,11 +1,17 @@
+from __future__ import annotations
+
 import os
 import sys
-
-from pandas import DataFrame
-from sklearn.pipeline import Pipeline
+from typing import TYPE_CHECKING
 
 from us_visa.exception import USvisaException
 from us_visa.logger import logging
+from us_visa.constants import CURRENT_YEAR
+from us_visa.utils.main_utils import drop_columns
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+    from sklearn.pipeline import Pipeline
 
 class TargetValueMapping:
     def __init__(self):
@@ -15,4 +21,116 @@ class TargetValueMapping:
         return self.__dict__
     def reverse_mapping(self):
         mapping_response = self._asdict()
-        return dict(zip(mapping_response.values(), mapping_response.keys()))
\ No newline at end of file
+        return dict(zip(mapping_response.values(), mapping_response.keys()))
+
+
+def prepare_input_features(dataframe: DataFrame, drop_cols: list) -> DataFrame:
+    '''
+    derive company_age from yr_of_estab and drop the drop_cols columns, the same way for training and inference
+    dataframe: pandas DataFrame of raw input features, or of the pushed down ingestion which derived company_age
+    drop_cols: drop_columns of schema.yaml
+    '''
+    if 'yr_of_estab' in dataframe.columns:
+        dataframe = dataframe.assign(company_age=CURRENT_YEAR - dataframe['yr_of_estab'])
+    return drop_columns(dataframe, [col for col in drop_cols if col in dataframe.columns])
+
+
+def prepare_input_records(records: list) -> list:
+    '''
+    dict counterpart of prepare_input_features for the compiled preprocessor, which only reads the columns it needs
+    records: list of dicts of raw input features
+    '''
+    return [{**record, 'company_age': CURRENT_YEAR - record['yr_of_estab']} for record in records]
+
+
+# packages whose models read scipy sparse matrices natively, their scikit-learn tags do not say so
+SPARSE_NATIVE_PACKAGES = ("xgboost", "catboost", "lightgbm")
+
+
+def accepts_sparse(model: object) -> bool:
+    '''
+    whether model is fitted and predicts on scipy sparse matrices without densifying them, from its
+    scikit-learn tags. Models without tags are assumed not to
+    '''
+    if type(model).__module__.split(".")[0] in SPARSE_NATIVE_PACKAGES:
+        return True
+    try:
+        from sklearn.utils import get_tags
+    except ImportError:
+        # scikit-learn before 1.6 has the X_types of the _get_tags dict instead of get_tags
+        try:
+            return "sparse" in model._get_tags().get("X_types", ())
+        except AttributeError:
+            return False
+
+    try:
+        return get_tags(model).input_tags.sparse
+    except AttributeError:
+        return False
+
+
+def to_model_input(model: object, features: object) -> object:
+    '''
+    features as model reads them: sparse features are densified for the models that do not accept them
+    '''
+    return features.toarray() if hasattr(features, "toarray") and not accepts_sparse(model) else features
+
+
+class USvisaModel:
+    def __init__(self, preprocessing_object: Pipeline, trained_model_object: object, compiled_preprocessing_object: object = None):
+        """
+        :param preprocessing_object: Input Object of preprocesser
+        :param trained_model_object: Input Object of trained model 
+        :param compiled_preprocessing_object: Optional CompiledPreprocessor of preprocessing_object, used instead of it
+        """
+        self.preprocessing_object = preprocessing_object
+        self.trained_model_object = trained_model_object
+        self.compiled_preprocessing_object = compiled_preprocessing_object
+
+    def transform(self, dataframe) -> object:
+        """
+        Method Name: transform
+        Description: Applies the preprocessing to prepared input features, a dataframe or, with a compiled
+                     preprocessor, any input CompiledPreprocessor accepts
+
+        Output: transformed features
+        On Failure: Raise an exception
+        """
+        try:
+            if self.compiled_preprocessing_object is not None:
+                return self.compiled_preprocessing_object.transform(dataframe)
+            return to_model_input(self.trained_model_object, self.preprocessing_object.transform(dataframe))
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def predict(self, dataframe) -> object:
+        """
+        Method Name: predict
+        Description: Predicts the encoded case_status of prepared input features
+
+        Output: numpy array of predictions
+        On Failure: Raise an exception
+        """
+        try:
+            return self.trained_model_object.predict(self.transform(dataframe))
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def predict_proba(self, dataframe) -> object:
+        """
+        Method Name: predict_proba
+        Description: Predicts the probability of every encoded case_status of prepared input features
+
+        Output: numpy array of shape (n_rows, n_classes)
+        On Failure: Raise an exception
+        """
+        try:
+            return self.trained_model_object.predict_proba(self.transform(dataframe))
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def __repr__(self):
+        return f"{type(self.trained_model_object).__name__}()"
+
+    def __str__(self):
+        return f"{type(self.trained_model_object).__name__}()"
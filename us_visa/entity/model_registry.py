@@ -0,0 +1,289 @@
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+import yaml
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+from us_visa.constants import (MODEL_FILE_NAME, MODEL_REGISTRY_VERSIONS_DIR, MODEL_REGISTRY_CURRENT_FILE_NAME,
+                               MODEL_REGISTRY_MANIFEST_FILE_NAME)
+from us_visa.entity.config_entity import ModelRegistryConfig
+
+
+def file_sha256(file_path: str, block_size: int = 1024 ** 2) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LocalRegistryBackend:
+    '''
+    Registry stored in a local or mounted directory, keys are '/' separated paths below root_dir
+    '''
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    @property
+    def uri(self) -> str:
+        return os.path.abspath(self.root_dir)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, *key.split("/"))
+
+    def read_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write_bytes(self, key: str, data: bytes) -> None:
+        # written next to the key then renamed over it, so readers see the old or the new content
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def upload_file(self, file_path: str, key: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(file_path, path)
+
+    def download_file(self, key: str, file_path: str) -> None:
+        shutil.copyfile(self._path(key), file_path)
+
+    def list_children(self, prefix: str) -> list:
+        path = self._path(prefix)
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+class S3RegistryBackend:
+    '''
+    Registry stored in an S3 bucket, or any S3 compatible store the client points at, below prefix
+    '''
+
+    def __init__(self, bucket_name: str, prefix: str, client):
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip("/")
+        self.client = client
+
+    @property
+    def uri(self) -> str:
+        return f"s3://{self.bucket_name}/{self.prefix}"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def read_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket_name, Key=self._key(key))["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def write_bytes(self, key: str, data: bytes) -> None:
+        # a PUT replaces the whole object at once, so readers see the old or the new content
+        self.client.put_object(Bucket=self.bucket_name, Key=self._key(key), Body=data)
+
+    def upload_file(self, file_path: str, key: str) -> None:
+        self.client.upload_file(file_path, self.bucket_name, self._key(key))
+
+    def download_file(self, key: str, file_path: str) -> None:
+        self.client.download_file(self.bucket_name, self._key(key), file_path)
+
+    def list_children(self, prefix: str) -> list:
+        base = self._key(prefix) + "/"
+        children = []
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket_name, Prefix=base,
+                                                                          Delimiter="/"):
+            children.extend(common_prefix["Prefix"][len(base):].rstrip("/")
+                            for common_prefix in page.get("CommonPrefixes", []))
+        return sorted(children)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+
+class ModelRegistry:
+    '''
+    Class Name: ModelRegistry
+    Description: Versioned store of the model bundles. A version is the directory versions/<version> holding
+                 the files of the bundle and a manifest of their sha256, written last. The CURRENT object
+                 names the version in production and is replaced in a single write, so readers see the old
+                 or the new version and never a partial bundle. Versions are never modified, rolling back
+                 is pointing CURRENT at an older version
+    '''
+
+    def __init__(self, model_registry_config: ModelRegistryConfig = ModelRegistryConfig(), backend=None):
+        try:
+            self.model_registry_config = model_registry_config
+            self.backend = backend or self._create_backend(model_registry_config)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    @staticmethod
+    def _create_backend(config: ModelRegistryConfig):
+        if config.backend == "local":
+            return LocalRegistryBackend(config.registry_dir)
+        if config.backend == "s3":
+            from us_visa.configuration.aws_connection import S3Client
+            return S3RegistryBackend(config.bucket_name, config.s3_prefix,
+                                     S3Client(config.endpoint_url, config.region_name).client)
+        raise Exception(f"Unsupported model registry backend: {config.backend}")
+
+
+    @property
+    def uri(self) -> str:
+        return self.backend.uri
+
+
+    @staticmethod
+    def _version_key(version: str, name: Optional[str] = None) -> str:
+        key = f"{MODEL_REGISTRY_VERSIONS_DIR}/{version}"
+        return f"{key}/{name}" if name else key
+
+
+    def current_version(self) -> Optional[str]:
+        try:
+            content = self.backend.read_bytes(MODEL_REGISTRY_CURRENT_FILE_NAME)
+            return content.decode().strip() or None if content else None
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_manifest(self, version: str) -> Optional[dict]:
+        try:
+            content = self.backend.read_bytes(self._version_key(version, MODEL_REGISTRY_MANIFEST_FILE_NAME))
+            return yaml.safe_load(content) if content else None
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def list_versions(self) -> list:
+        """
+        Method Name: list_versions
+        Description: Lists the complete versions, oldest first. Versions whose upload did not finish have no
+                     manifest and are left out
+
+        Output: list of versions
+        On Failure: Raise an exception
+        """
+        try:
+            return [version for version in self.backend.list_children(MODEL_REGISTRY_VERSIONS_DIR)
+                    if self.get_manifest(version) is not None]
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def publish(self, files: dict, metadata: Optional[dict] = None) -> str:
+        """
+        Method Name: publish
+        Description: Uploads the files of a bundle as a new version, then makes it the current version
+
+        Output: the new version
+        On Failure: Raise an exception
+        """
+        try:
+            version = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            manifest = {"version": version, "created_at": datetime.now().isoformat(), "files": {},
+                        "metadata": metadata or {}}
+            for name, file_path in files.items():
+                self.backend.upload_file(file_path, self._version_key(version, name))
+                manifest["files"][name] = {"sha256": file_sha256(file_path), "size": os.path.getsize(file_path)}
+            self.backend.write_bytes(self._version_key(version, MODEL_REGISTRY_MANIFEST_FILE_NAME),
+                                     yaml.safe_dump(manifest).encode())
+            logging.info(f"Published version {version} of {sorted(files)} to the model registry {self.uri}")
+
+            self.set_current(version)
+            return version
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def set_current(self, version: str) -> None:
+        try:
+            if self.get_manifest(version) is None:
+                raise Exception(f"Version {version} is not in the model registry {self.uri}")
+            self.backend.write_bytes(MODEL_REGISTRY_CURRENT_FILE_NAME, version.encode())
+            logging.info(f"Current version of the model registry {self.uri} is now {version}")
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def fetch(self, version: Optional[str] = None) -> str:
+        """
+        Method Name: fetch
+        Description: Returns a local directory holding the files of version, the current version by default.
+                     Versions of a remote registry are downloaded once into cache_dir, checked against the
+                     manifest, and renamed into place so concurrent fetches never see a partial download
+
+        Output: local directory of the version
+        On Failure: Raise an exception
+        """
+        try:
+            version = version or self.current_version()
+            if version is None:
+                raise Exception(f"No model version is published in the model registry {self.uri}")
+
+            local_dir = self.backend.local_path(self._version_key(version))
+            if local_dir is not None:
+                if not os.path.exists(os.path.join(local_dir, MODEL_REGISTRY_MANIFEST_FILE_NAME)):
+                    raise Exception(f"Version {version} is not in the model registry {self.uri}")
+                return local_dir
+
+            cache_dir = self.model_registry_config.cache_dir
+            local_dir = os.path.join(cache_dir, version)
+            if os.path.exists(os.path.join(local_dir, MODEL_REGISTRY_MANIFEST_FILE_NAME)):
+                return local_dir
+
+            manifest = self.get_manifest(version)
+            if manifest is None:
+                raise Exception(f"Version {version} is not in the model registry {self.uri}")
+            os.makedirs(cache_dir, exist_ok=True)
+            download_dir = tempfile.mkdtemp(dir=cache_dir, prefix=f".{version}-")
+            try:
+                for name, info in manifest["files"].items():
+                    file_path = os.path.join(download_dir, name)
+                    self.backend.download_file(self._version_key(version, name), file_path)
+                    if file_sha256(file_path) != info["sha256"]:
+                        raise Exception(f"Checksum mismatch of {name} of version {version}")
+                with open(os.path.join(download_dir, MODEL_REGISTRY_MANIFEST_FILE_NAME), 'w') as file:
+                    yaml.safe_dump(manifest, file)
+                try:
+                    os.rename(download_dir, local_dir)
+                except OSError:
+                    # fetched meanwhile by another process
+                    shutil.rmtree(download_dir)
+            except BaseException:
+                shutil.rmtree(download_dir, ignore_errors=True)
+                raise
+
+            logging.info(f"Fetched version {version} from the model registry {self.uri} into {local_dir}")
+            return local_dir
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def model_file_path(self, version: Optional[str] = None) -> str:
+        return os.path.join(self.fetch(version), MODEL_FILE_NAME)
@@ -18,6 +18,11 @@ class USvisaException(Exception):
         :param error_message: error message in string format
         """
         super().__init__(error_message)
+        if isinstance(error_message, USvisaException):
+            # re-raised by an outer layer: the message and the traceback were logged where the error occurred
+            self.error_message = error_message.error_message
+            return
+
         self.error_message = error_message_detail(
             error_message, error_detail=error_detail
         )
@@ -1,19 +1,111 @@
-import logging
 import os
+import copy
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
 
-from from_root import from_root
 from datetime import datetime
 
-LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
+from us_visa.constants import LOG_DIR, LOG_LEVEL, LOG_LEVEL_KEY, LOG_FORMAT
+
+TEXT_FORMAT = "[%(asctime)s] %(name)s - %(levelname)s - %(message)s"
+
+# attributes every LogRecord has, the other ones come from extra, e.g. stage, duration_s and n_rows
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_log_file_path = None
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Formats a record as one JSON object per line, with the fields passed in extra as top-level keys
+    '''
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                 "level": record.levelname, "logger": record.name, "thread": record.threadName,
+                 "message": record.getMessage()}
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # the caller only renders the message and the traceback, formatting and writing happen on the listener thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _use_handlers_directly() -> None:
+    # a forked child has no listener thread, it writes its rare records itself instead of queueing them forever
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+            for listener_handler in _listener.handlers:
+                root.addHandler(listener_handler)
+
+
+def configure_logging(log_dir: str = LOG_DIR, level: str = None, log_format: str = LOG_FORMAT) -> str:
+    '''
+    log to a new timestamped file of log_dir, below the project root. Records are put on a queue by the
+    logging thread and written by a background listener thread, so logging never waits on the disk.
+    Importing us_visa configures no logging, the entry points call this once; the next calls return the
+    file already configured
+    log_dir: directory of the log files
+    level: level of the root logger, by default the LOG_LEVEL environment variable or LOG_LEVEL
+    log_format: json, one JSON object per record, or text
+    return path of the log file
+    '''
+    global _log_file_path, _listener
+    if _log_file_path is None:
+        from from_root import from_root
+
+        log_file = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
+        os.makedirs(os.path.join(from_root(), log_dir), exist_ok=True)
+        _log_file_path = os.path.join(from_root(), log_dir, log_file)
+
+        file_handler = logging.FileHandler(_log_file_path)
+        file_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, file_handler)
+        _listener.start()
+
+        root = logging.getLogger()
+        root.addHandler(_QueueHandler(log_queue))
+        root.setLevel(level or os.getenv(LOG_LEVEL_KEY, LOG_LEVEL))
+    return _log_file_path
 
-log_dir = 'logs'
 
-logs_path = os.path.join(from_root(), log_dir, LOG_FILE)
+def shutdown_logging() -> None:
+    '''
+    writes the queued records and removes the handlers of configure_logging, which can then be called again
+    '''
+    global _log_file_path, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler) or handler in _listener.handlers:
+            root.removeHandler(handler)
+    for handler in _listener.handlers:
+        handler.close()
+    _log_file_path, _listener = None, None
 
-os.makedirs(log_dir, exist_ok=True)
 
-logging.basicConfig(
-    filename=logs_path,
-    format="[%(asctime)s] %(name)s - %(levelname)s - %(message)s",
-    level=logging.DEBUG
-)
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_use_handlers_directly)
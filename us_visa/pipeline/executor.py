@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+from us_visa.entity.config_entity import PipelineExecutorConfig
+from us_visa.entity.artifact_entity import artifact_to_dict
+from us_visa.utils.main_utils import read_yaml, write_yaml
+
+
+@dataclass
+class PipelineNode:
+    '''
+    name:           unique name of the node
+    run:            callable producing the artifact of the node
+    artifact_cls:   dataclass of the artifact, used to restore it from its completion marker
+    inputs:         keyword argument of run -> name of the upstream node whose artifact is passed
+    '''
+    name: str
+    run: Callable[..., object]
+    artifact_cls: type
+    inputs: Dict[str, str] = field(default_factory=dict)
+
+
+class PipelineExecutor:
+    '''
+    Class Name: PipelineExecutor
+    Description: Runs a DAG of pipeline nodes. A node is submitted to a thread pool as soon as all its
+                 upstream nodes are done, so independent nodes run concurrently. A completion marker is
+                 persisted per node, so a failed run can be resumed from the nodes that completed
+    '''
+
+    def __init__(self, nodes: list, pipeline_executor_config: PipelineExecutorConfig = PipelineExecutorConfig(),
+                 resume: bool = False):
+        try:
+            self.nodes = {node.name: node for node in nodes}
+            self.pipeline_executor_config = pipeline_executor_config
+            self.resume = resume
+            self.node_timings = {}
+            self._check_dag()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _check_dag(self) -> None:
+        for node in self.nodes.values():
+            for upstream in node.inputs.values():
+                if upstream not in self.nodes:
+                    raise Exception(f"Node [{node.name}] depends on unknown node [{upstream}]")
+
+        visiting, visited = set(), set()
+        self._topological_order = []
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise Exception(f"Pipeline graph has a cycle through node [{name}]")
+            visiting.add(name)
+            for upstream in self.nodes[name].inputs.values():
+                visit(upstream)
+            visiting.remove(name)
+            visited.add(name)
+            self._topological_order.append(name)
+
+        for name in self.nodes:
+            visit(name)
+
+
+    def _marker_file_path(self, name: str) -> str:
+        return os.path.join(self.pipeline_executor_config.state_dir, f"{name}.yaml")
+
+
+    def _write_marker(self, name: str, artifact: object, wall_time: float) -> None:
+        content = artifact_to_dict(artifact)
+        files = [value for value in content.values() if isinstance(value, str) and os.path.isfile(value)]
+        write_yaml(file_path=self._marker_file_path(name),
+                   content={"artifact": content, "files": files, "wall_time": wall_time})
+
+
+    def _read_marker(self, name: str) -> object:
+        marker_file_path = self._marker_file_path(name)
+        if not os.path.exists(marker_file_path):
+            return None
+
+        content = read_yaml(marker_file_path).to_dict()
+        if not all(os.path.exists(file_path) for file_path in content["files"]):
+            logging.info(f"Completion marker of node [{name}] points to missing files, rerunning the node")
+            return None
+        return self.nodes[name].artifact_cls(**content["artifact"])
+
+
+    def _run_node(self, name: str, artifacts: dict) -> object:
+        node = self.nodes[name]
+        kwargs = {arg: artifacts[upstream] for arg, upstream in node.inputs.items()}
+
+        logging.info(f"Started pipeline node [{name}]")
+        start = time.perf_counter()
+        artifact = node.run(**kwargs)
+        wall_time = time.perf_counter() - start
+
+        self._write_marker(name, artifact, wall_time)
+        self.node_timings[name] = wall_time
+        logging.info(f"Finished pipeline node [{name}] in {wall_time:.3f}s", extra={"stage": name, "duration_s": wall_time})
+        return artifact
+
+
+    def run(self) -> dict:
+        """
+        Method Name: run
+        Description: Runs every node of the DAG. With resume set, the nodes holding a valid completion marker,
+                     whose upstream nodes were restored as well, are not run again. The markers are removed
+                     once the whole DAG succeeded
+
+        Output: dict of node name -> artifact
+        On Failure: Waits for the running nodes, then raises the first exception
+        """
+        try:
+            state_dir = self.pipeline_executor_config.state_dir
+            if not self.resume:
+                shutil.rmtree(state_dir, ignore_errors=True)
+            os.makedirs(state_dir, exist_ok=True)
+
+            artifacts = {}
+            if self.resume:
+                for name in self._topological_order:
+                    if not all(upstream in artifacts for upstream in self.nodes[name].inputs.values()):
+                        continue
+                    artifact = self._read_marker(name)
+                    if artifact is not None:
+                        logging.info(f"Resuming: node [{name}] already completed")
+                        artifacts[name] = artifact
+
+            pending = {name for name in self.nodes if name not in artifacts}
+            running = {}
+            error = None
+            with ThreadPoolExecutor(max_workers=self.pipeline_executor_config.max_workers) as pool:
+                while pending or running:
+                    if error is None:
+                        ready = [name for name in pending
+                                 if all(upstream in artifacts for upstream in self.nodes[name].inputs.values())]
+                        for name in ready:
+                            pending.remove(name)
+                            running[pool.submit(self._run_node, name, dict(artifacts))] = name
+
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            artifacts[name] = future.result()
+                        except Exception as e:
+                            logging.info(f"Pipeline node [{name}] failed")
+                            error = error or e
+
+            if error is not None:
+                raise error
+
+            logging.info("Pipeline node wall times: " +
+                         ", ".join(f"{name}={wall_time:.3f}s" for name, wall_time in self.node_timings.items()))
+            shutil.rmtree(state_dir, ignore_errors=True)
+            return artifacts
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -0,0 +1,227 @@
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+from pandas import DataFrame
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+from us_visa.constants import SCHEMA_FILE_PATH
+from us_visa.entity.config_entity import BatchPredictionConfig
+from us_visa.entity.estimator import TargetValueMapping, prepare_input_features
+from us_visa.entity.model_registry import ModelRegistry
+from us_visa.utils.main_utils import (read_yaml, load_object, iter_dataframe_chunks, get_column_dtypes,
+                                     cast_to_schema_dtypes, DataFrameWriter)
+
+
+# state of a scoring worker process, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(model_file_path: str, drop_cols: list, id_column: str, prediction_column: str) -> None:
+    _worker["model"] = load_object(model_file_path)
+    _worker["drop_cols"] = drop_cols
+    _worker["id_column"] = id_column
+    _worker["prediction_column"] = prediction_column
+    _worker["labels"] = TargetValueMapping().reverse_mapping()
+
+
+def _score_chunk(chunk: DataFrame) -> DataFrame:
+    features = prepare_input_features(chunk, _worker["drop_cols"])
+    predictions = DataFrame({_worker["prediction_column"]: _worker["model"].predict(features)})
+    predictions[_worker["prediction_column"]] = predictions[_worker["prediction_column"]].map(_worker["labels"])
+    if _worker["id_column"] in chunk.columns:
+        predictions.insert(0, _worker["id_column"], chunk[_worker["id_column"]].to_numpy())
+    return predictions
+
+
+class BatchPredictionPipeline:
+    '''
+    Class Name: BatchPredictionPipeline
+    Description: Scores a file or a Mongo collection chunk by chunk. The chunks are scored on a process
+                 pool whose workers load the USvisaModel once, and the predictions are written in
+                 input order. At most n_workers * max_pending_chunks chunks are in flight, so the memory
+                 is bounded by the chunk size
+    '''
+
+    def __init__(self, batch_prediction_config: BatchPredictionConfig = BatchPredictionConfig()):
+        try:
+            self.batch_prediction_config = batch_prediction_config
+            self._schema_config = read_yaml(SCHEMA_FILE_PATH)
+            self.model_version = None
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def get_model_file_path(self) -> str:
+        """
+        Method Name: get_model_file_path
+        Description: Returns model_file_path when it is set, else fetches the current version of the model
+                     registry. It is resolved once per run, so all the chunks of a run are scored by the same
+                     version even when a new one is published meanwhile
+
+        Output: local path of the model
+        On Failure: Raise an exception
+        """
+        try:
+            config = self.batch_prediction_config
+            if config.model_file_path is not None:
+                self.model_version = None
+                return config.model_file_path
+
+            model_registry = ModelRegistry(config.model_registry_config)
+            self.model_version = model_registry.current_version()
+            return model_registry.model_file_path(self.model_version)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def read_file_chunks(self, file_path: str) -> Iterator[DataFrame]:
+        column_dtypes = get_column_dtypes(self._schema_config)
+        for chunk in iter_dataframe_chunks(file_path, self.batch_prediction_config.chunk_size):
+            yield cast_to_schema_dtypes(chunk, column_dtypes)
+
+
+    def read_collection_chunks(self, collection_name: str, database_name: Optional[str] = None) -> Iterator[DataFrame]:
+        # the mongo data access is imported by the collection paths only, scoring files does not load pymongo
+        from us_visa.data_access.usvisa_data import USvisaData
+
+        return USvisaData().export_collection_in_chunks(collection_name, database_name,
+                                                        batch_size=self.batch_prediction_config.chunk_size)
+
+
+    def score_chunks(self, chunks: Iterator[DataFrame], n_workers: Optional[int] = None) -> Iterator[DataFrame]:
+        """
+        Method Name: score_chunks
+        Description: Scores the chunks on a process pool of n_workers processes, defaulting to the configured
+                     number, and yields the predictions of every chunk in input order
+
+        Output: Generator of dataframes with the id column, when present, and the predicted case_status
+        On Failure: Raise an exception
+        """
+        try:
+            config = self.batch_prediction_config
+            n_workers = n_workers or config.n_workers
+            model_file_path = self.get_model_file_path()
+            logging.info(f"Scoring with {model_file_path}, model version {self.model_version}")
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(model_file_path, list(self._schema_config.drop_columns),
+                                               config.id_column, config.prediction_column)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_score_chunk, chunk))
+                    if len(pending) >= n_workers * config.max_pending_chunks:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    @staticmethod
+    def write_to_file(predictions: Iterator[DataFrame], file_path: str) -> int:
+        n_rows = 0
+        with DataFrameWriter(file_path) as writer:
+            for chunk in predictions:
+                writer.write(chunk)
+                n_rows += len(chunk)
+        return n_rows
+
+
+    def write_to_collection(self, predictions: Iterator[DataFrame], collection_name: str,
+                            database_name: Optional[str] = None) -> int:
+        """
+        Method Name: write_to_collection
+        Description: Writes the predictions with one unordered bulk write per chunk. Documents are upserted
+                     on the id column, so scoring the same cases again replaces their predictions
+
+        Output: number of predictions written
+        On Failure: Raise an exception
+        """
+        try:
+            from pymongo import ReplaceOne
+            from us_visa.data_access.usvisa_data import USvisaData
+
+            id_column = self.batch_prediction_config.id_column
+            collection = USvisaData()._get_collection(collection_name, database_name)
+            n_rows = 0
+            for chunk in predictions:
+                documents = chunk.to_dict(orient="records")
+                if id_column in chunk.columns:
+                    collection.bulk_write([ReplaceOne({id_column: document[id_column]}, document, upsert=True)
+                                           for document in documents], ordered=False)
+                else:
+                    collection.insert_many(documents, ordered=False)
+                n_rows += len(documents)
+            return n_rows
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def initiate_batch_prediction(self, input_file_path: Optional[str] = None, input_collection_name: Optional[str] = None,
+                                  output_file_path: Optional[str] = None, output_collection_name: Optional[str] = None,
+                                  database_name: Optional[str] = None, n_workers: Optional[int] = None) -> dict:
+        """
+        Method Name: initiate_batch_prediction
+        Description: Scores input_file_path (csv, parquet or feather) or the input_collection_name collection
+                     and writes the predictions to output_file_path or the output_collection_name collection
+
+        Output: dict with n_rows, n_workers, wall_time, rows_per_sec and model_version
+        On Failure: Raise an exception
+        """
+        logging.info("Entered initiate_batch_prediction method of BatchPredictionPipeline class")
+        try:
+            if (input_file_path is None) == (input_collection_name is None):
+                raise Exception("Exactly one of input_file_path and input_collection_name is required")
+            if (output_file_path is None) == (output_collection_name is None):
+                raise Exception("Exactly one of output_file_path and output_collection_name is required")
+
+            n_workers = n_workers or self.batch_prediction_config.n_workers
+            start = time.perf_counter()
+            if input_file_path is not None:
+                chunks = self.read_file_chunks(input_file_path)
+            else:
+                chunks = self.read_collection_chunks(input_collection_name, database_name)
+            predictions = self.score_chunks(chunks, n_workers)
+            if output_file_path is not None:
+                n_rows = self.write_to_file(predictions, output_file_path)
+            else:
+                n_rows = self.write_to_collection(predictions, output_collection_name, database_name)
+            wall_time = time.perf_counter() - start
+
+            stats = {"n_rows": n_rows, "n_workers": n_workers, "wall_time": wall_time,
+                     "rows_per_sec": n_rows / wall_time if wall_time > 0 else 0.0,
+                     "model_version": self.model_version}
+            logging.info(f"Scored {n_rows} rows with {n_workers} workers in {wall_time:.3f}s "
+                         f"({stats['rows_per_sec']:.0f} rows/sec)",
+                         extra={"stage": "batch_prediction", "duration_s": wall_time, "n_rows": n_rows,
+                                "n_workers": n_workers})
+            logging.info("Exited initiate_batch_prediction method of BatchPredictionPipeline class")
+            return stats
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def benchmark(self, input_file_path: str, output_file_path: str, worker_counts: tuple = (1, 2, 4, 8)) -> list:
+        """
+        Method Name: benchmark
+        Description: Scores input_file_path once per worker count of worker_counts
+
+        Output: list of the stats of initiate_batch_prediction, one per worker count
+        On Failure: Raise an exception
+        """
+        try:
+            results = []
+            for n_workers in worker_counts:
+                results.append(self.initiate_batch_prediction(input_file_path=input_file_path,
+                                                              output_file_path=output_file_path,
+                                                              n_workers=n_workers))
+            for stats in results:
+                logging.info(f"Batch prediction benchmark: {stats['n_workers']} workers, "
+                             f"{stats['rows_per_sec']:.0f} rows/sec")
+            return results
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -0,0 +1,258 @@
+import sys
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+from us_visa.constants import SCHEMA_FILE_PATH, TARGET_COLUMN
+from us_visa.entity.config_entity import PredictionServiceConfig
+from us_visa.entity.estimator import TargetValueMapping, prepare_input_features, prepare_input_records
+from us_visa.entity.model_registry import ModelRegistry
+from us_visa.utils.main_utils import read_yaml, load_object
+
+
+class LatencyTracker:
+    '''
+    Latencies of the last window requests, in seconds
+    '''
+
+    def __init__(self, window: int):
+        self._latencies = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self.count += 1
+
+    def percentiles_ms(self) -> dict:
+        if not self._latencies:
+            return {"p50_ms": None, "p99_ms": None}
+        p50, p99 = np.percentile(np.fromiter(self._latencies, dtype=np.float64), [50, 99]) * 1000
+        return {"p50_ms": float(p50), "p99_ms": float(p99)}
+
+
+class PredictionService:
+    '''
+    Class Name: PredictionService
+    Description: Serves the USvisaModel from an asyncio event loop. Single cases are queued and
+                 coalesced into batches of at most max_batch_size cases, waiting at most max_wait_ms for a
+                 batch to fill. Batches are scored on a single scoring thread so the event loop is never
+                 blocked, and the cases arriving meanwhile form the next batch.
+                 The model registry is polled every registry_poll_seconds. A new version is loaded and
+                 warmed up on a loader thread while the current model keeps scoring, then swapped in:
+                 batches already dispatched finish with the old model and the next ones use the new one
+    '''
+
+    def __init__(self, prediction_service_config: PredictionServiceConfig = PredictionServiceConfig()):
+        try:
+            self.prediction_service_config = prediction_service_config
+            self._schema_config = read_yaml(SCHEMA_FILE_PATH)
+            self._labels = TargetValueMapping().reverse_mapping()
+            self.model = None
+            self.model_version = None
+            self.model_load_seconds = None
+            self.n_swaps = 0
+            self.model_registry = (ModelRegistry(prediction_service_config.model_registry_config)
+                                   if prediction_service_config.model_file_path is None else None)
+            self.latency = LatencyTracker(prediction_service_config.latency_window)
+            self.batch_rows = 0
+            self.n_batches = 0
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+            self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+            self._queue = None
+            self._batch_full = None
+            self._worker = None
+            self._watcher = None
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _warmup_record(self) -> dict:
+        record = {}
+        for col in self._schema_config.categorical_columns:
+            if col in self._schema_config.domains and col != TARGET_COLUMN:
+                record[col] = self._schema_config.domains[col][0]
+        for col in self._schema_config.numerical_columns:
+            record[col] = self._schema_config.ranges.get(col, {}).get("min", 0)
+        return record
+
+
+    def load_model(self, version: Optional[str] = None) -> None:
+        """
+        Method Name: load_model
+        Description: Loads model_file_path when it is set, else version of the model registry, the current
+                     one by default. The model scores a few synthetic cases before it is swapped in, so the
+                     first requests do not pay for lazy initialisations
+
+        Output: self.model and self.model_version are set
+        On Failure: Raise an exception
+        """
+        try:
+            start = time.perf_counter()
+            if self.model_registry is None:
+                model_file_path = self.prediction_service_config.model_file_path
+            else:
+                version = version or self.model_registry.current_version()
+                model_file_path = self.model_registry.model_file_path(version)
+
+            model = load_object(model_file_path)
+            record = self._warmup_record()
+            for batch_size in (1, self.prediction_service_config.max_batch_size):
+                for _ in range(self.prediction_service_config.warmup_rounds):
+                    self._predict_records(model, [record] * batch_size)
+            # a single reference swap, the batch loop reads self.model once per batch
+            self.model, self.model_version = model, version
+            self.model_load_seconds = time.perf_counter() - start
+            logging.info(f"Loaded and warmed up {model} from {model_file_path} in {self.model_load_seconds:.3f}s",
+                         extra={"stage": "model_load", "duration_s": self.model_load_seconds, "model_version": version})
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _predict_records(self, model, records: list) -> list:
+        if model.compiled_preprocessing_object is not None:
+            features = prepare_input_records(records)
+        else:
+            from pandas import DataFrame
+
+            features = prepare_input_features(DataFrame(records), self._schema_config.drop_columns)
+        return [self._labels[int(prediction)] for prediction in model.predict(features)]
+
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._batch_full = asyncio.Event()
+        self._worker = asyncio.create_task(self._batch_loop())
+        if self.model_registry is not None:
+            self._watcher = asyncio.create_task(self._watch_registry())
+
+
+    async def stop(self) -> None:
+        for task in (self._watcher, self._worker):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._loader.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+
+
+    async def swap_model(self, version: Optional[str] = None) -> None:
+        """
+        Method Name: swap_model
+        Description: Loads version of the model registry, the current one by default, on the loader thread
+                     and swaps it in. Requests keep being scored by the current model meanwhile
+
+        Output: self.model and self.model_version are set
+        On Failure: Raise an exception
+        """
+        await asyncio.get_running_loop().run_in_executor(self._loader, self.load_model, version)
+        self.n_swaps += 1
+
+
+    async def _watch_registry(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.prediction_service_config.registry_poll_seconds)
+            try:
+                version = await loop.run_in_executor(self._loader, self.model_registry.current_version)
+                if version is not None and version != self.model_version:
+                    logging.info(f"Model version {version} was published, swapping out version {self.model_version}")
+                    await self.swap_model(version)
+            except Exception as e:
+                # the current model keeps serving, the swap is retried on the next poll
+                logging.info(f"Model hot-swap failed: {e}")
+
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        max_batch_size = self.prediction_service_config.max_batch_size
+        max_wait = self.prediction_service_config.max_wait_ms / 1000
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + max_wait
+            while len(batch) < max_batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    self._batch_full.clear()
+                    try:
+                        await asyncio.wait_for(self._batch_full.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                batch.append(self._queue.get_nowait())
+
+            self.n_batches += 1
+            self.batch_rows += len(batch)
+            records = [record for record, _ in batch]
+            try:
+                predictions = await loop.run_in_executor(self._executor, self._predict_records, self.model, records)
+            except Exception:
+                # an invalid case fails the whole batch, score the cases one by one so only it fails
+                for record, future in batch:
+                    try:
+                        prediction = await loop.run_in_executor(self._executor, self._predict_records, self.model, [record])
+                        if not future.done():
+                            future.set_result(prediction[0])
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+
+
+    async def predict(self, record: dict) -> str:
+        """
+        Method Name: predict
+        Description: Predicts the case_status of one case through the micro-batching queue
+
+        Output: predicted case_status
+        On Failure: Raise an exception
+        """
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((record, future))
+        if self._queue.qsize() >= self.prediction_service_config.max_batch_size:
+            self._batch_full.set()
+        prediction = await future
+        self.latency.add(time.perf_counter() - start)
+        return prediction
+
+
+    async def predict_batch(self, records: list) -> list:
+        """
+        Method Name: predict_batch
+        Description: Predicts the case_status of a batch of cases as one vectorized call on the scoring thread
+
+        Output: list of predicted case_status
+        On Failure: Raise an exception
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._predict_records, self.model, records)
+
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.latency.count,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.n_batches,
+            "mean_batch_size": self.batch_rows / self.n_batches if self.n_batches else 0.0,
+            "model_version": self.model_version,
+            "model_load_seconds": self.model_load_seconds,
+            "model_swaps": self.n_swaps,
+            **self.latency.percentiles_ms(),
+        }
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import json
+from dataclasses import fields
+from typing import Optional
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+from us_visa.constants import STAGE_CACHE_MANIFEST_FILE_NAME
+from us_visa.entity.config_entity import StageCacheConfig
+from us_visa.entity.artifact_entity import artifact_to_dict
+from us_visa.utils.main_utils import read_yaml, write_yaml
+
+
+class StageCache:
+    '''
+    Class Name: StageCache
+    Description: Content addressed cache of the pipeline stage artifacts. An entry is keyed by the hash
+                 of the stage inputs, the relevant configuration and the code of the stage. The entry
+                 owns a copy (hard link when possible) of every file the artifact points to
+    '''
+
+    def __init__(self, stage_cache_config: StageCacheConfig = StageCacheConfig()):
+        try:
+            self.stage_cache_config = stage_cache_config
+            self._file_digests = {}
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _file_digest(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._file_digests:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as file_obj:
+                for block in iter(lambda: file_obj.read(1024 * 1024), b''):
+                    digest.update(block)
+            self._file_digests[memo_key] = digest.hexdigest()
+        return self._file_digests[memo_key]
+
+
+    def get_key(self, stage_name: str, config: dict, input_file_paths: list = (), code_file_paths: list = ()) -> str:
+        """
+        Method Name: get_key
+        Description: Computes the cache key of a stage from its configuration and the content of its input
+                     and code files
+
+        Output: hex digest
+        On Failure: Raise an exception
+        """
+        try:
+            digest = hashlib.sha256()
+            digest.update(stage_name.encode())
+            digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+            for file_path in list(input_file_paths) + list(code_file_paths):
+                digest.update(self._file_digest(file_path).encode())
+            return digest.hexdigest()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def _entry_dir(self, stage_name: str, key: str) -> str:
+        return os.path.join(self.stage_cache_config.stage_cache_dir, stage_name, key)
+
+
+    def get(self, stage_name: str, key: str, artifact_cls: type) -> Optional[object]:
+        """
+        Method Name: get
+        Description: Looks up the artifact of a stage
+
+        Output: the cached artifact, None on a miss
+        On Failure: Raise an exception
+        """
+        try:
+            manifest_file_path = os.path.join(self._entry_dir(stage_name, key), STAGE_CACHE_MANIFEST_FILE_NAME)
+            if not os.path.exists(manifest_file_path):
+                return None
+
+            content = read_yaml(manifest_file_path).to_dict()
+            artifact = artifact_cls(**content["artifact"])
+            for file_path in content["files"]:
+                if not os.path.exists(file_path):
+                    logging.info(f"Cached {stage_name} artifact is missing {file_path}, ignoring the entry")
+                    return None
+
+            os.utime(manifest_file_path)
+            logging.info(f"Reusing cached {stage_name} artifact {key}")
+            return artifact
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def put(self, stage_name: str, key: str, artifact: object) -> object:
+        """
+        Method Name: put
+        Description: Stores the artifact of a stage together with the files it points to. The entry is
+                     written to a temporary directory first and renamed into place
+
+        Output: the artifact pointing to the cached files
+        On Failure: Raise an exception
+        """
+        try:
+            entry_dir = self._entry_dir(stage_name, key)
+            tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+
+            content = artifact_to_dict(artifact)
+            files = []
+            for name, value in list(content.items()):
+                if not isinstance(value, str) or not os.path.isfile(value):
+                    continue
+
+                cached_file_path = os.path.join(entry_dir, name + os.path.splitext(value)[1])
+                tmp_file_path = os.path.join(tmp_dir, os.path.basename(cached_file_path))
+                try:
+                    os.link(value, tmp_file_path)
+                except OSError:
+                    shutil.copy2(value, tmp_file_path)
+                content[name] = cached_file_path
+                files.append(cached_file_path)
+
+            write_yaml(file_path=os.path.join(tmp_dir, STAGE_CACHE_MANIFEST_FILE_NAME),
+                       content={"artifact": content, "files": files})
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+            logging.info(f"Cached {stage_name} artifact {key}")
+
+            self.evict(keep_entry_dir=entry_dir)
+            transient = {field.name: getattr(artifact, field.name) for field in fields(artifact)
+                         if field.name not in content}
+            return type(artifact)(**content, **transient)
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def evict(self, keep_entry_dir: Optional[str] = None) -> None:
+        """
+        Method Name: evict
+        Description: Removes the entries not used for max_age_days, then the least recently used entries
+                     until the cache fits in max_size_bytes. keep_entry_dir is never removed
+
+        Output: Entries are removed
+        On Failure: Raise an exception
+        """
+        try:
+            cache_dir = self.stage_cache_config.stage_cache_dir
+            if not os.path.isdir(cache_dir):
+                return
+
+            entries = []
+            for stage_name in os.listdir(cache_dir):
+                for key in os.listdir(os.path.join(cache_dir, stage_name)):
+                    entry_dir = os.path.join(cache_dir, stage_name, key)
+                    manifest_file_path = os.path.join(entry_dir, STAGE_CACHE_MANIFEST_FILE_NAME)
+                    if not os.path.exists(manifest_file_path):
+                        continue
+                    size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+                    entries.append((os.path.getmtime(manifest_file_path), size, entry_dir))
+
+            entries.sort()
+            min_last_used = time.time() - self.stage_cache_config.max_age_days * 24 * 3600
+            total_size = sum(size for _, size, _ in entries)
+            for last_used, size, entry_dir in entries:
+                if last_used >= min_last_used and total_size <= self.stage_cache_config.max_size_bytes:
+                    break
+                if entry_dir == keep_entry_dir:
+                    continue
+                logging.info(f"Evicting stage cache entry {entry_dir}")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total_size -= size
+        except Exception as e:
+            raise USvisaException(e, sys) from e
@@ -1,25 +1,95 @@
 import os
 import sys
+import inspect
 
 from us_visa.exception import USvisaException
 from us_visa.logger import logging
+from us_visa.constants import SCHEMA_FILE_PATH, CURRENT_YEAR
 
 from us_visa.components.data_ingestion import DataIngestion
 from us_visa.components.data_validation import DataValidation
+from us_visa.components.schema_validation import SchemaValidator
+from us_visa.components.data_drift import DatasetSketch
 from us_visa.components.data_transformation import DataTransformation
+from us_visa.components.resampling import Resampler
+from us_visa.components.model_trainer import ModelTrainer
+from us_visa.components.model_evaluation import ModelEvaluation
+from us_visa.components.model_pusher import ModelPusher
+
+from us_visa.data_access.usvisa_data import USvisaData
+from us_visa.data_access.aggregation_pipeline import compile_ingestion_pipeline
+from us_visa.pipeline.stage_cache import StageCache
+from us_visa.pipeline.executor import PipelineExecutor, PipelineNode
+from us_visa.utils import main_utils
+from us_visa.utils.main_utils import read_yaml
+from us_visa.utils.instrumentation import MetricsRecorder, record_cached_stage
 
 from us_visa.entity.config_entity import (DataIngestionConfig,
                                            DataValidationConfig,
-                                           DataTransfomationConfig)
+                                           DataTransfomationConfig,
+                                           ModelTrainerConfig,
+                                           ModelEvaluationConfig,
+                                           ModelPusherConfig,
+                                           StageCacheConfig,
+                                           PipelineExecutorConfig,
+                                           InstrumentationConfig)
 from us_visa.entity.artifact_entity import (DataIngestionArtifact,
                                              DataValidationArtifact,
-                                             DataTransformationArtifact)
+                                             DataTransformationArtifact,
+                                             ModelTrainerArtifact,
+                                             ModelEvaluationArtifact,
+                                             ModelPusherArtifact)
+from us_visa.entity.compiled_preprocessor import CompiledPreprocessor
+from us_visa.entity.estimator import USvisaModel
 
 class TrainingPipeline:
-    def __init__(self):
+    def __init__(self, force: bool = False, resume: bool = False, profiler: str = None, trace_memory: bool = None):
+        """
+        param force: recompute every stage even when the stage cache holds a matching artifact
+        param resume: skip the stages completed by the previous, failed, run
+        param profiler: cprofile or pyinstrument profiles every stage into the profile directory of the artifacts
+        param trace_memory: records the tracemalloc peak of every stage, by default when a profiler is set
+        """
         self.data_ingestion_config = DataIngestionConfig()
         self.data_validation_config = DataValidationConfig()
         self.data_transformation_config = DataTransfomationConfig()
+        self.model_trainer_config = ModelTrainerConfig()
+        self.model_evaluation_config = ModelEvaluationConfig()
+        self.model_pusher_config = ModelPusherConfig()
+        self.stage_cache = StageCache(stage_cache_config=StageCacheConfig())
+        self.pipeline_executor_config = PipelineExecutorConfig()
+        self.instrumentation_config = InstrumentationConfig()
+        if profiler is not None:
+            self.instrumentation_config.profiler = profiler
+        if trace_memory is not None:
+            self.instrumentation_config.trace_memory = trace_memory
+        elif profiler is not None:
+            self.instrumentation_config.trace_memory = True
+        self.force = force
+        self.resume = resume
+
+
+    def _run_cached_stage(self, stage_name: str, artifact_cls: type, key: str, run_stage, data_handles: list = ()) -> object:
+        """
+        Returns the cached artifact of the stage when the key matches, else runs the stage and caches its artifact.
+        data_handles are the in-memory inputs the stage consumes, they are released for it when it is skipped
+        """
+        if not self.force:
+            artifact = self.stage_cache.get(stage_name, key, artifact_cls)
+            if artifact is not None:
+                record_cached_stage(stage_name)
+                for data_handle in data_handles:
+                    if data_handle is not None:
+                        data_handle.release()
+                return artifact
+
+        artifact = run_stage()
+        return self.stage_cache.put(stage_name, key, artifact)
+
+
+    @staticmethod
+    def _code_files(*objs) -> list:
+        return [inspect.getsourcefile(obj) for obj in objs] + [inspect.getsourcefile(main_utils)]
 
 
     def start_data_ingestion(self) -> DataIngestionArtifact:
@@ -30,8 +100,25 @@ class TrainingPipeline:
         try:
             logging.info("Entered the start_data_ingestion method of TraingingPipeline class")
             logging.info("Getting the data from mongodb")
+            config = self.data_ingestion_config
+            key = self.stage_cache.get_key(
+                "data_ingestion",
+                config={"collection": USvisaData().get_collection_fingerprint(config.collection_name),
+                        "columns": read_yaml(SCHEMA_FILE_PATH).columns,
+                        "train_test_split_ration": config.train_test_split_ration,
+                        "artifact_format": config.artifact_format,
+                        "streaming_export": config.streaming_export,
+                        "incremental": config.incremental,
+                        "watermark_field": config.watermark_field,
+                        "dedup_column": config.dedup_column,
+                        # company_age of the pushdown depends on the current year
+                        "pushdown": {"match": config.pushdown_match, "current_year": CURRENT_YEAR}
+                                    if config.pushdown else False},
+                code_file_paths=self._code_files(DataIngestion, USvisaData, compile_ingestion_pipeline)
+            )
             data_ingestion = DataIngestion(data_ingestion_config=self.data_ingestion_config)
-            data_ingestion_artifact = data_ingestion.initiate_data_ingestion()
+            data_ingestion_artifact = self._run_cached_stage("data_ingestion", DataIngestionArtifact, key,
+                                                             data_ingestion.initiate_data_ingestion)
 
             logging.info("Got the training & testing set from mongodb")
             logging.info("Exited the start_data ingestion method of TrainingPipeline class")
@@ -48,9 +135,24 @@ class TrainingPipeline:
 
         logging.info("Entered the start_data_validation method of TrainingPipeline class")
         try:
+            key = self.stage_cache.get_key(
+                "data_validation",
+                config={"schema": read_yaml(SCHEMA_FILE_PATH),
+                        "max_null_rate": self.data_validation_config.max_null_rate,
+                        "max_out_of_range_rate": self.data_validation_config.max_out_of_range_rate,
+                        "max_out_of_domain_rate": self.data_validation_config.max_out_of_domain_rate,
+                        "drift_psi_threshold": self.data_validation_config.drift_psi_threshold,
+                        "fail_on_drift": self.data_validation_config.fail_on_drift},
+                input_file_paths=[data_ingestion_artifact.train_file_path, data_ingestion_artifact.test_file_path] +
+                                 [path for path in [self.data_validation_config.drift_reference_file_path] if os.path.exists(path)],
+                code_file_paths=self._code_files(DataValidation, SchemaValidator, DatasetSketch, compile_ingestion_pipeline)
+            )
             data_validation = DataValidation(data_ingestion_artifact=data_ingestion_artifact,
                                               data_validation_config=self.data_validation_config)
-            data_validation_artifact = data_validation.initiate_data_validation()
+            data_validation_artifact = self._run_cached_stage("data_validation", DataValidationArtifact, key,
+                                                              data_validation.initiate_data_validation,
+                                                              data_handles=[data_ingestion_artifact.train_data,
+                                                                            data_ingestion_artifact.test_data])
 
             logging.info(f"Performed the data validation operation")
             logging.info("Exited the start_data_validation method of TrainingPipeline class")
@@ -66,27 +168,149 @@ class TrainingPipeline:
         """
         logging.info("Entered the start_data_transformation method of TrainingPipeline class")
         try:
+            schema_config = read_yaml(SCHEMA_FILE_PATH)
+            key = self.stage_cache.get_key(
+                "data_transformation",
+                config={"schema": {section: schema_config[section] for section in
+                                   ["columns", "drop_columns", "num_features", "or_columns", "oh_columns", "transform_columns"]},
+                        "validation_status": data_validation_artifact.validation_status,
+                        "array_dtype": self.data_transformation_config.array_dtype,
+                        "sparse_output": self.data_transformation_config.sparse_output,
+                        "out_of_core": {"enabled": self.data_transformation_config.out_of_core,
+                                        "chunk_size": self.data_transformation_config.chunk_size,
+                                        "reservoir_size": self.data_transformation_config.reservoir_size},
+                        "resampling": {"strategy": self.data_transformation_config.resampling_strategy,
+                                       "knn_algorithm": self.data_transformation_config.resampling_knn_algorithm,
+                                       "partition_size": self.data_transformation_config.resampling_partition_size,
+                                       "random_state": self.data_transformation_config.random_state}},
+                input_file_paths=[data_ingestion_artifact.train_file_path, data_ingestion_artifact.test_file_path],
+                code_file_paths=self._code_files(DataTransformation, CompiledPreprocessor, Resampler, compile_ingestion_pipeline)
+            )
             data_transformation = DataTransformation(data_ingestion_artifact=data_ingestion_artifact,
                                                      data_validation_artifact=data_validation_artifact,
                                                      data_transformation_config=self.data_transformation_config)
-            data_transformation_artifact = data_transformation.initiate_data_transformation()
+            data_transformation_artifact = self._run_cached_stage("data_transformation", DataTransformationArtifact, key,
+                                                                  data_transformation.initiate_data_transformation,
+                                                                  data_handles=[data_ingestion_artifact.train_data,
+                                                                                data_ingestion_artifact.test_data])
 
             logging.info("Exited the start_data_transformation method of TrainingPipeline")
 
             return data_transformation_artifact
         except Exception as e:
             raise USvisaException(e, sys) from e
+
+
+    def start_model_trainer(self, data_transformation_artifact: DataTransformationArtifact) -> ModelTrainerArtifact:
+        """
+        This method of TrainingPipeline class is responsible for starting model training
+        """
+        logging.info("Entered the start_model_trainer method of TrainingPipeline class")
+        try:
+            input_file_paths = [data_transformation_artifact.transformed_train_file_path,
+                                data_transformation_artifact.transformed_train_target_file_path,
+                                data_transformation_artifact.transformed_test_file_path,
+                                data_transformation_artifact.transformed_test_target_file_path,
+                                data_transformation_artifact.transformed_object_file_path]
+            if data_transformation_artifact.compiled_object_file_path:
+                input_file_paths.append(data_transformation_artifact.compiled_object_file_path)
+            if data_transformation_artifact.transformed_train_sample_weight_file_path:
+                input_file_paths.append(data_transformation_artifact.transformed_train_sample_weight_file_path)
+            key = self.stage_cache.get_key(
+                "model_trainer",
+                config={"expected_accuracy": self.model_trainer_config.expected_accuracy,
+                        "time_budget_seconds": self.model_trainer_config.time_budget_seconds},
+                input_file_paths=input_file_paths + [self.model_trainer_config.model_config_file_path],
+                code_file_paths=self._code_files(ModelTrainer, USvisaModel)
+            )
+            model_trainer = ModelTrainer(data_transformation_artifact=data_transformation_artifact,
+                                         model_trainer_config=self.model_trainer_config)
+            model_trainer_artifact = self._run_cached_stage("model_trainer", ModelTrainerArtifact, key,
+                                                            model_trainer.initiate_model_trainer)
+
+            logging.info("Exited the start_model_trainer method of TrainingPipeline class")
+
+            return model_trainer_artifact
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def start_model_evaluation(self, data_ingestion_artifact: DataIngestionArtifact,
+                               data_transformation_artifact: DataTransformationArtifact,
+                               model_trainer_artifact: ModelTrainerArtifact) -> ModelEvaluationArtifact:
+        """
+        This method of TrainingPipeline class is responsible for starting model evaluation. It is not cached,
+        the production model it compares against changes outside of the pipeline
+        """
+        try:
+            model_evaluation = ModelEvaluation(model_eval_config=self.model_evaluation_config,
+                                               data_ingestion_artifact=data_ingestion_artifact,
+                                               data_transformation_artifact=data_transformation_artifact,
+                                               model_trainer_artifact=model_trainer_artifact)
+            model_evaluation_artifact = model_evaluation.initiate_model_evaluation()
+            return model_evaluation_artifact
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def start_model_pusher(self, model_evaluation_artifact: ModelEvaluationArtifact,
+                           data_validation_artifact: DataValidationArtifact,
+                           data_transformation_artifact: DataTransformationArtifact) -> ModelPusherArtifact:
+        """
+        This method of TrainingPipeline class is responsible for starting model pushing. It is not cached,
+        publishing to the model registry is its side effect
+        """
+        try:
+            model_pusher = ModelPusher(model_pusher_config=self.model_pusher_config,
+                                       model_evaluation_artifact=model_evaluation_artifact,
+                                       data_validation_artifact=data_validation_artifact,
+                                       data_transformation_artifact=data_transformation_artifact)
+            model_pusher_artifact = model_pusher.initiate_model_pusher()
+            return model_pusher_artifact
+        except Exception as e:
+            raise USvisaException(e, sys) from e
     
     def run_pipeline(self) -> None:
         '''
-        This method of TrainingPipeline class is responsible for running complete pipeline
+        This method of TrainingPipeline class is responsible for running complete pipeline. The metrics of the
+        run are written to metrics.json in the artifact directory, also when a stage failed
         '''
 
         try:
-            data_ingestion_artifact = self.start_data_ingestion()
-            data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
-            data_transformation_artifact = self.start_data_transformation(data_ingestion_artifact=data_ingestion_artifact,
-                                                                          data_validation_artifact=data_validation_artifact)
-            
+            nodes = [
+                PipelineNode(name="data_ingestion", run=self.start_data_ingestion,
+                             artifact_cls=DataIngestionArtifact),
+                PipelineNode(name="data_validation", run=self.start_data_validation,
+                             artifact_cls=DataValidationArtifact,
+                             inputs={"data_ingestion_artifact": "data_ingestion"}),
+                PipelineNode(name="data_transformation", run=self.start_data_transformation,
+                             artifact_cls=DataTransformationArtifact,
+                             inputs={"data_ingestion_artifact": "data_ingestion",
+                                     "data_validation_artifact": "data_validation"}),
+                PipelineNode(name="model_trainer", run=self.start_model_trainer,
+                             artifact_cls=ModelTrainerArtifact,
+                             inputs={"data_transformation_artifact": "data_transformation"}),
+                PipelineNode(name="model_evaluation", run=self.start_model_evaluation,
+                             artifact_cls=ModelEvaluationArtifact,
+                             inputs={"data_ingestion_artifact": "data_ingestion",
+                                     "data_transformation_artifact": "data_transformation",
+                                     "model_trainer_artifact": "model_trainer"}),
+                PipelineNode(name="model_pusher", run=self.start_model_pusher,
+                             artifact_cls=ModelPusherArtifact,
+                             inputs={"model_evaluation_artifact": "model_evaluation",
+                                     "data_validation_artifact": "data_validation",
+                                     "data_transformation_artifact": "data_transformation"}),
+            ]
+            executor = PipelineExecutor(nodes=nodes, pipeline_executor_config=self.pipeline_executor_config,
+                                        resume=self.resume)
+            config = self.instrumentation_config
+            recorder = MetricsRecorder(profiler=config.profiler, trace_memory=config.trace_memory,
+                                       profile_dir=config.profile_dir)
+            try:
+                with recorder:
+                    executor.run()
+            finally:
+                recorder.write(config.metrics_file_path, nodes=executor.node_timings)
+
         except Exception as e:
             raise USvisaException(e, sys) from e
\ No newline at end of file
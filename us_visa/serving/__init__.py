@@ -0,0 +1,33 @@
+'''
+Import surface of the prediction entry points. Importing us_visa.serving loads nothing but the standard
+library, every name below is imported from its module on first access, e.g.
+
+    from us_visa.serving import PredictionService, configure_logging
+'''
+import importlib
+
+# name to the module defining it
+_EXPORTS = {
+    "configure_logging": "us_visa.logger",
+    "PredictionService": "us_visa.pipeline.prediction_service",
+    "BatchPredictionPipeline": "us_visa.pipeline.prediction_pipeline",
+    "ModelRegistry": "us_visa.entity.model_registry",
+    "USvisaModel": "us_visa.entity.estimator",
+    "TargetValueMapping": "us_visa.entity.estimator",
+    "PredictionServiceConfig": "us_visa.entity.config_entity",
+    "BatchPredictionConfig": "us_visa.entity.config_entity",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return __all__
@@ -0,0 +1,394 @@
+import os
+import sys
+import json
+import time
+import inspect
+import resource
+import threading
+import functools
+import contextvars
+import tracemalloc
+from typing import Callable, Optional
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+# the recorder of the running pipeline, None outside of a run, the instrumented functions then only pay this check
+_recorder = None
+# stage whose initiate method runs in the current thread
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+def _max_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def _reset_peak_rss() -> bool:
+    # writing 5 to clear_refs resets VmHWM to the current RSS, on linux 4.0 and later
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> Optional[float]:
+    # VmHWM, the peak RSS since the last reset, None where /proc is missing
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _children_cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _count_rows(obj: object) -> int:
+    # rows of a dataframe, an array or a sparse matrix, 0 for the other objects
+    if isinstance(obj, dict):
+        return 0
+    shape = getattr(obj, "shape", None)
+    return int(shape[0]) if shape else 0
+
+
+def _file_size(file_path: str) -> int:
+    try:
+        return os.path.getsize(file_path)
+    except (OSError, TypeError):
+        return 0
+
+
+class MetricsRecorder:
+    '''
+    Class Name: MetricsRecorder
+    Description: Collects the metrics of a pipeline run: wall time, CPU time, peak RSS, tracemalloc peak,
+                 rows and bytes read and written per stage, and time, rows and bytes per I/O helper.
+                 CPU time and peak RSS are process wide, stages running concurrently share them. The peak RSS
+                 of a stage is measured from its start when no other stage runs, it is None otherwise and
+                 where the peak cannot be reset. process_peak_rss_mb is the peak of the process lifetime
+                 tracemalloc and the per stage profilers are opt-in, their overhead is far above the rest
+    '''
+
+    def __init__(self, profiler: Optional[str] = None, trace_memory: bool = False, profile_dir: Optional[str] = None):
+        """
+        param profiler: None, cprofile or pyinstrument, profiles every stage into profile_dir
+        param trace_memory: traces the python allocations with tracemalloc, for the peak of every stage
+        """
+        try:
+            if profiler is not None and profiler not in PROFILERS:
+                raise Exception(f"Unknown profiler [{profiler}], expected one of {PROFILERS}")
+            if profiler is not None and profile_dir is None:
+                raise Exception("profile_dir is required to profile the stages")
+            self.profiler = profiler
+            self.trace_memory = trace_memory
+            self.profile_dir = profile_dir
+            self.stages = {}
+            self.io = {}
+            self._running_stages = set()
+            self._profiling = False
+            # the reset of the stage peaks resets ru_maxrss as well, the peak before the last reset is kept here
+            self._reset_peak_rss_mb = 0.0
+            self._lock = threading.Lock()
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+    def __enter__(self):
+        global _recorder
+        self._started_tracemalloc = self.trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        self._start = (time.perf_counter(), time.process_time(), _children_cpu_time())
+        _recorder = self
+        return self
+
+
+    def __exit__(self, *args):
+        global _recorder
+        _recorder = None
+        start_wall, start_cpu, start_children_cpu = self._start
+        self.run = {"wall_s": time.perf_counter() - start_wall,
+                    "cpu_s": time.process_time() - start_cpu,
+                    "children_cpu_s": _children_cpu_time() - start_children_cpu,
+                    "process_peak_rss_mb": self._process_peak_rss_mb(),
+                    "children_peak_rss_mb": _max_rss_mb(resource.RUSAGE_CHILDREN),
+                    "tracemalloc_peak_mb": tracemalloc.get_traced_memory()[1] / 1024 ** 2 if self.trace_memory else None,
+                    "profiler": self.profiler}
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+
+    def _process_peak_rss_mb(self) -> float:
+        return max(_max_rss_mb(resource.RUSAGE_SELF), self._reset_peak_rss_mb)
+
+
+    def _reset_stage_peak_rss(self) -> bool:
+        self._reset_peak_rss_mb = self._process_peak_rss_mb()
+        return _reset_peak_rss()
+
+
+    def _stage_of_call(self) -> Optional[str]:
+        # calls made by a thread pool of a stage have no current stage, they belong to the stage when only one runs
+        stage = _current_stage.get()
+        if stage is None and len(self._running_stages) == 1:
+            stage = next(iter(self._running_stages))
+        return stage
+
+
+    def record_io(self, name: str, write: bool, seconds: float, n_rows: int, n_bytes: int, calls: int = 1) -> None:
+        with self._lock:
+            entry = self.io.setdefault(name, {"calls": 0, "seconds": 0.0, "rows": 0, "bytes": 0})
+            entry["calls"] += calls
+            entry["seconds"] += seconds
+            entry["rows"] += n_rows
+            entry["bytes"] += n_bytes
+
+            stage = self._stage_of_call()
+            if stage in self.stages:
+                direction = "out" if write else "in"
+                self.stages[stage][f"rows_{direction}"] += n_rows
+                self.stages[stage]["bytes_written" if write else "bytes_read"] += n_bytes
+                self.stages[stage]["io_s"] += seconds
+
+
+    def record_cached_stage(self, stage: str) -> None:
+        with self._lock:
+            self.stages[stage] = {"status": "cached"}
+
+
+    def _start_profiler(self, stage: str) -> Optional[object]:
+        # one profiler at a time, a stage running next to a profiled one is measured without profile
+        with self._lock:
+            if self.profiler is None or self._profiling:
+                if self.profiler is not None:
+                    logging.info(f"Stage [{stage}] is not profiled, another stage is being profiled")
+                return None
+            self._profiling = True
+        try:
+            if self.profiler == "pyinstrument":
+                try:
+                    from pyinstrument import Profiler
+
+                    profiler = Profiler(async_mode="disabled")
+                    profiler.start()
+                    return profiler
+                except ImportError:
+                    logging.info(f"Stage [{stage}] is profiled with cProfile, pyinstrument is not installed")
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        except Exception:
+            self._profiling = False
+            raise
+
+
+    def _stop_profiler(self, stage: str, profiler: object) -> str:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        # a cProfile profiler when pyinstrument could not be imported
+        if hasattr(profiler, "output_html"):
+            profiler.stop()
+            profile_file_path = os.path.join(self.profile_dir, f"{stage}.html")
+            with open(profile_file_path, 'w') as file:
+                file.write(profiler.output_html())
+            with open(os.path.join(self.profile_dir, f"{stage}.txt"), 'w') as file:
+                file.write(profiler.output_text())
+        else:
+            import pstats
+
+            profiler.disable()
+            profile_file_path = os.path.join(self.profile_dir, f"{stage}.prof")
+            profiler.dump_stats(profile_file_path)
+            with open(os.path.join(self.profile_dir, f"{stage}.txt"), 'w') as file:
+                pstats.Stats(profiler, stream=file).sort_stats("cumulative").print_stats(40)
+        self._profiling = False
+        return profile_file_path
+
+
+    def run_stage(self, stage: str, func: Callable, *args, **kwargs) -> object:
+        """
+        Method Name: run_stage
+        Description: Calls func as the stage, recording its metrics and, with a profiler, its profile
+
+        Output: Returns the result of func
+        On Failure: Records the stage as failed and raises the exception of func
+        """
+        metrics = {"status": "failed", "rows_in": 0, "rows_out": 0, "bytes_read": 0, "bytes_written": 0, "io_s": 0.0}
+        with self._lock:
+            self.stages[stage] = metrics
+            # a reset while another stage runs would drop the part of its peak reached so far
+            peak_reset = not self._running_stages and self._reset_stage_peak_rss()
+            self._running_stages.add(stage)
+        token = _current_stage.set(stage)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        profiler = None
+        start_wall, start_cpu, start_children_cpu = time.perf_counter(), time.process_time(), _children_cpu_time()
+        try:
+            profiler = self._start_profiler(stage)
+            result = func(*args, **kwargs)
+            metrics["status"] = "succeeded"
+            return result
+        finally:
+            metrics.update(wall_s=time.perf_counter() - start_wall,
+                           cpu_s=time.process_time() - start_cpu,
+                           children_cpu_s=_children_cpu_time() - start_children_cpu,
+                           peak_rss_mb=_peak_rss_mb() if peak_reset else None,
+                           process_peak_rss_mb=self._process_peak_rss_mb(),
+                           children_peak_rss_mb=_max_rss_mb(resource.RUSAGE_CHILDREN),
+                           tracemalloc_peak_mb=tracemalloc.get_traced_memory()[1] / 1024 ** 2 if self.trace_memory else None)
+            if profiler is not None:
+                metrics["profile_file_path"] = self._stop_profiler(stage, profiler)
+            _current_stage.reset(token)
+            with self._lock:
+                self._running_stages.discard(stage)
+            logging.info(f"Stage [{stage}] {metrics['status']} in {metrics['wall_s']:.3f}s",
+                         extra={"stage": stage, **{key: value for key, value in metrics.items() if key != "status"}})
+
+
+    def write(self, metrics_file_path: str, nodes: Optional[dict] = None) -> None:
+        """
+        Method Name: write
+        Description: Writes the run, stage and I/O metrics as json. nodes are the wall times of the pipeline
+                     nodes, including the stage cache lookups
+
+        Output: None
+        On Failure: Write an exception log and then raise an exception
+        """
+        try:
+            os.makedirs(os.path.dirname(metrics_file_path), exist_ok=True)
+            with open(metrics_file_path, 'w') as file:
+                json.dump({"run": getattr(self, "run", None), "nodes": nodes or {}, "stages": self.stages,
+                           "io": dict(sorted(self.io.items()))}, file, indent=2)
+            logging.info(f"Wrote the pipeline metrics to {metrics_file_path}")
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+
+
+def instrument_stage(stage: str) -> Callable:
+    '''
+    decorator recording the metrics of the initiate method of a component as the given stage
+    stage: name of the stage, the name of its pipeline node
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return func(*args, **kwargs)
+            return recorder.run_stage(stage, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+
+def instrument_io(operation: str, file_path_arg: Optional[str] = "file_path", rows_arg: Optional[str] = None,
+                  name: Optional[str] = None) -> Callable:
+    '''
+    decorator recording the time, rows and bytes of an I/O helper in the running pipeline
+    operation: read or write
+    file_path_arg: argument holding the path of the file read or written, None when no file is involved
+    rows_arg: argument holding the written object, by default the rows of the returned or yielded objects are
+              counted
+    name: name of the helper in the metrics, by default the qualified name of the function
+    '''
+    def decorator(func):
+        parameters = list(inspect.signature(func).parameters)
+        write = operation == "write"
+        io_name = name or func.__qualname__
+
+        def argument(arg_name, args, kwargs):
+            if arg_name is None:
+                return None
+            if arg_name in kwargs:
+                return kwargs[arg_name]
+            position = parameters.index(arg_name)
+            return args[position] if position < len(args) else None
+
+        def record(recorder, args, kwargs, seconds, n_rows):
+            file_path = argument(file_path_arg, args, kwargs)
+            n_bytes = _file_size(file_path) if file_path is not None else 0
+            recorder.record_io(io_name, write, seconds, n_rows, n_bytes)
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                recorder = _recorder
+                if recorder is None:
+                    yield from func(*args, **kwargs)
+                    return
+                # only the time spent producing the items is counted, not the time of the consumer
+                seconds, n_rows = 0.0, 0
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            seconds += time.perf_counter() - start
+                            return
+                        seconds += time.perf_counter() - start
+                        n_rows += _count_rows(item)
+                        yield item
+                finally:
+                    generator.close()
+                    record(recorder, args, kwargs, seconds, n_rows)
+            return wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            n_rows = _count_rows(argument(rows_arg, args, kwargs) if rows_arg else result)
+            record(recorder, args, kwargs, seconds, n_rows)
+            return result
+        return wrapper
+    return decorator
+
+
+
+def record_io(name: str, write: bool, n_rows: int = 0, n_bytes: int = 0, seconds: float = 0.0, calls: int = 1) -> None:
+    '''
+    records I/O the instrumented helpers do not see, e.g. bytes known once a writer is closed
+    '''
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record_io(name, write, seconds, n_rows, n_bytes, calls)
+
+
+
+def _clear_recorder() -> None:
+    # a forked worker does not report to the recorder of its parent, whose lock may have been held at the fork
+    global _recorder
+    _recorder = None
+
+
+
+def record_cached_stage(stage: str) -> None:
+    '''
+    records a stage restored from the stage cache, its initiate method is not called
+    '''
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record_cached_stage(stage)
+
+
+os.register_at_fork(after_in_child=_clear_recorder)
@@ -1,17 +1,29 @@
+from __future__ import annotations
+
 import os
 import sys
+from typing import Optional, TYPE_CHECKING
 
 import numpy as np
-import dill
 import yaml
-from box import Box
-from pandas import DataFrame
 
 from us_visa.exception import USvisaException
 from us_visa.logger import logging
+from us_visa.constants import SERIALIZATION_SERIALIZER, SERIALIZATION_COMPRESSION
+from us_visa.utils import serialization
+from us_visa.utils.instrumentation import instrument_io, record_io
+
+# pandas, pyarrow, scipy and box are imported by the functions using them, the prediction entry points
+# import this module without paying for the libraries scoring never needs
+if TYPE_CHECKING:
+    import pyarrow as pa
+    import scipy.sparse as sp
+    from box import Box
+    from pandas import DataFrame
 
 
 
+@instrument_io("read")
 def read_yaml(file_path: str) -> Box:
     """
     Method Name: read yaml
@@ -20,12 +32,15 @@ def read_yaml(file_path: str) -> Box:
     Args: path to the yaml file
     Return Box datatype
     """
-    logging.info("Entered the read_yaml method of utils")
+    logging.debug("Entered the read_yaml method of utils")
 
     try:
+        from box import Box
+
+
         with open(file_path, 'rb') as yaml_file:
 
-            logging.info("Exited the read_yaml method of utils")
+            logging.debug("Exited the read_yaml method of utils")
 
             return Box(yaml.safe_load(yaml_file))
     except Exception as e:
@@ -33,43 +48,59 @@ def read_yaml(file_path: str) -> Box:
     
 
 
+@instrument_io("write")
 def write_yaml(file_path: str, content: object) -> None:
-    logging.info("Entered the write_yaml method of utils")
+    logging.debug("Entered the write_yaml method of utils")
 
     try:
         with open(file_path, 'w') as file:
             yaml.dump(content, file)
 
-            logging.info("Exited the write_yaml method of utils")
+            logging.debug("Exited the write_yaml method of utils")
     except Exception as e:
         raise USvisaException(e, sys) from e
 
 
 
-def save_object(file_path: str, content: object) -> None:
-    logging.info("Entered the save_object method of utils")
+@instrument_io("write")
+def save_object(file_path: str, content: object, serializer: str = SERIALIZATION_SERIALIZER,
+                compression: Optional[str] = SERIALIZATION_COMPRESSION) -> None:
+    '''
+    Save a python object to a file
+    file_path: str location of file to save
+    serializer: pickle or dill, objects pickle cannot serialize fall back to dill
+    compression: optional zlib, lz4 or zstd compression of the pickle stream and the array buffers
+    The large array buffers are stored out-of-band so load_object can memory-map them, see us_visa.utils.serialization
+    '''
+    logging.debug("Entered the save_object method of utils")
 
     try:
         dir_path = os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
-        with open(file_path, 'wb') as file_obj:
-            dill.dump(content, file_obj)
-        
-        logging.info("Exited the save_object method of utils")
+        serialization.dump_object(file_path, content, serializer=serializer, compression=compression)
+
+        logging.debug("Exited the save_object method of utils")
 
     except Exception as e:
         raise USvisaException(e, sys) from e
 
 
 
-def load_object(file_path: str) ->object:
-    logging.info("Entered the load_object method of utils")
+@instrument_io("read")
+def load_object(file_path: str, mmap_mode: Optional[str] = 'r') -> object:
+    '''
+    Load a python object from a file
+    file_path: str location of file to load
+    mmap_mode: 'r' memory-maps the array buffers of uncompressed files read-only, their pages are then shared
+               between the processes loading the same file. 'c' maps them copy-on-write and None reads them
+               into memory. Files saved with dill before serialization headers existed are still read
+    '''
+    logging.debug("Entered the load_object method of utils")
     
     try:
-        with open(file_path, 'rb') as file:
-            obj = dill.load(file)
+        obj = serialization.load_object(file_path, mmap_mode=mmap_mode)
         
-        logging.info("Exited the load_object method of utils")
+        logging.debug("Exited the load_object method of utils")
 
         return obj
     except Exception as e:
@@ -77,46 +108,126 @@ def load_object(file_path: str) ->object:
 
     
 
-def save_numpy_array_data(file_path: str, array: np.array) -> None:
+@instrument_io("write", rows_arg="array")
+def save_numpy_array_data(file_path: str, array: np.array, dtype: str = None, chunk_size: int = 100000) -> None:
     '''
     Save numpy array data to a file
     file_path: str location of file to save
     array: np.array data to save
+    dtype: optional dtype the array is stored as. The conversion is done in blocks of chunk_size rows
+           written into the memory-mapped file, so no full-size converted copy is made
     '''
-    logging.info("Enter the save_numpy_array_data method of utils")
+    logging.debug("Enter the save_numpy_array_data method of utils")
 
     try:
         dir_path = os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
-        with open(file_path, 'wb') as file_obj:
-            np.save(file_obj, array)
-
-        logging.info("Exited the save_numpy_array_data method of utils")
+        array = np.asarray(array)
+        if dtype is None or array.dtype == np.dtype(dtype):
+            np.save(file_path, array)
+        else:
+            out = np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=array.shape)
+            for start in range(0, len(array), chunk_size):
+                out[start:start + chunk_size] = array[start:start + chunk_size]
+            out.flush()
+            del out
+
+        logging.debug("Exited the save_numpy_array_data method of utils")
 
     except Exception as e:
         raise USvisaException(e, sys) from e
     
 
 
-def load_numpy_array_data(file_path: str) -> np.array:
+@instrument_io("write", rows_arg="matrix")
+def save_sparse_matrix_data(file_path: str, matrix: sp.spmatrix, dtype: str = None) -> None:
+    '''
+    Save a scipy sparse matrix to an uncompressed .npz file, as CSR
+    file_path: str location of file to save, ending in .npz
+    matrix: sparse matrix data to save
+    dtype: optional dtype the values are stored as
+    '''
+    logging.debug("Enter the save_sparse_matrix_data method of utils")
+
+    try:
+        import scipy.sparse as sp
+
+        dir_path = os.path.dirname(file_path)
+        os.makedirs(dir_path, exist_ok=True)
+        matrix = sp.csr_matrix(matrix)
+        if dtype is not None:
+            matrix = matrix.astype(dtype, copy=False)
+        sp.save_npz(file_path, matrix, compressed=False)
+
+        logging.debug("Exited the save_sparse_matrix_data method of utils")
+
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+
+@instrument_io("read")
+def load_numpy_array_data(file_path: str, mmap_mode: str = 'r') -> np.array:
     '''
     Load numpy array data from a file
-    file_path: str location of file to load
+    file_path: str location of file to load. .npz files written by save_sparse_matrix_data are loaded
+               as CSR matrices, read into memory
+    mmap_mode: mode the file is memory-mapped with, pages are then shared between the processes reading
+               the same file. None reads the whole array into memory
     return np.array data loaded
     '''
 
-    logging.info("Entered the load_numpy_array_data method of utils")
+    logging.debug("Entered the load_numpy_array_data method of utils")
     try:
-        with open(file_path, 'rb') as file_obj:
+        if file_path.endswith(".npz"):
+            import scipy.sparse as sp
+
+            array = sp.csr_matrix(sp.load_npz(file_path))
+        else:
+            array = np.load(file_path, mmap_mode=mmap_mode)
 
-            logging.info("Exited the load_numpy_array_data method of utils")
-            return np.load(file_obj)
+        logging.debug("Exited the load_numpy_array_data method of utils")
+        return array
     
     except Exception as e:
         raise USvisaException(e, sys) from e
     
 
 
+@instrument_io("read")
+def iter_dataframe_chunks(file_path: str, chunk_size: int, columns: list = None):
+    '''
+    read a csv, parquet or feather file as pandas DataFrames of at most chunk_size rows
+    file_path: str location of file to load, the format is picked from the extension
+    columns: optional list of columns to read
+    '''
+    logging.debug("Entered the iter_dataframe_chunks method of utils")
+
+    try:
+        import pandas as pd
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        file_format = os.path.splitext(file_path)[1].lstrip('.')
+        if file_format == "csv":
+            for chunk in pd.read_csv(file_path, usecols=columns, chunksize=chunk_size):
+                yield chunk
+        elif file_format == "parquet":
+            for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+        elif file_format == "feather":
+            table = feather.read_table(file_path, columns=columns, memory_map=True)
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                yield batch.to_pandas()
+        else:
+            raise Exception(f"Unsupported file format: {file_format}")
+
+        logging.debug("Exited the iter_dataframe_chunks method of utils")
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+
 def drop_columns(df: DataFrame, cols: list) -> DataFrame:
     '''
     drop the columns from a pandas DataFrame
@@ -124,12 +235,182 @@ def drop_columns(df: DataFrame, cols: list) -> DataFrame:
     cols: list of columns to be dropped
     '''
 
-    logging.info("Entered the drop_columns method of utils")
+    logging.debug("Entered the drop_columns method of utils")
 
     try:
-        df = df.drop(columns=cols, axis=1)
+        df = df.drop(columns=cols)
         
-        logging.info("Exited the drop_columns method of utils")
+        logging.debug("Exited the drop_columns method of utils")
         return df
     except Exception as e:
-        raise USvisaException(e, sys) from e
\ No newline at end of file
+        raise USvisaException(e, sys) from e
+
+
+def get_column_dtypes(schema_config: Box) -> dict:
+    '''
+    map every column of the schema to its dtype
+    schema_config: schema.yaml content
+    '''
+    return {col: dtype for column in schema_config.columns for col, dtype in column.items()}
+
+
+
+def cast_to_schema_dtypes(df: DataFrame, column_dtypes: dict) -> DataFrame:
+    '''
+    cast the columns of a pandas DataFrame to the dtypes of the schema
+    df: pandas DataFrame
+    column_dtypes: column to dtype mapping, see get_column_dtypes
+    Integer columns holding missing values are kept as float64
+    '''
+    try:
+        import pandas as pd
+
+        for col, dtype in column_dtypes.items():
+            if col not in df.columns or str(df[col].dtype) == dtype:
+                continue
+
+            if dtype == "category":
+                df[col] = df[col].astype("category")
+            else:
+                values = pd.to_numeric(df[col], errors="coerce")
+                if np.issubdtype(np.dtype(dtype), np.integer) and values.isna().any():
+                    df[col] = values.astype("float64")
+                else:
+                    df[col] = values.astype(dtype)
+        return df
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+
+def _to_arrow_table(df: DataFrame) -> pa.Table:
+    # categoricals are stored as plain strings, so that chunks with different categories share one schema
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table.replace_schema_metadata(None)
+
+
+
+class DataFrameWriter:
+    '''
+    Write a pandas DataFrame to a csv, parquet or feather file chunk by chunk.
+    The format is picked from the file extension
+    '''
+
+    def __init__(self, file_path: str):
+        try:
+            self.file_path = file_path
+            self.file_format = os.path.splitext(file_path)[1].lstrip('.')
+            if self.file_format not in ("csv", "parquet", "feather"):
+                raise Exception(f"Unsupported file format: {self.file_format}")
+
+            dir_path = os.path.dirname(file_path)
+            if dir_path:
+                os.makedirs(dir_path, exist_ok=True)
+            self._writer = None
+            self._schema = None
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    @instrument_io("write", file_path_arg=None, rows_arg="df", name="DataFrameWriter")
+    def write(self, df: DataFrame) -> None:
+        try:
+            if self.file_format == "csv":
+                if self._writer is None:
+                    self._writer = open(self.file_path, 'w', newline='')
+                    df.to_csv(self._writer, index=False, header=True)
+                else:
+                    df.to_csv(self._writer, index=False, header=False)
+                return
+
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = _to_arrow_table(df)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.file_format == "parquet":
+                    self._writer = pq.ParquetWriter(self.file_path, self._schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.file_path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        except Exception as e:
+            raise USvisaException(e, sys) from e
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            # the size is known once the file is complete, the rows were counted by write
+            record_io("DataFrameWriter", write=True, n_bytes=os.path.getsize(self.file_path), calls=0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def write_dataframe(file_path: str, df: DataFrame) -> None:
+    '''
+    write a pandas DataFrame with its header to a csv, parquet or feather file
+    file_path: str location of file to save, the format is picked from the extension
+    df: pandas DataFrame
+    '''
+    logging.debug("Entered the write_dataframe method of utils")
+
+    try:
+        with DataFrameWriter(file_path) as writer:
+            writer.write(df)
+
+        logging.debug("Exited the write_dataframe method of utils")
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+
+@instrument_io("read")
+def read_dataframe(file_path: str, columns: list = None, column_dtypes: dict = None) -> DataFrame:
+    '''
+    read a csv, parquet or feather file as pandas DataFrame
+    file_path: str location of file to load, the format is picked from the extension
+    columns: optional list of columns to read
+    column_dtypes: optional column to dtype mapping the columns are cast to, see get_column_dtypes
+    '''
+    logging.debug("Entered the read_dataframe method of utils")
+
+    try:
+        import pandas as pd
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        column_dtypes = column_dtypes or {}
+        file_format = os.path.splitext(file_path)[1].lstrip('.')
+        categorical_columns = [col for col, dtype in column_dtypes.items()
+                               if dtype == "category" and (columns is None or col in columns)]
+
+        if file_format == "csv":
+            df = pd.read_csv(file_path, usecols=columns, dtype={col: "category" for col in categorical_columns})
+        elif file_format == "parquet":
+            df = pq.read_table(file_path, columns=columns, read_dictionary=categorical_columns).to_pandas()
+        elif file_format == "feather":
+            table = feather.read_table(file_path, columns=columns)
+            for col in categorical_columns:
+                if col in table.column_names:
+                    i = table.column_names.index(col)
+                    table = table.set_column(i, col, table.column(i).dictionary_encode())
+            df = table.to_pandas()
+        else:
+            raise Exception(f"Unsupported file format: {file_format}")
+
+        df = cast_to_schema_dtypes(df, column_dtypes)
+
+        logging.debug("Exited the read_dataframe method of utils")
+        return df
+    except Exception as e:
+        raise USvisaException(e, sys) from e
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import mmap
+import zlib
+import pickle
+import struct
+import platform
+import importlib
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+from us_visa.exception import USvisaException
+from us_visa.logger import logging
+
+# layout: MAGIC, header length (uint32), json header, then the pickle stream and the out-of-band buffers,
+# every segment aligned on ALIGNMENT bytes from the start of the file
+MAGIC = b"\x93USVISA\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PICKLE_PROTOCOL = 5
+# smaller buffers stay inside the pickle stream, mapping them would not save a page
+OUT_OF_BAND_MIN_BYTES = 4096
+
+# serializer name to module, dill is only imported to write or read dill files
+SERIALIZERS = {"pickle": "pickle", "dill": "dill"}
+MMAP_ACCESS = {"r": mmap.ACCESS_READ, "c": mmap.ACCESS_COPY}
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def get_serializer(serializer: str):
+    '''
+    module of a serializer of SERIALIZERS, with the pickle dumps and loads interface
+    '''
+    if serializer not in SERIALIZERS:
+        raise Exception(f"Unsupported serializer: {serializer}")
+    return importlib.import_module(SERIALIZERS[serializer])
+
+
+def get_codec(compression: str) -> tuple:
+    '''
+    compress and decompress functions of a compression, lz4 and zstd require the lz4 and zstandard packages
+    '''
+    if compression == "zlib":
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    if compression == "lz4":
+        import lz4.frame
+        return lz4.frame.compress, lz4.frame.decompress
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    raise Exception(f"Unsupported compression: {compression}")
+
+
+def dump_object(file_path: str, obj: object, serializer: str = "pickle", compression: Optional[str] = None) -> dict:
+    """
+    Method Name: dump_object
+    Description: Pickles obj with protocol 5. Large contiguous buffers, e.g. the data of NumPy arrays, are
+                 written out-of-band after the pickle stream instead of inside it, aligned so that load_object
+                 can memory-map them. Objects the pickle serializer cannot handle, e.g. lambdas, fall back
+                 to dill. The file is written next to file_path then renamed over it, so processes that
+                 memory-mapped the previous version keep reading a consistent file
+
+    Output: the header written to the file
+    On Failure: Raise an exception
+    """
+    try:
+        buffers = []
+
+        def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+            # a true return value keeps the buffer in-band
+            if buffer.raw().nbytes < OUT_OF_BAND_MIN_BYTES:
+                return True
+            buffers.append(buffer)
+            return False
+
+        try:
+            payload = get_serializer(serializer).dumps(obj, protocol=PICKLE_PROTOCOL, buffer_callback=buffer_callback)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            if serializer == "dill":
+                raise
+            logging.info(f"{serializer} cannot serialize {type(obj).__name__} ({e}), falling back to dill")
+            serializer, buffers = "dill", []
+            payload = get_serializer("dill").dumps(obj, protocol=PICKLE_PROTOCOL, buffer_callback=buffer_callback)
+
+        segments = [memoryview(payload)] + [buffer.raw() for buffer in buffers]
+        raw_sizes = [segment.nbytes for segment in segments]
+        if compression is not None:
+            compress, _ = get_codec(compression)
+            segments = [memoryview(compress(segment)) for segment in segments]
+
+        offsets, offset = [], 0
+        for segment in segments:
+            offsets.append(offset)
+            offset = _align(offset + segment.nbytes)
+        header = {"format_version": FORMAT_VERSION, "serializer": serializer, "protocol": PICKLE_PROTOCOL,
+                  "compression": compression,
+                  "segments": [[offset, segment.nbytes, raw_size]
+                               for offset, segment, raw_size in zip(offsets, segments, raw_sizes)],
+                  "python": platform.python_version(), "created_at": datetime.now().isoformat()}
+        header_bytes = json.dumps(header).encode()
+        data_start = _align(len(MAGIC) + 4 + len(header_bytes))
+
+        dir_path = os.path.dirname(file_path) or "."
+        fd, tmp_file_path = tempfile.mkstemp(dir=dir_path, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+                for offset, segment in zip(offsets, segments):
+                    file.write(b"\0" * (data_start + offset - file.tell()))
+                    file.write(segment)
+            os.replace(tmp_file_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+            raise
+        return header
+    except Exception as e:
+        raise USvisaException(e, sys) from e
+
+
+def _read_header(file) -> tuple:
+    if file.read(len(MAGIC)) != MAGIC:
+        return None, None
+    header_length = struct.unpack("<I", file.read(4))[0]
+    return json.loads(file.read(header_length)), _align(len(MAGIC) + 4 + header_length)
+
+
+def read_header(file_path: str) -> Optional[dict]:
+    '''
+    header of a file written by dump_object, None for the files pickled with dill before the header existed
+    '''
+    with open(file_path, 'rb') as file:
+        return _read_header(file)[0]
+
+
+def load_object(file_path: str, mmap_mode: Optional[str] = 'r') -> object:
+    """
+    Method Name: load_object
+    Description: Loads a file written by dump_object. Uncompressed files are memory-mapped when mmap_mode is
+                 'r' or 'c': the arrays are then views on the page cache, shared between the processes
+                 loading the same file, read-only with 'r' and copy-on-write with 'c'. With mmap_mode None,
+                 or for compressed files, the arrays are read into writable memory.
+                 Files without header are read with dill
+
+    Output: the object
+    On Failure: Raise an exception
+    """
+    try:
+        if mmap_mode is not None and mmap_mode not in MMAP_ACCESS:
+            raise Exception(f"Unsupported mmap_mode: {mmap_mode}")
+
+        with open(file_path, 'rb') as file:
+            header, data_start = _read_header(file)
+            if header is None:
+                file.seek(0)
+                return get_serializer("dill").load(file)
+            if header["format_version"] > FORMAT_VERSION:
+                raise Exception(f"{file_path} has format version {header['format_version']}, "
+                                f"newer than the supported version {FORMAT_VERSION}")
+
+            if header["compression"] is None and mmap_mode is not None:
+                data = memoryview(mmap.mmap(file.fileno(), 0, access=MMAP_ACCESS[mmap_mode]))
+            else:
+                data = memoryview(bytearray(os.fstat(file.fileno()).st_size))
+                file.seek(0)
+                file.readinto(data)
+
+        segments = [data[data_start + offset:data_start + offset + size] for offset, size, _ in header["segments"]]
+        if header["compression"] is not None:
+            _, decompress = get_codec(header["compression"])
+            segments = [memoryview(bytearray(decompress(segment))) for segment in segments]
+
+        return get_serializer(header["serializer"]).loads(segments[0], buffers=segments[1:])
+    except Exception as e:
+        raise USvisaException(e, sys) from e